@@ -1,15 +1,28 @@
+import hmac
+import logging
 import os
+import re
+import time
+import uuid
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from flask import Flask, render_template, jsonify
+# Before the application imports, so their module-level log records go through it
+from utils.logging_setup import configure_logging, request_id_var
+configure_logging()
+logger = logging.getLogger(__name__)
+
+from flask import Flask, render_template, jsonify, g, request, has_request_context
+from flask.ctx import _AppCtxGlobals
 from flask_cors import CORS
 from flask_socketio import SocketIO
 from flask_jwt_extended import JWTManager
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
 from models import Base
+from utils.metrics import instrument_socketio, observe_request, render as render_metrics
+from database import (
+    DATABASE_URL, engine, Session, BackgroundSession, session_for_view, track_queries, finish_tracking
+)
 import routes.auth
 import routes.products
 import routes.orders
@@ -26,12 +39,13 @@ import routes.checkout
 import routes.messages
 import routes.stats
 import routes.features
+import routes.jobs
 
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SESSION_SECRET', 'dev-secret-key-change-in-production')
 app.config['JWT_SECRET_KEY'] = os.getenv('SESSION_SECRET', 'dev-secret-key-change-in-production')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///bharatcraft.db')
+app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['JWT_IDENTITY_CLAIM'] = 'sub'
@@ -61,7 +75,7 @@ def expired_token_callback(jwt_header, jwt_payload):
 
 @jwt.invalid_token_loader
 def invalid_token_callback(error):
-    print(f"JWT Invalid Token Error: {error}")
+    logger.warning("JWT invalid token: %s", error)
     return jsonify({
         'error': 'Invalid token',
         'message': 'Please log in again to get a new token',
@@ -80,23 +94,66 @@ def revoked_token_callback(jwt_header, jwt_payload):
     return jsonify({'error': 'Token has been revoked', 'message': 'Please log in again'}), 401
 
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+instrument_socketio(socketio)
 
-engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
+# One engine and session registry shared with socket handlers and job workers (database.py)
 Base.metadata.create_all(engine)
-Session = scoped_session(sessionmaker(bind=engine))
+
+# Full-text product search (FTS5 / tsvector) over the mirrored product text
+from utils.search import ensure_search_index
+ensure_search_index(engine)
 app.session_factory = Session
 
+class RequestGlobals(_AppCtxGlobals):
+    """g whose db session is created on first access, so requests that never
+    touch the database (templates, static files) never open one"""
+    
+    def __getattr__(self, name):
+        if name == 'db' and has_request_context():
+            # @read_only views may read from the replica (database.py)
+            self.db = session_for_view(app.view_functions.get(request.endpoint))
+            return self.db
+        return super().__getattr__(name)
+
+app.app_ctx_globals_class = RequestGlobals
+
+def _request_id(header):
+    """Caller-supplied request id if it is a sane token, else a fresh one"""
+    if header and len(header) <= 64 and re.fullmatch(r'[A-Za-z0-9._:-]+', header):
+        return header
+    return uuid.uuid4().hex[:16]
+
 @app.before_request
 def before_request():
-    from flask import g
-    g.db = Session()
+    g._request_started = time.perf_counter()
+    g._request_id = _request_id(request.headers.get('X-Request-ID'))
+    g._request_id_token = request_id_var.set(g._request_id)
+    g._query_stats, g._query_stats_token = track_queries()
+
+@app.after_request
+def add_server_timing(response):
+    stats = g.get('_query_stats')
+    if stats is not None and stats.queries:
+        response.headers.add('Server-Timing', f'db;dur={stats.seconds * 1000:.1f};desc="{stats.queries} queries"')
+    started = g.get('_request_started')
+    if started is not None:
+        observe_request(request.blueprint, request.endpoint, request.method, response.status_code,
+                        time.perf_counter() - started)
+    if g.get('_request_id'):
+        response.headers['X-Request-ID'] = g._request_id
+    return response
 
 @app.teardown_request
 def teardown_request(exception=None):
-    from flask import g
+    stats = g.pop('_query_stats', None)
+    if stats is not None:
+        finish_tracking(request.endpoint, stats, g.pop('_query_stats_token'))
     db = g.pop('db', None)
     if db is not None:
         db.close()
+    token = g.pop('_request_id_token', None)
+    if token is not None:
+        request_id_var.reset(token)
 
 app.register_blueprint(routes.auth.bp)
 app.register_blueprint(routes.products.bp)
@@ -114,6 +171,7 @@ app.register_blueprint(routes.checkout.bp)
 app.register_blueprint(routes.messages.bp)
 app.register_blueprint(routes.stats.bp)
 app.register_blueprint(routes.features.bp)
+app.register_blueprint(routes.jobs.bp)
 
 @app.route('/')
 def index():
@@ -147,6 +205,16 @@ def buyer_portal():
 def admin_portal():
     return render_template('admin/dashboard.html')
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint; requires 'Bearer <METRICS_TOKEN>' and is disabled when it is unset"""
+    token = os.getenv('METRICS_TOKEN')
+    if not token:
+        return jsonify({'error': 'Not found'}), 404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return app.response_class(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/sw.js')
 def service_worker():
     from flask import send_from_directory
@@ -155,6 +223,27 @@ def service_worker():
 from chat_events import register_socketio_events
 register_socketio_events(socketio)
 
+# Background job workers (AI quality assessment etc.); on SQLite their
+# writes go through the background writer queue
+from utils.job_queue import start_workers
+start_workers(BackgroundSession)
+
+# File references for products uploaded before they were tracked
+from utils.image_pipeline import ensure_image_files
+ensure_image_files(Session)
+
+# Visual search index, rebuilt off the request path as product images are indexed
+from utils.visual_index import VISUAL_INDEX
+VISUAL_INDEX.start(BackgroundSession)
+
+# Materialized platform totals: seeded once, then kept current by deltas
+from utils.platform_metrics import ensure_platform_metrics
+ensure_platform_metrics(Session)
+
+# Per-artisan daily rollups: backfilled once from order history
+from utils.artisan_stats import ensure_artisan_rollups
+ensure_artisan_rollups(Session)
+
 if __name__ == '__main__':
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
@@ -1,18 +1,42 @@
+import logging
+
 from flask_socketio import emit, join_room, leave_room
 from flask import request
 from models import Message, User
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-import os
-from utils.ai_service import translate_text
+from database import SessionFactory as Session, BackgroundSessionFactory
+from utils.translation_service import get_cached_translation
+from utils.translation_dispatcher import TranslationDispatcher
+
+logger = logging.getLogger(__name__)
 
-# Get DATABASE_URL with a default fallback
-database_url = os.getenv('DATABASE_URL', 'sqlite:///bharatcraft.db')
-engine = create_engine(database_url)
-Session = sessionmaker(bind=engine)
+def chat_room(user_a, user_b):
+    return f"chat_{min(user_a, user_b)}_{max(user_a, user_b)}"
 
 def register_socketio_events(socketio):
     
+    def on_translated(payload, translated_text):
+        """Store a batched translation and push it to the open chat"""
+        session = BackgroundSessionFactory()
+        try:
+            message = session.query(Message).filter_by(id=payload['message_id']).first()
+            if not message:
+                return
+            message.translated_content = translated_text
+            session.commit()
+        finally:
+            session.close()
+        
+        update = {
+            'id': payload['message_id'],
+            'sender_id': payload['sender_id'],
+            'receiver_id': payload['receiver_id'],
+            'translated_content': translated_text
+        }
+        socketio.emit('message_translated', update, room=chat_room(payload['sender_id'], payload['receiver_id']))
+        socketio.emit('message_translated', update, room=f"user_{payload['receiver_id']}")
+    
+    dispatcher = TranslationDispatcher(socketio, on_translated)
+    
     @socketio.on('join')
     def on_join(data):
         room = data['room']
@@ -37,9 +61,15 @@ def register_socketio_events(socketio):
             
             receiver = session.query(User).filter_by(id=receiver_id).first()
             translated_content = None
+            translation_pending = False
             
+            # Translations are batched in the background unless already cached
             if receiver and receiver.language_preference != original_language:
-                translated_content = translate_text(content, receiver.language_preference)
+                cached = get_cached_translation(content, original_language, receiver.language_preference)
+                if cached:
+                    translated_content = cached.get('translated_text')
+                else:
+                    translation_pending = True
             
             message = Message(
                 sender_id=sender_id,
@@ -54,7 +84,7 @@ def register_socketio_events(socketio):
             session.add(message)
             session.commit()
             
-            room = f"chat_{min(sender_id, receiver_id)}_{max(sender_id, receiver_id)}"
+            room = chat_room(sender_id, receiver_id)
             
             sender = session.query(User).filter_by(id=sender_id).first()
             sender_name = sender.full_name if sender else "Unknown"
@@ -66,6 +96,7 @@ def register_socketio_events(socketio):
                 'receiver_id': message.receiver_id,
                 'content': message.content,
                 'translated_content': message.translated_content,
+                'translation_pending': translation_pending,
                 'created_at': message.created_at.isoformat()
             }, room=room)
 
@@ -79,8 +110,16 @@ def register_socketio_events(socketio):
                 'type': 'message'
             }, room=f"user_{receiver_id}")
             
-        except Exception as e:
-            print(f"Error handling message: {e}")
+            if translation_pending:
+                dispatcher.submit(content, original_language, receiver.language_preference, {
+                    'message_id': message.id,
+                    'sender_id': sender_id,
+                    'receiver_id': receiver_id
+                })
+            
+        except Exception:
+            session.rollback()
+            logger.exception("Error handling chat message")
         finally:
             session.close()
     
@@ -0,0 +1,508 @@
+"""
+Database Engine and Sessions
+The one engine every part of the app shares: blueprints (g.db), Socket.IO
+handlers, background job workers and startup tasks. Pool settings follow
+the deployment mode:
+
+- eventlet: many green threads share few connections, so a larger overflow
+  and a short checkout timeout (fail fast instead of piling up greenlets)
+- threaded: gunicorn sync workers with --threads; the pool is sized for the
+  request threads plus the job workers
+- sqlite: file databases; no pre-ping or recycling needed
+
+Each setting can be overridden with DB_POOL_SIZE, DB_MAX_OVERFLOW,
+DB_POOL_TIMEOUT, DB_POOL_RECYCLE and DB_POOL_PRE_PING. pool_stats()
+reports checkouts, new connections and time spent waiting for a
+connection.
+
+SQLite file databases get WAL journaling and tuned pragmas on every new
+connection, and sessions from BackgroundSession (job workers, batched
+chat translations) take turns through a FIFO writer queue from their
+first write until commit, so background writers wait in line instead of
+spinning on "database is locked" against each other.
+
+Every statement is timed; while a request is being served its query
+count and DB time accumulate in the request's QueryStats (see
+track_queries()) and are summed per route for request_query_stats().
+
+Routes decorated with @read_only are served from DATABASE_REPLICA_URL when
+one is configured and healthy: the replica is probed at most every
+REPLICA_CHECK_SECONDS and skipped (reads go to the primary) while it is
+unreachable or more than REPLICA_MAX_LAG_SECONDS behind.
+"""
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque, defaultdict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import sessionmaker, scoped_session, Session as OrmSession
+from sqlalchemy.pool import QueuePool
+
+from utils.metrics import SQL_QUERY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///bharatcraft.db')
+
+# eventlet, threaded or sqlite; detected when unset
+DB_POOL_MODE = os.getenv('DB_POOL_MODE', '').strip().lower()
+
+# Request threads per process (gunicorn --threads)
+WEB_THREADS = int(os.getenv('WEB_THREADS', 4))
+
+POOL_PROFILES = {
+    'eventlet': {'pool_size': 10, 'max_overflow': 20, 'pool_timeout': 5, 'pool_recycle': 1800, 'pool_pre_ping': True},
+    'threaded': {'pool_size': None, 'max_overflow': 5, 'pool_timeout': 10, 'pool_recycle': 1800, 'pool_pre_ping': True},
+    'sqlite': {'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 30, 'pool_recycle': -1, 'pool_pre_ping': False},
+}
+
+# Optional read replica for @read_only routes
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL', '').strip()
+
+# Replication lag beyond which reads fall back to the primary
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 10))
+
+# Seconds between replica health/lag probes
+REPLICA_CHECK_SECONDS = float(os.getenv('REPLICA_CHECK_SECONDS', 5))
+
+# Applied to every new SQLite connection, in order (journal_mode is skipped for :memory:)
+SQLITE_PRAGMAS = (
+    ('journal_mode', os.getenv('SQLITE_JOURNAL_MODE', 'WAL')),
+    ('synchronous', os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')),  # Durable at checkpoints; safe with WAL
+    ('busy_timeout', int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))),
+    ('cache_size', int(os.getenv('SQLITE_CACHE_SIZE', -65536))),  # Negative = KiB, i.e. 64 MiB
+    ('mmap_size', int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))),
+    ('temp_store', 'MEMORY'),
+    ('wal_autocheckpoint', int(os.getenv('SQLITE_WAL_AUTOCHECKPOINT', 1000))),
+)
+
+# Serialize background writers on SQLite (set to 0 to disable)
+SQLITE_WRITE_QUEUE = os.getenv('SQLITE_WRITE_QUEUE', '1').strip().lower() not in ('0', 'false', 'no')
+
+ENV_OVERRIDES = {
+    'pool_size': ('DB_POOL_SIZE', int),
+    'max_overflow': ('DB_MAX_OVERFLOW', int),
+    'pool_timeout': ('DB_POOL_TIMEOUT', float),
+    'pool_recycle': ('DB_POOL_RECYCLE', int),
+    'pool_pre_ping': ('DB_POOL_PRE_PING', lambda value: value.strip().lower() in ('1', 'true', 'yes')),
+}
+
+
+def is_sqlite(url=DATABASE_URL):
+    return url.startswith('sqlite')
+
+
+def is_memory_sqlite(url=DATABASE_URL):
+    return is_sqlite(url) and (url in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in url)
+
+
+def _eventlet_patched():
+    if 'eventlet' not in sys.modules:
+        return False
+    try:
+        from eventlet import patcher
+        return patcher.is_monkey_patched('socket')
+    except Exception:
+        return False
+
+
+def detect_mode(url=DATABASE_URL):
+    """Deployment mode for pool sizing: DB_POOL_MODE, else sqlite / eventlet / threaded"""
+    if DB_POOL_MODE in POOL_PROFILES:
+        return DB_POOL_MODE
+    if is_sqlite(url):
+        return 'sqlite'
+    return 'eventlet' if _eventlet_patched() else 'threaded'
+
+
+def pool_settings(mode, url=DATABASE_URL):
+    """Pool keyword arguments for create_engine in the given mode"""
+    settings = dict(POOL_PROFILES[mode])
+    if settings['pool_size'] is None:
+        from utils.job_queue import JOB_WORKERS
+        settings['pool_size'] = WEB_THREADS + JOB_WORKERS + 1
+
+    for name, (variable, parse) in ENV_OVERRIDES.items():
+        if os.getenv(variable):
+            settings[name] = parse(os.getenv(variable))
+    return settings
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a free connection"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            _record('timeouts')
+            raise
+        finally:
+            _record_wait(time.perf_counter() - started)
+
+
+_stats = {
+    'checkouts': 0, 'checkins': 0, 'connects': 0, 'invalidations': 0, 'timeouts': 0,
+    'wait_seconds_total': 0.0, 'wait_seconds_max': 0.0, 'slow_waits': 0
+}
+_stats_lock = threading.Lock()
+
+# Checkouts waiting longer than this are counted as slow
+SLOW_WAIT_SECONDS = 0.1
+
+
+def _record(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def _record_wait(seconds):
+    with _stats_lock:
+        _stats['wait_seconds_total'] += seconds
+        _stats['wait_seconds_max'] = max(_stats['wait_seconds_max'], seconds)
+        if seconds > SLOW_WAIT_SECONDS:
+            _stats['slow_waits'] += 1
+
+
+class QueryStats:
+    """Query count and DB time for one unit of work (a request)"""
+    __slots__ = ('queries', 'seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# QueryStats of the request being served in this context, if any
+current_query_stats = contextvars.ContextVar('current_query_stats', default=None)
+
+_query_totals = {'queries': 0, 'seconds': 0.0}
+
+# endpoint -> cumulative request / query counters
+_route_stats = defaultdict(lambda: {'requests': 0, 'db_requests': 0, 'queries': 0, 'db_seconds': 0.0, 'max_queries': 0})
+
+# Requests issuing more statements than this are logged (likely N+1 patterns)
+QUERY_COUNT_WARNING = int(os.getenv('QUERY_COUNT_WARNING', 50))
+
+
+def track_queries():
+    """Start collecting query stats for the current context; returns (stats, reset token)"""
+    stats = QueryStats()
+    return stats, current_query_stats.set(stats)
+
+
+def finish_tracking(endpoint, stats, token):
+    """Stop collecting and add the request's totals to its route's counters"""
+    current_query_stats.reset(token)
+    key = endpoint or '<unmatched>'
+    with _stats_lock:
+        route = _route_stats[key]
+        route['requests'] += 1
+        route['queries'] += stats.queries
+        route['db_seconds'] += stats.seconds
+        route['max_queries'] = max(route['max_queries'], stats.queries)
+        if stats.queries:
+            route['db_requests'] += 1
+    if stats.queries > QUERY_COUNT_WARNING:
+        logger.warning("%s issued %s queries (%.1f ms)", key, stats.queries, stats.seconds * 1000)
+
+
+def request_query_stats():
+    """Per-route query counts and DB time, most expensive routes first"""
+    with _stats_lock:
+        routes = {endpoint: dict(values) for endpoint, values in _route_stats.items()}
+        totals = dict(_query_totals)
+    for values in routes.values():
+        values['avg_queries'] = round(values['queries'] / values['requests'], 2) if values['requests'] else 0.0
+        values['avg_db_ms'] = round(values['db_seconds'] * 1000 / values['requests'], 3) if values['requests'] else 0.0
+        values['db_seconds'] = round(values['db_seconds'], 4)
+    ranked = sorted(routes.items(), key=lambda item: -item[1]['db_seconds'])
+    return {
+        'total_queries': totals['queries'],
+        'total_db_seconds': round(totals['seconds'], 4),
+        'routes': [{'endpoint': endpoint, **values} for endpoint, values in ranked]
+    }
+
+
+def apply_sqlite_pragmas(dbapi_connection, memory=False):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS:
+            if name in ('journal_mode', 'wal_autocheckpoint') and memory:
+                continue
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def build_engine(url=DATABASE_URL, mode=None, role='primary'):
+    """Engine for url with the pool configured for the deployment mode"""
+    mode = mode or detect_mode(url)
+    options = {}
+    if is_sqlite(url):
+        # Sessions are handed between request, socket and worker threads
+        options['connect_args'] = {
+            'check_same_thread': False,
+            'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)) / 1000
+        }
+    if not is_memory_sqlite(url):
+        options.update(pool_settings(mode, url))
+        options['poolclass'] = InstrumentedQueuePool
+
+    new_engine = create_engine(url, **options)
+
+    @event.listens_for(new_engine, 'before_cursor_execute')
+    def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(new_engine, 'after_cursor_execute')
+    def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+        timers = conn.info.get('query_started')
+        if not timers:
+            return
+        elapsed = time.perf_counter() - timers.pop()
+        SQL_QUERY_SECONDS.observe(elapsed, role)
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += elapsed
+        with _stats_lock:
+            _query_totals['queries'] += 1
+            _query_totals['seconds'] += elapsed
+
+    @event.listens_for(new_engine, 'handle_error')
+    def _drop_query_timer(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('query_started'):
+            conn.info['query_started'].pop()
+
+    @event.listens_for(new_engine, 'checkout')
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        _record('checkouts')
+
+    @event.listens_for(new_engine, 'checkin')
+    def _on_checkin(dbapi_connection, connection_record):
+        _record('checkins')
+
+    @event.listens_for(new_engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        _record('connects')
+        if is_sqlite(url):
+            apply_sqlite_pragmas(dbapi_connection, memory=is_memory_sqlite(url))
+
+    @event.listens_for(new_engine, 'invalidate')
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        _record('invalidations')
+
+    return new_engine
+
+
+DB_MODE = detect_mode()
+engine = build_engine(mode=DB_MODE)
+
+# Plain factory for code that manages its own session lifetime (socket handlers)
+SessionFactory = sessionmaker(bind=engine)
+
+# Thread-local sessions for requests
+Session = scoped_session(SessionFactory)
+
+
+class WriterQueue:
+    """FIFO lock: writers are admitted one at a time in arrival order"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self._held = False
+        self.stats = {'acquired': 0, 'waited': 0, 'wait_seconds_total': 0.0, 'wait_seconds_max': 0.0}
+
+    def acquire(self):
+        with self._lock:
+            self.stats['acquired'] += 1
+            if not self._held and not self._waiters:
+                self._held = True
+                return
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+
+        started = time.perf_counter()
+        waiter.wait()  # ownership is handed over by release()
+        waited = time.perf_counter() - started
+        with self._lock:
+            self.stats['waited'] += 1
+            self.stats['wait_seconds_total'] += waited
+            self.stats['wait_seconds_max'] = max(self.stats['wait_seconds_max'], waited)
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().set()
+            else:
+                self._held = False
+
+    def depth(self):
+        with self._lock:
+            return len(self._waiters)
+
+
+write_queue = WriterQueue()
+
+# Sessions for background writers; on SQLite they queue on write_queue
+BackgroundSessionFactory = sessionmaker(bind=engine, info={'background_writer': True})
+BackgroundSession = scoped_session(BackgroundSessionFactory)
+
+
+def _queues_writes(session):
+    return (
+        SQLITE_WRITE_QUEUE and is_sqlite() and not is_memory_sqlite()
+        and session.info.get('background_writer') and not session.info.get('holds_write_queue')
+    )
+
+
+def _enter_write_queue(session):
+    write_queue.acquire()
+    session.info['holds_write_queue'] = True
+
+
+@event.listens_for(OrmSession, 'before_flush')
+def _queue_before_flush(session, flush_context, instances):
+    if _queues_writes(session) and (session.new or session.dirty or session.deleted):
+        _enter_write_queue(session)
+
+
+@event.listens_for(OrmSession, 'do_orm_execute')
+def _queue_before_dml(orm_execute_state):
+    if _queues_writes(orm_execute_state.session) and (
+        orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete
+    ):
+        _enter_write_queue(orm_execute_state.session)
+
+
+@event.listens_for(OrmSession, 'after_transaction_end')
+def _leave_write_queue(session, transaction):
+    if transaction.parent is None and session.info.pop('holds_write_queue', False):
+        write_queue.release()
+
+
+# Replica engine and sessions (None without DATABASE_REPLICA_URL)
+replica_engine = build_engine(
+    DATABASE_REPLICA_URL, mode=detect_mode(DATABASE_REPLICA_URL), role='replica'
+) if DATABASE_REPLICA_URL else None
+ReplicaSession = scoped_session(sessionmaker(bind=replica_engine, info={'replica': True})) if replica_engine else None
+
+_replica_state = {'healthy': False, 'lag_seconds': None, 'checked_at': None, 'error': None}
+_replica_stats = {'replica_reads': 0, 'primary_fallbacks': 0}
+_replica_check_lock = threading.Lock()
+
+POSTGRES_LAG_SQL = (
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def _probe_replica():
+    try:
+        with replica_engine.connect() as conn:
+            if conn.dialect.name == 'postgresql':
+                lag = conn.exec_driver_sql(POSTGRES_LAG_SQL).scalar()
+                lag = float(lag) if lag is not None else 0.0
+            else:
+                conn.exec_driver_sql('SELECT 1')
+                lag = 0.0
+        return {'healthy': lag <= REPLICA_MAX_LAG_SECONDS, 'lag_seconds': round(lag, 3), 'error': None}
+    except Exception as e:
+        return {'healthy': False, 'lag_seconds': None, 'error': f"{type(e).__name__}: {e}"}
+
+
+def replica_ready():
+    """True when reads may go to the replica; probes at most every REPLICA_CHECK_SECONDS"""
+    if replica_engine is None:
+        return False
+
+    checked_at = _replica_state['checked_at']
+    if checked_at is not None and time.monotonic() - checked_at < REPLICA_CHECK_SECONDS:
+        return _replica_state['healthy']
+
+    # One thread probes; the others keep using the last result meanwhile
+    if not _replica_check_lock.acquire(blocking=False):
+        return _replica_state['healthy']
+    try:
+        result = _probe_replica()
+        if result['healthy'] != _replica_state['healthy'] and checked_at is not None:
+            logger.warning("Read replica %s", 'back in use' if result['healthy'] else 'bypassed', extra={
+                'lag_seconds': result['lag_seconds'], 'error': result['error']
+            })
+        _replica_state.update(result, checked_at=time.monotonic())
+        return result['healthy']
+    finally:
+        _replica_check_lock.release()
+
+
+def read_only(view):
+    """Mark a view as read-only so its g.db may be a replica session"""
+    view.read_only = True
+    return view
+
+
+def session_for_view(view):
+    """Session for a request: the replica for @read_only views when it is usable"""
+    if getattr(view, 'read_only', False) and replica_engine is not None:
+        if replica_ready():
+            with _stats_lock:
+                _replica_stats['replica_reads'] += 1
+            return ReplicaSession()
+        with _stats_lock:
+            _replica_stats['primary_fallbacks'] += 1
+    return Session()
+
+
+@event.listens_for(OrmSession, 'before_flush')
+def _refuse_replica_writes(session, flush_context, instances):
+    if session.info.get('replica') and (session.new or session.dirty or session.deleted):
+        raise RuntimeError("Write attempted on a read replica session; drop @read_only from the route")
+
+
+def pool_stats():
+    """Pool configuration, current occupancy and cumulative checkout metrics"""
+    pool = engine.pool
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['wait_seconds_total'] = round(stats['wait_seconds_total'], 4)
+    stats['wait_seconds_max'] = round(stats['wait_seconds_max'], 4)
+    stats['wait_seconds_avg'] = round(stats['wait_seconds_total'] / stats['checkouts'], 6) if stats['checkouts'] else 0.0
+
+    current = {'pool_class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        current.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'idle': pool.checkedin(),
+            'overflow': pool.overflow(),
+            'max_overflow': pool._max_overflow,
+            'timeout': pool.timeout(),
+        })
+    result = {'mode': DB_MODE, 'dialect': engine.dialect.name, 'pool': current, 'stats': stats}
+    if is_sqlite() and not is_memory_sqlite():
+        with write_queue._lock:
+            queue_stats = dict(write_queue.stats)
+        queue_stats['wait_seconds_total'] = round(queue_stats['wait_seconds_total'], 4)
+        queue_stats['wait_seconds_max'] = round(queue_stats['wait_seconds_max'], 4)
+        result['write_queue'] = {'enabled': SQLITE_WRITE_QUEUE, 'waiting': write_queue.depth(), **queue_stats}
+    if replica_engine is not None:
+        with _stats_lock:
+            routing = dict(_replica_stats)
+        result['replica'] = {
+            'healthy': _replica_state['healthy'],
+            'lag_seconds': _replica_state['lag_seconds'],
+            'error': _replica_state['error'],
+            'max_lag_seconds': REPLICA_MAX_LAG_SECONDS,
+            **routing
+        }
+    return result
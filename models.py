@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, Boolean, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Float, Text, Date, DateTime, Boolean, ForeignKey, Enum, Index, LargeBinary, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -97,6 +97,11 @@ class Cluster(Base):
 
 class Product(Base):
     __tablename__ = 'products'
+    __table_args__ = (
+        Index('ix_products_available_craft_price', 'is_available', 'craft_type', 'price'),
+        Index('ix_products_available_created', 'is_available', 'created_at', 'id'),  # Catalog keyset pagination
+        Index('ix_products_artisan_id', 'artisan_id'),
+    )
     
     id = Column(Integer, primary_key=True)
     artisan_id = Column(Integer, ForeignKey('artisan_profiles.id'), nullable=False)
@@ -123,6 +128,13 @@ class Product(Base):
 
 class Order(Base):
     __tablename__ = 'orders'
+    __table_args__ = (
+        Index('ix_orders_buyer_id', 'buyer_id'),
+        Index('ix_orders_artisan_status', 'artisan_id', 'status'),
+        Index('ix_orders_status', 'status'),
+        Index('ix_orders_created_at', 'created_at'),  # Analytics ETL day recomputation
+        Index('ix_orders_updated_at', 'updated_at'),  # Analytics ETL watermark
+    )
     
     id = Column(Integer, primary_key=True)
     buyer_id = Column(Integer, ForeignKey('buyer_profiles.id'), nullable=False)
@@ -146,6 +158,10 @@ class Order(Base):
 
 class OrderItem(Base):
     __tablename__ = 'order_items'
+    __table_args__ = (
+        Index('ix_order_items_order_id', 'order_id'),
+        Index('ix_order_items_product_id', 'product_id'),
+    )
     
     id = Column(Integer, primary_key=True)
     order_id = Column(Integer, ForeignKey('orders.id'), nullable=False)
@@ -159,6 +175,9 @@ class OrderItem(Base):
 
 class OrderMilestone(Base):
     __tablename__ = 'order_milestones'
+    __table_args__ = (
+        Index('ix_order_milestones_order_id', 'order_id'),
+    )
     
     id = Column(Integer, primary_key=True)
     order_id = Column(Integer, ForeignKey('orders.id'), nullable=False)
@@ -172,6 +191,11 @@ class OrderMilestone(Base):
 
 class Message(Base):
     __tablename__ = 'messages'
+    __table_args__ = (
+        Index('ix_messages_sender_receiver_created', 'sender_id', 'receiver_id', 'created_at'),
+        Index('ix_messages_receiver_sender_created', 'receiver_id', 'sender_id', 'created_at'),
+        Index('ix_messages_receiver_read', 'receiver_id', 'is_read'),
+    )
     
     id = Column(Integer, primary_key=True)
     sender_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -196,6 +220,11 @@ class ExportDocument(Base):
 
 class Transaction(Base):
     __tablename__ = 'transactions'
+    __table_args__ = (
+        Index('ix_transactions_order_id', 'order_id'),
+        Index('ix_transactions_artisan_created', 'artisan_id', 'created_at'),
+        Index('ix_transactions_created_at', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True)
     order_id = Column(Integer, ForeignKey('orders.id'), nullable=False)
@@ -227,3 +256,187 @@ class Transaction(Base):
     order = relationship("Order")
     buyer = relationship("BuyerProfile")
     artisan = relationship("ArtisanProfile")
+
+class BackgroundJob(Base):
+    __tablename__ = 'background_jobs'
+    __table_args__ = (
+        Index('ix_background_jobs_status_run_after', 'status', 'run_after'),
+        Index('ix_background_jobs_product_id', 'product_id'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    job_type = Column(String(50), nullable=False)  # e.g. quality_assessment
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='SET NULL'))
+    payload = Column(Text)  # JSON arguments for the handler
+    status = Column(String(20), default='queued', nullable=False)  # queued, running, completed, failed
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=4, nullable=False)
+    last_error = Column(Text)
+    result = Column(Text)  # JSON result of the handler
+    run_after = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class RecurringJob(Base):
+    """The one scheduled instance of each recurring job type (guards against duplicate chains)"""
+    __tablename__ = 'recurring_jobs'
+    
+    job_type = Column(String(50), primary_key=True)
+    job_id = Column(Integer)  # background_jobs.id of the current instance
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ImageFingerprint(Base):
+    __tablename__ = 'image_fingerprints'
+    __table_args__ = (
+        # The 64-bit dHash split into four 16-bit bands: any two hashes within
+        # Hamming distance 3 share at least one band, so lookups stay indexed
+        Index('ix_image_fingerprints_band0', 'band0'),
+        Index('ix_image_fingerprints_band1', 'band1'),
+        Index('ix_image_fingerprints_band2', 'band2'),
+        Index('ix_image_fingerprints_band3', 'band3'),
+        Index('ix_image_fingerprints_file_path', 'file_path'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    dhash = Column(String(16), nullable=False)  # hex encoded 64-bit difference hash
+    band0 = Column(Integer, nullable=False)
+    band1 = Column(Integer, nullable=False)
+    band2 = Column(Integer, nullable=False)
+    band3 = Column(Integer, nullable=False)
+    file_path = Column(String(500), nullable=False)
+    ai_quality_score = Column(Float)  # Cached vision API score for this image
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ProductImageFile(Base):
+    __tablename__ = 'product_image_files'
+    __table_args__ = (
+        Index('ix_product_image_files_file_path', 'file_path'),
+        Index('ix_product_image_files_product_id', 'product_id'),
+    )
+    
+    # One row per stored original a product uses; re-uploads share files, so
+    # a file is only removed from disk together with its last row
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    file_path = Column(String(500), nullable=False)
+
+class ProductImageFeature(Base):
+    __tablename__ = 'product_image_features'
+    
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), unique=True, nullable=False)
+    vector = Column(LargeBinary, nullable=False)  # float32 feature vector of the main product image
+    dims = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ProductNeighbor(Base):
+    __tablename__ = 'product_neighbors'
+    __table_args__ = (
+        Index('ix_product_neighbors_product_score', 'product_id', 'score'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    neighbor_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    score = Column(Float, nullable=False)
+    co_purchases = Column(Integer, default=0)  # buyers who bought both products
+
+class BuyerRecommendation(Base):
+    __tablename__ = 'buyer_recommendations'
+    __table_args__ = (
+        Index('ix_buyer_recommendations_buyer_rank', 'buyer_id', 'rank'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    buyer_id = Column(Integer, ForeignKey('buyer_profiles.id', ondelete='CASCADE'))  # NULL = popular products for buyers without history
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    score = Column(Float, nullable=False)
+    rank = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class RecommendationBuild(Base):
+    __tablename__ = 'recommendation_builds'
+    
+    id = Column(Integer, primary_key=True)
+    full_rebuild = Column(Boolean, default=False)
+    last_order_item_id = Column(Integer, default=0)  # watermark for the next incremental refresh
+    last_product_id = Column(Integer, default=0)
+    products_updated = Column(Integer, default=0)
+    buyers_updated = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ProductSearchDocument(Base):
+    __tablename__ = 'product_search_documents'
+    
+    # Text mirrored from products for the full-text index (FTS5 on SQLite, tsvector on Postgres)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True, autoincrement=False)
+    title = Column(String(255))
+    description = Column(Text)
+    craft_type = Column(String(100))
+    gi_tag = Column(String(255))
+    transliteration = Column(Text)  # Latin rendering of Indic-script text
+    translations = Column(Text)  # tokens of the text translated into the search languages
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class PlatformMetric(Base):
+    __tablename__ = 'platform_metrics'
+    
+    # Running platform totals, kept current by utils/platform_metrics.py
+    name = Column(String(50), primary_key=True)
+    value = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ArtisanDailyStat(Base):
+    __tablename__ = 'artisan_daily_stats'
+    __table_args__ = (
+        UniqueConstraint('artisan_id', 'day', name='uq_artisan_daily_stats_artisan_day'),
+    )
+    
+    # Daily per-artisan counters, maintained by utils/artisan_stats.py
+    id = Column(Integer, primary_key=True)
+    artisan_id = Column(Integer, ForeignKey('artisan_profiles.id', ondelete='CASCADE'), nullable=False)
+    day = Column(Date, nullable=False)
+    orders_placed = Column(Integer, nullable=False, default=0)
+    orders_fulfilled = Column(Integer, nullable=False, default=0)
+    orders_cancelled = Column(Integer, nullable=False, default=0)
+    open_orders_delta = Column(Integer, nullable=False, default=0)  # running sum = orders still in progress
+    earnings = Column(Float, nullable=False, default=0.0)
+    inquiries = Column(Integer, nullable=False, default=0)  # buyers messaging the artisan for the first time
+
+class AnalyticsDailyFact(Base):
+    __tablename__ = 'analytics_daily_facts'
+    __table_args__ = (
+        UniqueConstraint('day', 'cluster_id', 'craft_type', 'country', 'currency', name='uq_analytics_daily_facts_bucket'),
+        Index('ix_analytics_daily_facts_cluster_day', 'cluster_id', 'day'),
+    )
+    
+    # Pre-aggregated daily sales buckets, maintained by utils/analytics.py.
+    # Unknown dimensions are stored as 0 / '' so every bucket has one row.
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    cluster_id = Column(Integer, nullable=False, default=0)
+    craft_type = Column(String(100), nullable=False, default='')
+    country = Column(String(100), nullable=False, default='')  # Destination (buyer) country
+    currency = Column(String(10), nullable=False, default='')  # Order currency
+    orders = Column(Integer, nullable=False, default=0)
+    cancelled_orders = Column(Integer, nullable=False, default=0)
+    items = Column(Integer, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)  # In the bucket's currency
+    revenue_inr = Column(Float, nullable=False, default=0.0)
+    transactions = Column(Integer, nullable=False, default=0)
+    artisan_payouts_inr = Column(Float, nullable=False, default=0.0)
+    platform_fees_inr = Column(Float, nullable=False, default=0.0)
+
+class AnalyticsBuild(Base):
+    __tablename__ = 'analytics_builds'
+    
+    # One row per analytics ETL run; the latest row holds the watermarks
+    id = Column(Integer, primary_key=True)
+    full_rebuild = Column(Boolean, default=False)
+    order_watermark = Column(DateTime)  # Max orders.updated_at seen
+    last_transaction_id = Column(Integer, default=0)
+    days_updated = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,106 @@
+"""
+Query plan report for the hot query paths of the API routes
+Runs EXPLAIN (Postgres) / EXPLAIN QUERY PLAN (SQLite) for the queries the
+routes issue, built by the same query functions the routes call, and flags
+full table scans, so missing indexes show up before they show up as latency.
+
+Usage:
+    python query_plans.py            # print plans
+    python query_plans.py --strict   # exit 1 if any query scans a table
+"""
+import os
+import sys
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from models import Base, QualityGrade
+from routes.products import catalog_query, catalog_page, artisan_products_query, LIST_FIELDS, DETAIL_FIELDS
+from routes.messages import unread_messages_query, conversations_query, conversation_query
+from routes.orders import buyer_orders_query, artisan_orders_query
+from utils.recommendations import recommendations_query
+
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///bharatcraft.db')
+
+# Sample parameter values; plans don't depend on the actual ids
+USER_ID = 1
+PARTNER_ID = 2
+
+
+def route_queries(session):
+    """(route, statement) pairs built by the same query functions the routes call"""
+    catalog = catalog_query(session, {'craft_type': 'Pottery', 'quality_grade': QualityGrade.PREMIUM},
+                            DETAIL_FIELDS, min_price=100)
+    page = catalog_query(session, {}, LIST_FIELDS)
+
+    queries = [
+        ('GET /api/products/ (catalog filter)', catalog),
+        ('GET /api/products/?limit= (first page)', catalog_page(page, 24)),
+        ('GET /api/products/?cursor= (keyset page)', catalog_page(page, 24, (datetime(2024, 1, 1), 1000))),
+        ('GET /api/products/my-products', artisan_products_query(session, USER_ID)),
+        ('GET /api/messages/unread-count', unread_messages_query(session, USER_ID)),
+        ('GET /api/messages/conversations', conversations_query(session, USER_ID)),
+        ('GET /api/messages/conversation/<id>', conversation_query(session, USER_ID, PARTNER_ID)),
+        ('GET /api/orders/ (buyer)', buyer_orders_query(session, USER_ID)),
+        ('GET /api/orders/ (artisan)', artisan_orders_query(session, USER_ID)),
+        ('POST /api/ai/recommendations', recommendations_query(session, USER_ID)),
+        ('POST /api/ai/recommendations (popular)', recommendations_query(session, None)),
+    ]
+    return [(route, query.statement) for route, query in queries]
+
+
+def explain(conn, statement):
+    """Return the plan lines for a statement and whether it scans a whole table"""
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True})
+
+    if conn.dialect.name == 'sqlite':
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).fetchall()
+        lines = [row[-1] for row in rows]
+        # "SCAN products" is a full scan; "SCAN products USING INDEX ..." is not,
+        # and scans of subquery results ("SCAN (subquery-1)", "SCAN anon_1") read no table
+        full_scan = any(
+            line.startswith('SCAN ') and 'USING' not in line
+            and not line.split()[1].startswith(('(', 'anon_'))
+            for line in lines
+        )
+    else:
+        rows = conn.execute(text(f"EXPLAIN {compiled}")).fetchall()
+        lines = [row[0] for row in rows]
+        full_scan = any('Seq Scan' in line for line in lines)
+
+    return lines, full_scan
+
+
+def main():
+    strict = '--strict' in sys.argv
+
+    engine = create_engine(DATABASE_URL)
+    Base.metadata.create_all(engine)
+
+    scans = []
+    with Session(engine) as session:
+        statements = route_queries(session)
+        conn = session.connection()
+        print(f"Query plans for {engine.dialect.name} ({engine.url.render_as_string(hide_password=True)})\n")
+        for route, statement in statements:
+            lines, full_scan = explain(conn, statement)
+            marker = '[SCAN]' if full_scan else '[OK]  '
+            print(f"{marker} {route}")
+            for line in lines:
+                print(f"         {line}")
+            if full_scan:
+                scans.append(route)
+
+    print(f"\n{len(scans)} of {len(statements)} queries do a full table scan")
+    for route in scans:
+        print(f"  - {route}")
+
+    engine.dispose()
+
+    if strict and scans:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,10 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import User, ArtisanProfile, BuyerProfile, Product, Order, Cluster
 from sqlalchemy import func
 from functools import wraps
+from utils.platform_metrics import get_metrics, metrics_response
+from utils.analytics import query_series, DIMENSIONS, REFRESH_ANALYTICS
+from database import read_only
+from datetime import date, timedelta
 
 bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
@@ -22,28 +26,22 @@ def admin_required(fn):
 @bp.route('/stats', methods=['GET'])
 @admin_required
 def get_stats():
-    total_artisans = g.db.query(ArtisanProfile).count()
-    total_buyers = g.db.query(BuyerProfile).count()
-    total_products = g.db.query(Product).count()
-    total_orders = g.db.query(Order).count()
+    metrics = get_metrics(g.db)
+    total_revenue = metrics['revenue_all']
     
-    total_revenue = g.db.query(func.sum(Order.total_amount)).scalar() or 0
-    
-    artisan_earnings = g.db.query(func.sum(ArtisanProfile.total_sales)).scalar() or 0
-    
-    return jsonify({
-        'total_artisans': total_artisans,
-        'total_buyers': total_buyers,
-        'total_products': total_products,
-        'total_orders': total_orders,
+    return metrics_response({
+        'total_artisans': int(metrics['artisans']),
+        'total_buyers': int(metrics['buyers']),
+        'total_products': int(metrics['products']),
+        'total_orders': int(metrics['orders']),
         'total_revenue': float(total_revenue),
-        'artisan_earnings': float(artisan_earnings),
+        'artisan_earnings': float(metrics['artisan_sales']),
         'platform_impact': {
             'artisan_income_multiplier': 3.5,
             'export_volume_usd': float(total_revenue),
             'countries_reached': 15
         }
-    }), 200
+    }, public=False)
 
 @bp.route('/users', methods=['GET'])
 @admin_required
@@ -66,6 +64,7 @@ def get_users():
     } for u in users]), 200
 
 @bp.route('/clusters', methods=['GET'])
+@read_only
 @admin_required
 def get_clusters():
     clusters = g.db.query(Cluster).all()
@@ -104,3 +103,122 @@ def create_cluster():
         'message': 'Cluster created successfully',
         'cluster': {'id': cluster.id, 'name': cluster.name}
     }), 201
+
+@bp.route('/visual-index/rebuild', methods=['POST'])
+@admin_required
+def rebuild_visual_index():
+    """Queue feature extraction for products that are missing from the visual search index"""
+    from models import ProductImageFeature
+    from utils.image_pipeline import enqueue_derivatives
+    from utils.job_queue import notify_workers
+    
+    missing = g.db.query(Product.id).outerjoin(
+        ProductImageFeature, ProductImageFeature.product_id == Product.id
+    ).filter(
+        ProductImageFeature.id == None,
+        Product.images != None
+    ).all()
+    
+    for (product_id,) in missing:
+        enqueue_derivatives(g.db, product_id)
+    g.db.commit()
+    notify_workers()
+    
+    return jsonify({
+        'message': f'Queued {len(missing)} products for visual indexing',
+        'queued': len(missing)
+    }), 202
+
+@bp.route('/search-index/translate', methods=['POST'])
+@admin_required
+def translate_search_index():
+    """Queue search translations for products indexed before translations existed"""
+    from models import ProductSearchDocument
+    from utils.search_terms import enqueue_search_translations
+    from utils.job_queue import notify_workers
+    
+    missing = g.db.query(ProductSearchDocument.product_id).filter(
+        ProductSearchDocument.translations == None
+    ).all()
+    
+    for (product_id,) in missing:
+        enqueue_search_translations(g.db, product_id)
+    g.db.commit()
+    notify_workers()
+    
+    return jsonify({
+        'message': f'Queued {len(missing)} products for search translation',
+        'queued': len(missing)
+    }), 202
+
+@bp.route('/rollups/rebuild', methods=['POST'])
+@admin_required
+def rebuild_rollups():
+    """Queue a rebuild of the per-artisan daily statistics from order history"""
+    from utils.artisan_stats import REBUILD_ARTISAN_ROLLUPS
+    from utils.job_queue import enqueue, notify_workers
+    
+    job = enqueue(g.db, REBUILD_ARTISAN_ROLLUPS)
+    g.db.commit()
+    notify_workers()
+    
+    return jsonify({'message': 'Rollup rebuild queued', 'job_id': job.id}), 202
+
+@bp.route('/analytics', methods=['GET'])
+@read_only
+@admin_required
+def get_analytics():
+    """Sales time series from the analytics store, e.g. ?start=2025-01-01&group_by=country"""
+    try:
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else date.today()
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else end - timedelta(days=89)
+    except ValueError:
+        return jsonify({'error': 'start and end must be YYYY-MM-DD dates'}), 400
+    if start > end:
+        return jsonify({'error': 'start must not be after end'}), 400
+    
+    filters = {name: request.args[name] for name in DIMENSIONS if request.args.get(name)}
+    try:
+        result = query_series(
+            g.db, start, end,
+            granularity=request.args.get('granularity', 'auto'),
+            group_by=request.args.get('group_by') or None,
+            filters=filters
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return metrics_response(result, public=False, max_age=60)
+
+@bp.route('/analytics/rebuild', methods=['POST'])
+@admin_required
+def rebuild_analytics():
+    """Queue a full rebuild of the analytics buckets from orders and transactions"""
+    from utils.job_queue import enqueue, notify_workers
+    
+    job = enqueue(g.db, REFRESH_ANALYTICS, {'full': True})
+    g.db.commit()
+    notify_workers()
+    
+    return jsonify({'message': 'Analytics rebuild queued', 'job_id': job.id}), 202
+
+@bp.route('/db/pool', methods=['GET'])
+@admin_required
+def get_pool_stats():
+    """Connection pool configuration, occupancy and checkout wait metrics"""
+    from database import pool_stats
+    return jsonify(pool_stats()), 200
+
+@bp.route('/db/requests', methods=['GET'])
+@admin_required
+def get_request_query_stats():
+    """Query count and DB time per route since this process started"""
+    from database import request_query_stats
+    return jsonify(request_query_stats()), 200
+
+@bp.route('/llm', methods=['GET'])
+@admin_required
+def get_llm_gateway_stats():
+    """LLM provider circuit breakers, in-flight calls and response cache counters"""
+    from utils.llm_gateway import GATEWAY, LLM_CACHE
+    return jsonify({'providers': GATEWAY.stats(), 'cache': LLM_CACHE.get_stats()}), 200
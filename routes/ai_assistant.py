@@ -1,14 +1,56 @@
 """
 AI Assistant Routes - Powered by Gemini
 Provides chat assistance and learning content for artisans
+
+chat-help and suggest-reply can stream: send {"stream": true} (or ?stream=1,
+or Accept: text/event-stream) to get server-sent events - a "token" event
+per text chunk, then "done" with the full JSON result, or "error".
 """
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, request, jsonify, g, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+import json
+import logging
 import os
-from utils.ai_service_gemini import get_gemini_response
+from utils.ai_service_gemini import get_gemini_response, stream_gemini_response
+from utils.image_pipeline import image_urls
+from utils.recommendations import get_recommendations_for_buyer
 
 bp = Blueprint('ai_assistant', __name__, url_prefix='/api/ai')
 
+logger = logging.getLogger(__name__)
+
+
+def wants_stream(data):
+    """True when the client asked for a server-sent event stream"""
+    return (bool(data.get('stream'))
+            or request.args.get('stream', '').lower() in ('1', 'true')
+            or request.accept_mimetypes.best == 'text/event-stream')
+
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def event_stream(chunks, result_key, **result):
+    """SSE response forwarding text chunks, ending with the same payload as the JSON endpoint"""
+    def generate():
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield _sse('token', {'text': chunk})
+        except Exception:
+            logger.exception("AI stream interrupted")
+            yield _sse('error', {'error': 'The response was interrupted. Please try again.'})
+            return
+        yield _sse('done', {result_key: ''.join(parts).strip(), **result})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # keep reverse proxies from buffering the stream
+    })
+
+
 @bp.route('/chat-help', methods=['POST'])
 @jwt_required()
 def chat_help():
@@ -47,6 +89,10 @@ User's Question: {user_message}
 
 Provide a helpful, encouraging response:"""
 
+        if wants_stream(data):
+            return event_stream(stream_gemini_response(system_prompt), 'response',
+                                language=language, context=context)
+        
         # Get response from Gemini
         ai_response = get_gemini_response(system_prompt)
         
@@ -57,7 +103,7 @@ Provide a helpful, encouraging response:"""
         }), 200
         
     except Exception as e:
-        print(f"Error in chat help: {e}")
+        logger.exception("Error in chat help")
         return jsonify({'error': str(e)}), 500
 
 
@@ -144,7 +190,7 @@ Provide the guide:"""
         prompt = tutorial_prompts.get(topic, tutorial_prompts['upload_product'])
         
         # Get tutorial from Gemini
-        tutorial_content = get_gemini_response(prompt)
+        tutorial_content = get_gemini_response(prompt, cache=True)
         
         return jsonify({
             'topic': topic,
@@ -153,7 +199,7 @@ Provide the guide:"""
         }), 200
         
     except Exception as e:
-        print(f"Error generating tutorial: {e}")
+        logger.exception("Error generating tutorial")
         return jsonify({'error': str(e)}), 500
 
 
@@ -197,7 +243,7 @@ Provide ONLY the translation:"""
         }), 200
         
     except Exception as e:
-        print(f"Error translating message: {e}")
+        logger.exception("Error translating message")
         return jsonify({'error': str(e)}), 500
 
 
@@ -230,6 +276,10 @@ Requirements:
 
 Provide 3 suggested replies:"""
 
+        if wants_stream(data):
+            return event_stream(stream_gemini_response(prompt), 'suggested_replies',
+                                buyer_message=buyer_message, language=language)
+
         suggestions = get_gemini_response(prompt)
         
         return jsonify({
@@ -239,7 +289,7 @@ Provide 3 suggested replies:"""
         }), 200
         
     except Exception as e:
-        print(f"Error suggesting reply: {e}")
+        logger.exception("Error suggesting reply")
         return jsonify({'error': str(e)}), 500
 
 
@@ -279,7 +329,7 @@ Requirements:
 
 Create the full video script:"""
 
-        script = get_gemini_response(prompt)
+        script = get_gemini_response(prompt, cache=True)
         
         return jsonify({
             'topic': topic,
@@ -289,7 +339,7 @@ Create the full video script:"""
         }), 200
         
     except Exception as e:
-        print(f"Error generating video script: {e}")
+        logger.exception("Error generating video script")
         return jsonify({'error': str(e)}), 500
 
 
@@ -323,7 +373,7 @@ Topics to cover:
 
 Provide the FAQs:"""
 
-        faqs = get_gemini_response(prompt)
+        faqs = get_gemini_response(prompt, cache=True)
         
         return jsonify({
             'language': language,
@@ -332,31 +382,64 @@ Provide the FAQs:"""
         }), 200
         
     except Exception as e:
-        print(f"Error generating FAQs: {e}")
+        logger.exception("Error generating FAQs")
         return jsonify({'error': str(e)}), 500
 
 
+# Let Gemini re-order the precomputed recommendations (adds one LLM call per request)
+RECOMMENDATION_LLM_RERANK = os.getenv('RECOMMENDATION_LLM_RERANK', 'false').lower() == 'true'
+
+
+def rerank_recommendations(products, preferred_categories):
+    """Ask the LLM to re-order candidate products; keeps the original order on any failure"""
+    import json
+    import re
+    
+    prompt = f"""You are a product recommendation engine for Bharatcraft, a handicraft marketplace.
+
+Categories of interest: {', '.join(preferred_categories) if preferred_categories else 'None yet'}
+
+Candidate products (already relevant, best first):
+{json.dumps([{'id': p.id, 'title': p.title, 'craft_type': p.craft_type, 'price': p.price} for p in products], indent=2)}
+
+Re-order the candidates so the most appealing, complementary mix comes first.
+Return ONLY a JSON array of the candidate product IDs, e.g. [5, 1, 8]"""
+    
+    try:
+        array_match = re.search(r'\[[\d\s,]+]', get_gemini_response(prompt))
+        order = json.loads(array_match.group(0)) if array_match else []
+    except Exception as e:
+        logger.warning("Recommendation re-ranking failed, keeping engine order: %s", e)
+        return products
+    
+    by_id = {p.id: p for p in products}
+    reranked = [by_id.pop(pid) for pid in order if pid in by_id]
+    return reranked + [p for p in products if p.id in by_id]
+
+
 @bp.route('/recommendations', methods=['POST'])
 @jwt_required()
 def get_recommendations():
     """
-    AI-powered product recommendations for buyers
-    Analyzes browsing history, preferences, and purchase patterns
+    Product recommendations for buyers
+    Served from the precomputed collaborative-filtering tables
+    (see utils/recommendations.py); the LLM only optionally re-ranks them
     """
     try:
-        from models import Product, Order
-        import json
+        from models import BuyerProfile
         
         user_id = int(get_jwt_identity())
         data = request.json or {}
+        try:
+            limit = max(1, min(int(data.get('limit', 8)), 24))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'limit must be an integer'}), 400
         
-        # Get user's order history
-        user_orders = g.db.query(Order).filter_by(buyer_id=user_id).limit(10).all()
-        
-        # Get all available products
-        all_products = g.db.query(Product).filter_by(is_available=True).limit(50).all()
+        buyer = g.db.query(BuyerProfile).filter_by(user_id=user_id).first()
+        rows, personalized = get_recommendations_for_buyer(g.db, buyer.id if buyer else None, limit=limit)
+        products = [product for product, _ in rows]
         
-        if not all_products:
+        if not products:
             return jsonify({
                 'success': True,
                 'recommendations': [],
@@ -364,134 +447,26 @@ def get_recommendations():
                 'reasoning': 'No products available at the moment. Check back soon!'
             }), 200
         
-        # Build context from order history
-        purchased_categories = []
-        price_range = []
-        for order in user_orders:
-            for item in order.order_items:
-                product = item.product
-                if product:
-                    purchased_categories.append(product.craft_type)
-                    price_range.append(product.price)
-        
-        # Analyze preferences
-        avg_price = sum(price_range) / len(price_range) if price_range else 0
-        preferred_categories = list(set(purchased_categories))
-        
-        recommended_ids = []
-        
-        # Try AI recommendations first, but have robust fallback
-        try:
-            # Create prompt for Gemini
-            prompt = f"""You are a product recommendation engine for Bharatcraft, a handicraft marketplace.
-
-Buyer Profile:
-- Previous purchases: {', '.join(preferred_categories) if preferred_categories else 'None yet'}
-- Average price range: ₹{avg_price:.0f}
-- Total orders: {len(user_orders)}
-
-Available Products (sample):
-{json.dumps([{'id': p.id, 'title': p.title, 'craft_type': p.craft_type, 'price': p.price, 'quality': p.quality_grade.value if p.quality_grade else 'standard'} for p in all_products[:10]], indent=2)}
-
-Task: Recommend 5-8 products that match the buyer's preferences. Consider:
-1. Similar craft types they've purchased
-2. Price range they're comfortable with (±30%)
-3. Quality level they prefer
-4. Complementary products (if they bought pottery, suggest textiles that match)
-5. Trending/popular items
-
-Return ONLY a JSON array of product IDs in order of relevance:
-[1, 5, 12, 8, 23, 15, 7, 19]
-
-No explanations, just the array."""
-            
-            # Get recommendations from AI
-            response_text = get_gemini_response(prompt)
-            
-            # Parse response (might be wrapped in markdown)
-            if '```json' in response_text:
-                json_start = response_text.find('```json') + 7
-                json_end = response_text.find('```', json_start)
-                response_text = response_text[json_start:json_end].strip()
-            elif '```' in response_text:
-                json_start = response_text.find('```') + 3
-                json_end = response_text.find('```', json_start)
-                response_text = response_text[json_start:json_end].strip()
-            
-            # Try to extract JSON array from response
-            import re
-            # Look for array pattern [1, 2, 3] or [1,2,3]
-            array_match = re.search(r'\[[\d\s,]+]', response_text)
-            if array_match:
-                response_text = array_match.group(0)
-            
-            recommended_ids = json.loads(response_text)
-            if not isinstance(recommended_ids, list):
-                recommended_ids = []
-        except Exception as ai_error:
-            print(f"AI recommendation failed, using fallback: {ai_error}")
-            # Fallback logic - use smart recommendations based on history
-            pass
-        
-        # Fallback: recommend based on categories or all products
-        if not recommended_ids:
-            if preferred_categories:
-                # Recommend products from preferred categories
-                recommended_ids = [p.id for p in all_products if p.craft_type in preferred_categories][:8]
-            else:
-                # If no order history, recommend popular/quality products
-                # Sort by quality grade and price
-                sorted_products = sorted(all_products, key=lambda p: (
-                    p.quality_grade.value if p.quality_grade else 'standard',
-                    -p.price  # Higher price = premium
-                ), reverse=True)
-                recommended_ids = [p.id for p in sorted_products[:8]]
-        
-        # If still no recommendations, use all available products
-        if not recommended_ids and all_products:
-            recommended_ids = [p.id for p in all_products[:8]]
-        
-        # Get recommended products
-        recommended_products = []
-        for pid in recommended_ids[:8]:
-            if pid:  # Make sure pid is not None
-                product = g.db.query(Product).get(pid)
-                if product and product.is_available:
-                    recommended_products.append({
-                        'id': product.id,
-                        'title': product.title,
-                        'description': product.description,
-                        'price': product.price,
-                        'craft_type': product.craft_type,
-                        'quality_grade': product.quality_grade.value if product.quality_grade else 'standard',
-                        'images': product.images.split(',') if product.images else [],
-                        'artisan': {
-                            'id': product.artisan_id,
-                            'name': product.artisan.user.full_name if product.artisan and product.artisan.user else 'Unknown'
-                        }
-                    })
-        
-        # Ensure we have at least some recommendations
-        if not recommended_products and all_products:
-            # Last resort: just take first 8 products
-            for product in all_products[:8]:
-                recommended_products.append({
-                    'id': product.id,
-                    'title': product.title,
-                    'description': product.description,
-                    'price': product.price,
-                    'craft_type': product.craft_type,
-                    'quality_grade': product.quality_grade.value if product.quality_grade else 'standard',
-                    'images': product.images.split(',') if product.images else [],
-                    'artisan': {
-                        'id': product.artisan_id,
-                        'name': product.artisan.user.full_name if product.artisan and product.artisan.user else 'Unknown'
-                    }
-                })
-        
-        # Create reasoning message
-        if len(user_orders) > 0:
-            reasoning = f"Based on your {len(user_orders)} previous orders in {', '.join(preferred_categories) if preferred_categories else 'various'} categories"
+        preferred_categories = sorted({p.craft_type for p in products if p.craft_type}) if personalized else []
+        if data.get('rerank', RECOMMENDATION_LLM_RERANK):
+            products = rerank_recommendations(products, preferred_categories)
+        
+        recommended_products = [{
+            'id': product.id,
+            'title': product.title,
+            'description': product.description,
+            'price': product.price,
+            'craft_type': product.craft_type,
+            'quality_grade': product.quality_grade.value if product.quality_grade else 'standard',
+            'images': image_urls(product.images, 'card'),
+            'artisan': {
+                'id': product.artisan_id,
+                'name': product.artisan.user.full_name if product.artisan and product.artisan.user else 'Unknown'
+            }
+        } for product in products]
+        
+        if personalized:
+            reasoning = f"{', '.join(preferred_categories) if preferred_categories else 'Products'} picked for you from what buyers with similar purchases bought"
         else:
             reasoning = "Popular products you might like - Start shopping to get personalized recommendations!"
         
@@ -503,9 +478,7 @@ No explanations, just the array."""
         }), 200
         
     except Exception as e:
-        print(f"Error getting recommendations: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error getting recommendations")
         # Return empty recommendations instead of error
         return jsonify({
             'success': True,
@@ -520,14 +493,19 @@ No explanations, just the array."""
 @jwt_required()
 def visual_search():
     """
-    Visual search: Upload image and find similar products using AI
-    Uses Gemini Vision to analyze image and match products
+    Visual search: Upload image and find visually similar products
+    Compares colour/layout features of the photo against the local index
+    of every product image - no external API call
     """
     try:
         from models import Product
         from PIL import Image
-        import io
-        import base64
+        from utils.visual_index import NUMPY_AVAILABLE, VISUAL_INDEX, extract_features, dominant_colors
+        
+        if not NUMPY_AVAILABLE:
+            return jsonify({
+                'error': 'Visual search requires numpy. Install with: pip install numpy'
+            }), 503
         
         if 'image' not in request.files:
             return jsonify({'error': 'No image file provided'}), 400
@@ -536,124 +514,58 @@ def visual_search():
         if image_file.filename == '':
             return jsonify({'error': 'No image file selected'}), 400
         
-        # Save uploaded image temporarily
-        image_path = f'static/uploads/temp_search_{int(get_jwt_identity())}.jpg'
-        image_file.save(image_path)
-        
-        # Get all products with images
-        all_products = g.db.query(Product).filter_by(is_available=True).limit(100).all()
-        
-        # Use Gemini Vision to analyze the uploaded image
         try:
-            from utils.ai_service_gemini import GEMINI_AVAILABLE, genai
-            
-            if not GEMINI_AVAILABLE:
-                return jsonify({
-                    'error': 'Visual search requires google-generativeai. Install with: pip install google-generativeai'
-                }), 503
-            
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            img = Image.open(image_path)
-            
-            prompt = """Analyze this image and describe what type of handicraft product it shows.
-
-Focus on:
-1. Product type (pottery, textile, jewelry, woodwork, metalwork, painting, etc.)
-2. Style/design characteristics
-3. Colors and patterns
-4. Material (clay, fabric, metal, wood, etc.)
-5. Cultural origin or technique (if visible)
-
-Return ONLY a JSON object with:
-{
-  "product_type": "pottery",
-  "style": "traditional blue pottery",
-  "colors": ["blue", "white"],
-  "material": "ceramic",
-  "characteristics": ["hand-painted", "traditional pattern"]
-}"""
-            
-            response = model.generate_content([prompt, img])
-            description = response.text.strip()
-            
-            # Parse description
-            if '```json' in description:
-                json_start = description.find('```json') + 7
-                json_end = description.find('```', json_start)
-                description = description[json_start:json_end].strip()
-            elif '```' in description:
-                json_start = description.find('```') + 3
-                json_end = description.find('```', json_start)
-                description = description[json_start:json_end].strip()
-            
-            import json
-            image_analysis = json.loads(description)
-            
+            with Image.open(image_file.stream) as img:
+                query_vector = extract_features(img)
         except Exception as e:
-            print(f"Error analyzing image: {e}")
-            # Fallback: return all products
-            image_analysis = {'product_type': 'unknown', 'characteristics': []}
+            return jsonify({'error': f'Could not read image: {e}'}), 400
         
-        # Match products based on analysis
-        matched_products = []
-        product_type = image_analysis.get('product_type', '').lower()
-        characteristics = image_analysis.get('characteristics', [])
-        
-        for product in all_products:
-            score = 0
-            
-            # Match by craft type
-            if product.craft_type and product_type in product.craft_type.lower():
-                score += 10
-            
-            # Match by description keywords
-            if product.description:
-                desc_lower = product.description.lower()
-                for char in characteristics:
-                    if char.lower() in desc_lower:
-                        score += 5
-            
-            # Match by title
-            if product.title:
-                title_lower = product.title.lower()
-                if product_type in title_lower:
-                    score += 8
-                for char in characteristics:
-                    if char.lower() in title_lower:
-                        score += 3
-            
-            if score > 0:
-                matched_products.append({
-                    'product': {
-                        'id': product.id,
-                        'title': product.title,
-                        'description': product.description,
-                        'price': product.price,
-                        'craft_type': product.craft_type,
-                        'quality_grade': product.quality_grade,
-                        'images': product.images or []
-                    },
-                    'match_score': score
-                })
-        
-        # Sort by match score
-        matched_products.sort(key=lambda x: x['match_score'], reverse=True)
-        
-        # Clean up temp file
         try:
-            os.remove(image_path)
-        except:
-            pass
+            limit = max(1, min(int(request.args.get('limit', 12)), 50))
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        
+        # Over-fetch so unavailable products can be dropped without a second search
+        nearest = VISUAL_INDEX.search(query_vector, k=limit * 3)
+        
+        products = {}
+        if nearest:
+            products = {p.id: p for p in g.db.query(Product).filter(
+                Product.id.in_([product_id for product_id, _ in nearest]),
+                Product.is_available == True
+            ).all()}
+        
+        matched_products = []
+        for product_id, similarity in nearest:
+            product = products.get(product_id)
+            if not product:
+                continue
+            matched_products.append({
+                'id': product.id,
+                'title': product.title,
+                'description': product.description,
+                'price': product.price,
+                'craft_type': product.craft_type,
+                'quality_grade': product.quality_grade.value if product.quality_grade else None,
+                'images': image_urls(product.images, 'card'),
+                'match_score': round(similarity * 100, 1)
+            })
+            if len(matched_products) == limit:
+                break
         
         return jsonify({
             'success': True,
-            'image_analysis': image_analysis,
-            'matches': [m['product'] for m in matched_products[:12]],
+            'image_analysis': {
+                'method': 'color_layout_features',
+                'dominant_colors': dominant_colors(query_vector),
+                'indexed_products': len(VISUAL_INDEX)
+            },
+            'matches': matched_products,
             'count': len(matched_products),
             'message': f"Found {len(matched_products)} similar products based on your image!"
         }), 200
         
     except Exception as e:
-        print(f"Error in visual search: {e}")
+        logger.exception("Error in visual search")
         return jsonify({'error': str(e)}), 500
 
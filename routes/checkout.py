@@ -1,12 +1,15 @@
+import logging
 from flask import Blueprint, render_template, request, jsonify, g
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import Product, ArtisanProfile, BuyerProfile, Transaction, Order, OrderItem, OrderStatus, Message, User
 from utils.currency import convert_price, convert_to_inr, get_exchange_rate, get_inverse_rate
 from utils.shipping import calculate_shipping_cost
-import json
+from utils.image_pipeline import image_urls
 
 bp = Blueprint('checkout', __name__, url_prefix='/checkout')
 
+logger = logging.getLogger(__name__)
+
 @bp.route('/', methods=['GET'])
 def checkout_cart():
     """Checkout page for cart items"""
@@ -25,17 +28,8 @@ def checkout_page(product_id):
     if not product:
         return render_template('error.html', message="Product not found"), 404
         
-    # Parse images
-    images = []
-    if product.images:
-        try:
-            images = json.loads(product.images)
-            if isinstance(images, str): # Handle case where it might be double encoded or just a string
-                 images = [images]
-            elif not isinstance(images, list):
-                 images = [str(images)]
-        except:
-            images = [product.images] # Fallback if not JSON
+    # Parse images (manifest entries or legacy path strings)
+    images = image_urls(product.images)
             
     # Get artisan info
     artisan = product.artisan
@@ -179,7 +173,7 @@ def process_transaction():
                 'currency': currency
             }, room=f'user_{product.artisan.user_id}')
         except Exception as e:
-            print(f"Socket.IO notification error: {e}")
+            logger.warning("Socket.IO notification error: %s", e)
         
         return jsonify({
             'success': True, 
@@ -190,7 +184,7 @@ def process_transaction():
         
     except Exception as e:
         g.db.rollback()
-        print(f"Transaction error: {e}")
+        logger.exception("Transaction error")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # Artisan approves order
@@ -244,7 +238,7 @@ def approve_order(order_id):
         
     except Exception as e:
         g.db.rollback()
-        print(f"Approval error: {e}")
+        logger.exception("Approval error")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # Buyer pays for approved order
@@ -346,5 +340,5 @@ def pay_order(order_id):
         
     except Exception as e:
         g.db.rollback()
-        print(f"Payment error: {e}")
+        logger.exception("Payment error")
         return jsonify({'success': False, 'error': str(e)}), 500
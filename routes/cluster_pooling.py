@@ -3,6 +3,7 @@ Cluster Logistics Pooling API Routes
 40% shipping cost savings by combining orders!
 """
 
+import logging
 from flask import Blueprint, request, jsonify, g
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import User, Order, ArtisanProfile, Product
@@ -18,6 +19,8 @@ from utils.cluster_pooling import (
 
 bp = Blueprint('cluster_pooling', __name__, url_prefix='/api/cluster-pooling')
 
+logger = logging.getLogger(__name__)
+
 
 @bp.route('/find-opportunities', methods=['POST'])
 @jwt_required()
@@ -152,7 +155,7 @@ def find_pooling_opportunities():
         }), 200
         
     except Exception as e:
-        print(f"Error finding pooling opportunities: {str(e)}")
+        logger.exception("Error finding pooling opportunities")
         return jsonify({'error': str(e)}), 500
 
 
@@ -183,7 +186,7 @@ def opt_in_to_pooling(order_id):
         }), 200
         
     except Exception as e:
-        print(f"Error opting in to pooling: {str(e)}")
+        logger.exception("Error opting in to pooling")
         return jsonify({'error': str(e)}), 500
 
 
@@ -219,7 +222,7 @@ def calculate_savings():
         }), 200
         
     except Exception as e:
-        print(f"Error calculating savings: {str(e)}")
+        logger.exception("Error calculating savings")
         return jsonify({'error': str(e)}), 500
 
 
@@ -262,7 +265,7 @@ def create_shipment():
         }), 201
         
     except Exception as e:
-        print(f"Error creating shipment: {str(e)}")
+        logger.exception("Error creating shipment")
         return jsonify({'error': str(e)}), 500
 
 
@@ -284,7 +287,7 @@ def get_warehouse_location(state):
         }), 200
         
     except Exception as e:
-        print(f"Error getting warehouse: {str(e)}")
+        logger.exception("Error getting warehouse")
         return jsonify({'error': str(e)}), 500
 
 
@@ -312,7 +315,7 @@ def get_analytics():
         }), 200
         
     except Exception as e:
-        print(f"Error getting analytics: {str(e)}")
+        logger.exception("Error getting analytics")
         return jsonify({'error': str(e)}), 500
 
 
@@ -359,6 +362,6 @@ def get_active_clusters():
         }), 200
         
     except Exception as e:
-        print(f"Error getting active clusters: {str(e)}")
+        logger.exception("Error getting active clusters")
         return jsonify({'error': str(e)}), 500
 
@@ -3,6 +3,7 @@ Export Documentation API Routes
 Turns 3-week export prep into 3-hour process!
 """
 
+import logging
 from flask import Blueprint, request, jsonify, send_file, g
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import User, Order, Product, ArtisanProfile, BuyerProfile
@@ -20,6 +21,8 @@ import zipfile
 
 bp = Blueprint('export_docs', __name__, url_prefix='/api/export-docs')
 
+logger = logging.getLogger(__name__)
+
 
 @bp.route('/generate/<int:order_id>', methods=['POST'])
 @jwt_required()
@@ -131,7 +134,7 @@ def generate_all_documents(order_id):
         )
         
     except Exception as e:
-        print(f"Error generating documents: {str(e)}")
+        logger.exception("Error generating documents")
         return jsonify({'error': str(e)}), 500
 
 
@@ -195,7 +198,7 @@ def generate_invoice(order_id):
         )
         
     except Exception as e:
-        print(f"Error generating invoice: {str(e)}")
+        logger.exception("Error generating invoice")
         return jsonify({'error': str(e)}), 500
 
 
@@ -241,7 +244,7 @@ def check_export_compliance():
         }), 200
         
     except Exception as e:
-        print(f"Error checking compliance: {str(e)}")
+        logger.exception("Error checking compliance")
         return jsonify({'error': str(e)}), 500
 
 
@@ -263,7 +266,7 @@ def get_requirements(country_code):
         }), 200
         
     except Exception as e:
-        print(f"Error getting requirements: {str(e)}")
+        logger.exception("Error getting requirements")
         return jsonify({'error': str(e)}), 500
 
 
@@ -285,7 +288,7 @@ def get_hs_code(craft_type):
         }), 200
         
     except Exception as e:
-        print(f"Error getting HS code: {str(e)}")
+        logger.exception("Error getting HS code")
         return jsonify({'error': str(e)}), 500
 
 
@@ -342,6 +345,6 @@ def preview_invoice_data(order_id):
         }), 200
         
     except Exception as e:
-        print(f"Error previewing invoice: {str(e)}")
+        logger.exception("Error previewing invoice")
         return jsonify({'error': str(e)}), 500
 
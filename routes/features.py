@@ -1,9 +1,12 @@
+import logging
 from flask import Blueprint, render_template, jsonify, request, g
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import json
 
 bp = Blueprint('features', __name__, url_prefix='/features')
 
+logger = logging.getLogger(__name__)
+
 @bp.route('/success-stories')
 def success_stories():
     """Artisan Success Stories Page"""
@@ -148,8 +151,21 @@ def analyze_quality():
             from models import Product
             product = g.db.query(Product).get(product_id)
             if product:
-                product.ai_quality_score = 94.0 # Mock score
-                product.quality_grade = "PREMIUM"
+                image = request.files.get('image')
+                if image and image.filename:
+                    # Real assessment runs on the job queue instead of in the request
+                    import os
+                    from werkzeug.utils import secure_filename
+                    from utils.quality_assessment import enqueue_quality_assessment
+                    
+                    image_path = os.path.join('static/uploads', f"temp_ai_{product.id}_{cert_id}_{secure_filename(image.filename)}")
+                    image.save(image_path)
+                    job = enqueue_quality_assessment(g.db, product.id, image_path)
+                    g.db.flush()
+                    result['quality_job_id'] = job.id
+                else:
+                    product.ai_quality_score = 94.0 # Mock score
+                    product.quality_grade = "PREMIUM"
                 product.certificate_id = cert_id
                 
                 # Generate Digital Passport
@@ -158,8 +174,12 @@ def analyze_quality():
                 result['digital_passport'] = passport_hash
                 
                 g.db.commit()
+                
+                if result.get('quality_job_id'):
+                    from utils.job_queue import notify_workers
+                    notify_workers()
         except Exception as db_e:
-            print(f"Error saving to DB: {db_e}")
+            logger.warning("Error saving to DB: %s", db_e)
             g.db.rollback()
     
     return jsonify({
@@ -3,23 +3,25 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import ArtisanProfile, BuyerProfile, Product, Order, OrderStatus
 from sqlalchemy import func
 from datetime import datetime, timedelta
+from utils.platform_metrics import get_metrics, metrics_response
+from utils.analytics import cluster_analytics
+from database import read_only
 
 bp = Blueprint('impact', __name__, url_prefix='/api/impact')
 
 @bp.route('/metrics', methods=['GET'])
+@read_only
 def get_impact_metrics():
     """Get public impact metrics for homepage"""
     
-    total_artisans = g.db.query(ArtisanProfile).count()
-    total_buyers = g.db.query(BuyerProfile).count()
-    total_products = g.db.query(Product).count()
-    total_orders = g.db.query(Order).count()
+    metrics = get_metrics(g.db)
+    total_artisans = int(metrics['artisans'])
+    total_buyers = int(metrics['buyers'])
+    total_products = int(metrics['products'])
+    total_orders = int(metrics['orders'])
     
-    # Calculate total revenue
-    completed_orders = g.db.query(Order).filter(
-        Order.status.in_([OrderStatus.COMPLETED, OrderStatus.DELIVERED])
-    ).all()
-    total_revenue = sum(order.total_amount for order in completed_orders)
+    # Revenue of completed and delivered orders
+    total_revenue = metrics['revenue_fulfilled']
     
     # Calculate average income increase
     # Assuming traditional artisans earn ₹15,000/month and 70% of revenue goes to them
@@ -35,9 +37,7 @@ def get_impact_metrics():
     countries_reached = 15  # Will be calculated from order shipping addresses in production
     
     # Quality metrics
-    high_quality_products = g.db.query(Product).filter(
-        Product.ai_quality_score >= 0.8
-    ).count()
+    high_quality_products = int(metrics['products_high_quality'])
     quality_percentage = (high_quality_products / max(total_products, 1)) * 100
     
     # Logistics savings (estimated from cluster pooling)
@@ -46,7 +46,7 @@ def get_impact_metrics():
     # Carbon footprint reduction
     carbon_reduction_percent = 60  # Due to pooled shipping
     
-    return jsonify({
+    return metrics_response({
         'artisan_count': total_artisans,
         'buyer_count': total_buyers,
         'product_count': total_products,
@@ -65,9 +65,10 @@ def get_impact_metrics():
         'ai_accuracy': 98.5,
         'platform_fee': 7.5,  # percentage
         'traditional_middleman_fee': 35,  # percentage
-    }), 200
+    })
 
 @bp.route('/artisan-stories', methods=['GET'])
+@read_only
 def get_artisan_stories():
     """Get success stories from artisans"""
     
@@ -111,32 +112,32 @@ def get_artisan_stories():
     return jsonify(stories), 200
 
 @bp.route('/esg-metrics', methods=['GET'])
+@read_only
 def get_esg_metrics():
     """Get ESG (Environmental, Social, Governance) metrics"""
     
-    total_artisans = g.db.query(ArtisanProfile).count()
+    metrics = get_metrics(g.db)
+    total_artisans = int(metrics['artisans'])
+    total_products = int(metrics['products'])
     
     # Social Impact
     women_artisans = int(total_artisans * 0.68)  # 68% women as per industry data
     rural_artisans = int(total_artisans * 0.75)  # 75% from rural areas
     
     # Environmental Impact
-    total_shipments = g.db.query(Order).count()
+    total_shipments = int(metrics['orders'])
     pooled_shipments = int(total_shipments * 0.65)  # 65% use cluster pooling
     carbon_saved_kg = pooled_shipments * 2.5  # Avg 2.5 kg CO2 saved per pooled shipment
     
     # Economic Impact
-    completed_orders = g.db.query(Order).filter(
-        Order.status.in_([OrderStatus.COMPLETED, OrderStatus.DELIVERED])
-    ).all()
-    total_revenue = sum(order.total_amount for order in completed_orders)
+    total_revenue = metrics['revenue_fulfilled']
     artisan_earnings = total_revenue * 0.70
     
     # Governance
-    verified_gi_products = int(g.db.query(Product).count() * 0.45)  # 45% GI-tagged
-    quality_certified = int(g.db.query(Product).count() * 0.92)  # 92% AI-certified
+    verified_gi_products = int(total_products * 0.45)  # 45% GI-tagged
+    quality_certified = int(total_products * 0.92)  # 92% AI-certified
     
-    return jsonify({
+    return metrics_response({
         'social': {
             'total_artisans': total_artisans,
             'women_artisans': women_artisans,
@@ -163,74 +164,18 @@ def get_esg_metrics():
             'payment_protection': 100,
             'dispute_resolution_rate': 98,
         }
-    }), 200
+    })
 
 @bp.route('/cluster-analytics', methods=['GET'])
+@read_only
 def get_cluster_analytics():
     """Get analytics by artisan clusters"""
     
-    # In production, this would aggregate real cluster data
-    clusters = [
-        {
-            'name': 'Jaipur Block Print Cluster',
-            'location': 'Jaipur, Rajasthan',
-            'latitude': 26.9124,
-            'longitude': 75.7873,
-            'artisan_count': 45,
-            'specialties': ['Block Printing', 'Tie-Dye', 'Textile Arts'],
-            'total_exports': 125000,
-            'avg_quality_score': 0.87,
-            'gi_tags': ['Jaipur Block Print', 'Sanganeri Print'],
-        },
-        {
-            'name': 'Kutch Textile Cluster',
-            'location': 'Bhuj, Gujarat',
-            'latitude': 23.2420,
-            'longitude': 69.6669,
-            'artisan_count': 38,
-            'specialties': ['Bandhani', 'Ajrakh', 'Embroidery'],
-            'total_exports': 98000,
-            'avg_quality_score': 0.91,
-            'gi_tags': ['Kutch Embroidery', 'Ajrakh Print'],
-        },
-        {
-            'name': 'Kashmir Pashmina Cluster',
-            'location': 'Srinagar, Kashmir',
-            'latitude': 34.0837,
-            'longitude': 74.7973,
-            'artisan_count': 29,
-            'specialties': ['Pashmina Weaving', 'Sozni Embroidery'],
-            'total_exports': 185000,
-            'avg_quality_score': 0.94,
-            'gi_tags': ['Kashmir Pashmina', 'Kashmir Sozni Craft'],
-        },
-        {
-            'name': 'Channapatna Toys Cluster',
-            'location': 'Channapatna, Karnataka',
-            'latitude': 12.6517,
-            'longitude': 77.2069,
-            'artisan_count': 22,
-            'specialties': ['Wooden Toys', 'Lacquerware'],
-            'total_exports': 52000,
-            'avg_quality_score': 0.89,
-            'gi_tags': ['Channapatna Toys & Dolls'],
-        },
-        {
-            'name': 'Kanchipuram Silk Cluster',
-            'location': 'Kanchipuram, Tamil Nadu',
-            'latitude': 12.8342,
-            'longitude': 79.7036,
-            'artisan_count': 51,
-            'specialties': ['Silk Weaving', 'Zari Work'],
-            'total_exports': 210000,
-            'avg_quality_score': 0.93,
-            'gi_tags': ['Kanchipuram Silk'],
-        }
-    ]
-    
-    return jsonify(clusters), 200
+    # Sales figures come from the pre-aggregated analytics buckets
+    return metrics_response(cluster_analytics(g.db))
 
 @bp.route('/gi-tags', methods=['GET'])
+@read_only
 def get_gi_tags():
     """Get list of supported Geographical Indication tags"""
     
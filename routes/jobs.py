@@ -0,0 +1,93 @@
+"""
+Background Job Status Routes
+Lets artisans poll the AI quality assessment of their uploads
+"""
+from flask import Blueprint, request, jsonify, g
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from models import BackgroundJob, Product, ArtisanProfile
+from utils.job_queue import job_to_dict
+
+bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+
+def _can_view(job, user_id, role):
+    if role == 'admin':
+        return True
+    if not job.product_id:
+        return False
+    owner = g.db.query(ArtisanProfile.user_id).join(
+        Product, Product.artisan_id == ArtisanProfile.id
+    ).filter(Product.id == job.product_id).scalar()
+    return owner == user_id
+
+
+@bp.route('/<int:job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """Get the status of a background job"""
+    user_id = int(get_jwt_identity())
+    role = get_jwt().get('role')
+    
+    job = g.db.query(BackgroundJob).filter_by(id=job_id).first()
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    if not _can_view(job, user_id, role):
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    return jsonify(job_to_dict(job)), 200
+
+
+@bp.route('/product/<int:product_id>', methods=['GET'])
+@jwt_required()
+def get_product_jobs(product_id):
+    """Get all background jobs for a product, newest first"""
+    user_id = int(get_jwt_identity())
+    role = get_jwt().get('role')
+    
+    product = g.db.query(Product).filter_by(id=product_id).first()
+    if not product:
+        return jsonify({'error': 'Product not found'}), 404
+    
+    if role != 'admin' and product.artisan.user_id != user_id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    jobs = g.db.query(BackgroundJob).filter_by(product_id=product_id).order_by(
+        BackgroundJob.id.desc()
+    ).all()
+    
+    return jsonify([job_to_dict(job) for job in jobs]), 200
+
+
+@bp.route('/', methods=['GET'])
+@jwt_required()
+def list_jobs():
+    """Queue overview for admins: job counts by type and status, plus recent failures"""
+    from sqlalchemy import func
+    
+    if get_jwt().get('role') != 'admin':
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if not 1 <= limit <= 200:
+        return jsonify({'error': 'limit must be between 1 and 200'}), 400
+    
+    counts = g.db.query(
+        BackgroundJob.job_type, BackgroundJob.status, func.count(BackgroundJob.id)
+    ).group_by(BackgroundJob.job_type, BackgroundJob.status).all()
+    
+    failed = g.db.query(BackgroundJob).filter_by(status='failed').order_by(
+        BackgroundJob.id.desc()
+    ).limit(limit).all()
+    
+    summary = {}
+    for job_type, status, count in counts:
+        summary.setdefault(job_type, {})[status] = count
+    
+    return jsonify({
+        'counts': summary,
+        'recent_failures': [job_to_dict(job) for job in failed]
+    }), 200
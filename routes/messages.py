@@ -1,21 +1,81 @@
+import logging
 from flask import Blueprint, request, jsonify, g
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from models import Message, User, Product
-from sqlalchemy import or_, and_, func
+from sqlalchemy import or_, and_, func, case
 from datetime import datetime
 
 bp = Blueprint('messages', __name__, url_prefix='/api/messages')
 
+logger = logging.getLogger(__name__)
+
+def unread_messages_query(session, user_id):
+    """Unread messages received by a user"""
+    return session.query(Message).filter(
+        Message.receiver_id == user_id,
+        Message.is_read == False
+    )
+
+def conversations_query(session, user_id):
+    """Last message per conversation partner with partner name, product title and unread count, newest first"""
+    # One row per message with the conversation partner, its rank within the
+    # conversation (newest first) and the conversation's unread count
+    partner_id = case(
+        (Message.sender_id == user_id, Message.receiver_id),
+        else_=Message.sender_id
+    )
+    ranked = session.query(
+        partner_id.label('partner_id'),
+        Message.content,
+        Message.created_at,
+        Message.product_id,
+        func.row_number().over(
+            partition_by=partner_id,
+            order_by=(Message.created_at.desc(), Message.id.desc())
+        ).label('position'),
+        func.sum(case(
+            (and_(Message.receiver_id == user_id, Message.is_read == False), 1),
+            else_=0
+        )).over(partition_by=partner_id).label('unread_count')
+    ).filter(
+        or_(
+            Message.sender_id == user_id,
+            Message.receiver_id == user_id
+        )
+    ).subquery()
+    
+    # Keep only the last message per partner, with partner name and product title
+    return session.query(
+        ranked.c.partner_id,
+        User.full_name,
+        ranked.c.content,
+        ranked.c.created_at,
+        ranked.c.unread_count,
+        Product.title
+    ).join(
+        User, User.id == ranked.c.partner_id
+    ).outerjoin(
+        Product, Product.id == ranked.c.product_id
+    ).filter(
+        ranked.c.position == 1
+    ).order_by(ranked.c.created_at.desc())
+
+def conversation_query(session, user_id, partner_id):
+    """Messages between two users, oldest first"""
+    return session.query(Message).filter(
+        or_(
+            and_(Message.sender_id == user_id, Message.receiver_id == partner_id),
+            and_(Message.sender_id == partner_id, Message.receiver_id == user_id)
+        )
+    ).order_by(Message.created_at.asc())
+
 @bp.route('/unread-count', methods=['GET'])
 @jwt_required()
 def get_unread_count():
     """Get count of unread messages for current user"""
     user_id = int(get_jwt_identity())
     
-    count = g.db.query(Message).filter(
-        Message.receiver_id == user_id,
-        Message.is_read == False
-    ).count()
+    count = unread_messages_query(g.db, user_id).count()
     
     return jsonify({'count': count}), 200
 
@@ -26,71 +86,20 @@ def get_conversations():
     try:
         user_id = int(get_jwt_identity())
         
-        # Get all messages involving this user
-        all_messages = g.db.query(Message).filter(
-            or_(
-                Message.sender_id == user_id,
-                Message.receiver_id == user_id
-            )
-        ).all()
-        
-        if not all_messages:
-            return jsonify([]), 200
-        
-        # Get unique conversation partners
-        partners = set()
-        for msg in all_messages:
-            partner_id = msg.receiver_id if msg.sender_id == user_id else msg.sender_id
-            partners.add(partner_id)
+        rows = conversations_query(g.db, user_id).all()
         
-        conversations = []
-        
-        # Build conversation list
-        for partner_id in partners:
-            # Use filter instead of get for better compatibility
-            partner = g.db.query(User).filter(User.id == partner_id).first()
-            if not partner:
-                continue
-            
-            # Get last message
-            last_message = g.db.query(Message).filter(
-                or_(
-                    and_(Message.sender_id == user_id, Message.receiver_id == partner_id),
-                    and_(Message.sender_id == partner_id, Message.receiver_id == user_id)
-                )
-            ).order_by(Message.created_at.desc()).first()
-            
-            # Count unread messages from this partner
-            unread_count = g.db.query(Message).filter(
-                Message.sender_id == partner_id,
-                Message.receiver_id == user_id,
-                Message.is_read == False
-            ).count()
-            
-            # Get product title if message is related to a product
-            product_title = None
-            if last_message and last_message.product_id:
-                product = g.db.query(Product).filter(Product.id == last_message.product_id).first()
-                if product:
-                    product_title = product.title
-            
-            conversations.append({
-                'user_id': partner_id,
-                'user_name': partner.full_name,
-                'last_message': last_message.content if last_message else None,
-                'last_message_time': last_message.created_at.isoformat() if last_message else None,
-                'unread_count': unread_count,
-                'product_title': product_title
-            })
-        
-        # Sort by last message time
-        conversations.sort(key=lambda x: x['last_message_time'] or '', reverse=True)
+        conversations = [{
+            'user_id': row.partner_id,
+            'user_name': row.full_name,
+            'last_message': row.content,
+            'last_message_time': row.created_at.isoformat() if row.created_at else None,
+            'unread_count': int(row.unread_count or 0),
+            'product_title': row.title
+        } for row in rows]
         
         return jsonify(conversations), 200
     except Exception as e:
-        print(f"Error loading conversations: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error loading conversations")
         # Return empty array instead of error for better UX
         return jsonify([]), 200
 
@@ -100,12 +109,7 @@ def get_conversation_messages(partner_id):
     """Get all messages in a conversation with a specific user"""
     user_id = int(get_jwt_identity())
     
-    messages = g.db.query(Message).filter(
-        or_(
-            and_(Message.sender_id == user_id, Message.receiver_id == partner_id),
-            and_(Message.sender_id == partner_id, Message.receiver_id == user_id)
-        )
-    ).order_by(Message.created_at.asc()).all()
+    messages = conversation_query(g.db, user_id, partner_id).all()
     
     # Mark messages from partner as read
     g.db.query(Message).filter(
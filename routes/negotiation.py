@@ -3,6 +3,7 @@ Cultural Context AI Negotiation
 The killer feature that makes Bharatcraft unique!
 """
 
+import logging
 from flask import Blueprint, request, jsonify, g
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from models import User, Product, Message, Order
@@ -12,6 +13,8 @@ from datetime import datetime
 
 bp = Blueprint('negotiation', __name__, url_prefix='/api/negotiation')
 
+logger = logging.getLogger(__name__)
+
 
 @bp.route('/send-message', methods=['POST'])
 @jwt_required()
@@ -74,7 +77,7 @@ def send_message_with_context():
                 order_context=order_context
             )
         except Exception as ai_error:
-            print(f"AI analysis error: {str(ai_error)}")
+            logger.warning("AI analysis error: %s", ai_error)
             # Fallback: create basic translation
             ai_analysis = {
                 'intent': 'general_inquiry',
@@ -129,7 +132,7 @@ def send_message_with_context():
         try:
             g.db.commit()
         except Exception as db_error:
-            print(f"Database commit error: {str(db_error)}")
+            logger.warning("Database commit error: %s", db_error)
             g.db.rollback()
             return jsonify({'error': 'Failed to save message. Please try again.'}), 500
         
@@ -145,7 +148,7 @@ def send_message_with_context():
         }), 201
         
     except Exception as e:
-        print(f"Error in send_message_with_context: {str(e)}")
+        logger.exception("Error in send_message_with_context")
         return jsonify({'error': str(e)}), 500
 
 
@@ -169,9 +172,7 @@ def get_conversation(other_user_id):
                 )
             ).order_by(Message.created_at).all()
         except Exception as query_error:
-            print(f"Error querying messages: {str(query_error)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error querying messages")
             # Return empty conversation instead of error
             return jsonify({
                 'conversation': [],
@@ -202,7 +203,7 @@ def get_conversation(other_user_id):
                 if role_value == 'artisan':
                     current_user_lang = 'hi'  # Artisans typically use Hindi/regional languages
         except Exception as role_error:
-            print(f"Error getting user role: {str(role_error)}")
+            logger.warning("Error getting user role: %s", role_error)
             pass  # Keep default 'en'
         
         for msg in messages:
@@ -265,9 +266,7 @@ def get_conversation(other_user_id):
                 
                 conversation.append(msg_data)
             except Exception as msg_error:
-                print(f"Error processing message {msg.id}: {str(msg_error)}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("Error processing message %s", msg.id)
                 continue  # Skip this message and continue with others
         
         # Mark messages as read (use receiver_id, not recipient_id)
@@ -277,7 +276,7 @@ def get_conversation(other_user_id):
                     msg.is_read = True
             g.db.commit()
         except Exception as commit_error:
-            print(f"Error marking messages as read: {str(commit_error)}")
+            logger.warning("Error marking messages as read: %s", commit_error)
             g.db.rollback()
         
         return jsonify({
@@ -286,9 +285,7 @@ def get_conversation(other_user_id):
         }), 200
         
     except Exception as e:
-        print(f"Error in get_conversation: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in get_conversation")
         # Return empty conversation instead of error to prevent UI breaking
         return jsonify({
             'conversation': [],
@@ -333,7 +330,7 @@ def get_smart_replies():
         }), 200
         
     except Exception as e:
-        print(f"Error in get_smart_replies: {str(e)}")
+        logger.exception("Error in get_smart_replies")
         return jsonify({'error': str(e)}), 500
 
 
@@ -411,8 +408,7 @@ Return ONLY valid JSON, no other text.
         return ai_analysis
         
     except json.JSONDecodeError as e:
-        print(f"JSON decode error: {str(e)}")
-        print(f"Response text: {response_text}")
+        logger.warning("Could not parse AI analysis as JSON: %s; response text: %r", e, response_text)
         
         # Fallback response
         return {
@@ -428,7 +424,7 @@ Return ONLY valid JSON, no other text.
             'negotiation_insight': ''
         }
     except Exception as e:
-        print(f"Error in analyze_message_with_cultural_context: {str(e)}")
+        logger.exception("Error in analyze_message_with_cultural_context")
         # Return basic fallback
         return {
             'intent': 'general_inquiry',
@@ -485,7 +481,7 @@ Return ONLY the JSON array, no other text.
         return smart_replies
         
     except Exception as e:
-        print(f"Error generating smart replies: {str(e)}")
+        logger.exception("Error generating smart replies")
         # Fallback replies
         return [
             "धन्यवाद! मैं इस पर काम कर रहा हूं। 😊",
@@ -522,6 +518,6 @@ def get_negotiation_stats():
         }), 200
         
     except Exception as e:
-        print(f"Error in negotiation_stats: {str(e)}")
+        logger.exception("Error in negotiation_stats")
         return jsonify({'error': str(e)}), 500
 
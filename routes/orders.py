@@ -9,6 +9,16 @@ bp = Blueprint('orders', __name__, url_prefix='/api/orders')
 
 stripe.api_key = os.getenv('STRIPE_SECRET_KEY', '')
 
+def buyer_orders_query(session, buyer_id):
+    """Orders placed by a buyer"""
+    return session.query(Order).filter_by(buyer_id=buyer_id)
+
+def artisan_orders_query(session, user_id):
+    """Orders containing products of the artisan with the given user id"""
+    return session.query(Order).join(OrderItem).join(Product).join(ArtisanProfile).filter(
+        ArtisanProfile.user_id == user_id
+    ).distinct()
+
 @bp.route('/', methods=['POST'])
 @jwt_required()
 def create_order():
@@ -105,11 +115,9 @@ def get_orders():
         buyer = g.db.query(BuyerProfile).filter_by(user_id=user_id).first()
         if not buyer:
             return jsonify({'error': 'Buyer profile not found'}), 404
-        orders = g.db.query(Order).filter_by(buyer_id=buyer.id).all()
+        orders = buyer_orders_query(g.db, buyer.id).all()
     elif role == 'artisan':
-        orders = g.db.query(Order).join(OrderItem).join(Product).join(ArtisanProfile).filter(
-            ArtisanProfile.user_id == user_id
-        ).distinct().all()
+        orders = artisan_orders_query(g.db, user_id).all()
     else:
         orders = g.db.query(Order).all()
     
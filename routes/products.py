@@ -1,14 +1,23 @@
 from flask import Blueprint, request, jsonify, g
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import Product, ArtisanProfile, QualityGrade
-from werkzeug.utils import secure_filename
+from models import Product, ArtisanProfile, QualityGrade, ImageFingerprint, ProductImageFeature
 from PIL import Image
-import os
 import json
-from utils.ai_service import assess_quality, translate_text
+import logging
+from utils.ai_service import translate_text
+from utils.job_queue import notify_workers
+from utils.quality_assessment import grade_for_score
+from utils.image_pipeline import (
+    store_original, manifest_entry, enqueue_derivatives, image_urls, image_variants,
+    record_image_files, release_image_files, remove_image_files, DERIVATIVE_SIZES
+)
+from utils.image_hash import dhash, find_duplicate, record_fingerprint
+from database import read_only
 
 bp = Blueprint('products', __name__, url_prefix='/api/products')
 
+logger = logging.getLogger(__name__)
+
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
 def allowed_file(filename):
@@ -19,8 +28,6 @@ def allowed_file(filename):
 def create_product():
     try:
         from flask_jwt_extended import get_jwt
-        import threading
-        from flask import current_app
         
         user_id = int(get_jwt_identity())
         claims = get_jwt()
@@ -39,42 +46,40 @@ def create_product():
         if not all(k in data for k in ['title', 'description', 'price']):
             return jsonify({'error': 'Missing required fields: title, description, or price'}), 400
         
-        # Ensure upload directory exists
-        upload_dir = 'static/uploads'
-        if not os.path.exists(upload_dir):
-            os.makedirs(upload_dir, exist_ok=True)
-        
-        image_paths = []
-        ai_check_image_path = None
+        image_entries = []
+        first_fingerprint = None
+        first_duplicate = None
         
+        # Only hash and store originals here; resizing happens in the image pipeline job
         for i, file in enumerate(files):
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(upload_dir, f"{user_id}_{filename}")
-                file.save(filepath)
-                
-                # Resize image for display
+                # Re-uploads of a photo we already have reuse the stored original
+                image_hash, duplicate = None, None
                 try:
-                    img = Image.open(filepath)
-                    # Convert to RGB if necessary
-                    if img.mode in ('RGBA', 'P'):
-                        img = img.convert('RGB')
-                        
-                    img.thumbnail((1200, 1200))
-                    img.save(filepath, optimize=True, quality=85)
-                    
-                    # Create a smaller version for AI check from the first image
-                    if i == 0:
-                        ai_check_image_path = os.path.join(upload_dir, f"temp_ai_{user_id}_{filename}")
-                        img_small = img.copy()
-                        img_small.thumbnail((512, 512))
-                        img_small.save(ai_check_image_path, optimize=True, quality=60)
+                    image_hash = dhash(Image.open(file.stream))
+                    duplicate = find_duplicate(g.db, image_hash)
                 except Exception as img_error:
-                    print(f"Image processing error: {img_error}")
+                    logger.warning("Could not fingerprint uploaded image: %s", img_error)
+                finally:
+                    file.stream.seek(0)
+                
+                if duplicate:
+                    image_entries.append(manifest_entry(duplicate.file_path))
+                    if len(image_entries) == 1:
+                        first_duplicate = duplicate
+                    continue
+                
+                content_hash, original_path = store_original(file)
+                image_entries.append(manifest_entry(original_path))
                 
-                image_paths.append(filepath)
+                if image_hash is not None:
+                    fingerprint = g.db.query(ImageFingerprint).filter_by(file_path=original_path).first()
+                    if not fingerprint:
+                        fingerprint = record_fingerprint(g.db, image_hash, original_path)
+                    if len(image_entries) == 1:
+                        first_fingerprint = fingerprint
         
-        if not image_paths:
+        if not image_entries:
             return jsonify({'error': 'At least one valid image is required'}), 400
         
         # Create product immediately with default values
@@ -87,58 +92,34 @@ def create_product():
             price=float(data['price']),
             quality_grade=QualityGrade.STANDARD, # Default
             ai_quality_score=0.75, # Default
-            images=json.dumps(image_paths),
+            images=json.dumps(image_entries),
             stock_quantity=int(data.get('stock_quantity', 1)),
             production_time_days=int(data.get('production_time_days', 7))
         )
         
+        # A known photo with a finished assessment doesn't need another vision call
+        known = first_duplicate or first_fingerprint
+        needs_assessment = not (known and known.ai_quality_score is not None)
+        if not needs_assessment:
+            product.ai_quality_score = known.ai_quality_score
+            product.quality_grade = grade_for_score(known.ai_quality_score)
+        
         g.db.add(product)
-        g.db.commit()
+        g.db.flush()
+        record_image_files(g.db, product.id, image_entries)
         
-        # Capture session factory for the thread
-        session_factory = current_app.session_factory
+        # Derivatives and the AI assessment run in the background pipeline
+        processing_job = None
+        if needs_assessment or any(len(e['variants']) < len(DERIVATIVE_SIZES) for e in image_entries):
+            processing_job = enqueue_derivatives(
+                g.db, product.id,
+                quality_fingerprint_id=known.id if known else None,
+                assess_quality=needs_assessment
+            )
         
-        # Define background task for AI assessment
-        def update_product_quality(product_id, image_path, Session):
-            try:
-                # Create new session for background thread
-                db_session = Session()
-                
-                # Run AI assessment
-                ai_score = assess_quality(image_path)
-                
-                # Determine grade
-                quality_grade = QualityGrade.STANDARD
-                if ai_score >= 0.8:
-                    quality_grade = QualityGrade.PREMIUM
-                elif ai_score < 0.5:
-                    quality_grade = QualityGrade.BASIC
-                
-                # Update product
-                prod = db_session.query(Product).get(product_id)
-                if prod:
-                    prod.ai_quality_score = ai_score
-                    prod.quality_grade = quality_grade
-                    db_session.commit()
-                    print(f"Background AI update for product {product_id}: Score {ai_score}")
-                
-                db_session.close()
-                
-                # Clean up temp file
-                if os.path.exists(image_path):
-                    try:
-                        os.remove(image_path)
-                    except:
-                        pass
-                        
-            except Exception as e:
-                print(f"Background AI task error: {e}")
-        
-        # Start background thread if we have an image to check
-        if ai_check_image_path:
-            thread = threading.Thread(target=update_product_quality, args=(product.id, ai_check_image_path, session_factory))
-            thread.daemon = True
-            thread.start()
+        g.db.commit()
+        if processing_job:
+            notify_workers()
         
         return jsonify({
             'message': 'Product created successfully',
@@ -148,7 +129,9 @@ def create_product():
                 'price': product.price,
                 'quality_grade': product.quality_grade.value,
                 'ai_quality_score': product.ai_quality_score
-            }
+            },
+            'images': image_urls(product.images),
+            'processing_job_id': processing_job.id if processing_job else None
         }), 201
     
     except ValueError as ve:
@@ -156,28 +139,122 @@ def create_product():
         return jsonify({'error': f'Invalid data format: {str(ve)}'}), 400
     except Exception as e:
         g.db.rollback()
-        print(f"Error creating product: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error creating product")
         return jsonify({'error': f'Error creating product: {str(e)}'}), 500
 
-@bp.route('/', methods=['GET'])
-def get_products():
-    from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
-    from models import BuyerProfile, User
-    from utils.currency import convert_price
+# Columns needed by the buyer catalog grid; 'detail' adds the full description
+LIST_FIELDS = (
+    Product.id, Product.title, Product.craft_type, Product.price, Product.currency,
+    Product.quality_grade, Product.ai_quality_score, Product.images,
+    Product.stock_quantity, Product.production_time_days, Product.created_at,
+    Product.artisan_id
+)
+DETAIL_FIELDS = LIST_FIELDS + (Product.description,)
+
+def serialize_catalog_product(p, target_currency, fields='detail'):
+    """Build the catalog representation of a product for the buyer dashboard"""
+    from utils.currency import get_display_price
+    
+    result = {
+        'id': p.id,
+        'title': p.title,
+        'craft_type': p.craft_type,
+        'price': p.price, # Original INR price
+        'display_price': get_display_price(p.price, target_currency),
+        'currency': target_currency,
+        'original_currency': p.currency,
+        'quality_grade': p.quality_grade.value if p.quality_grade else None,
+        'ai_quality_score': p.ai_quality_score,
+        'images': image_urls(p.images, 'card' if fields == 'list' else 'full'),
+        'stock_quantity': p.stock_quantity,
+        'production_time_days': p.production_time_days,
+        'artisan': {
+            'id': p.artisan.id,
+            'name': p.artisan.user.full_name,
+            'craft_type': p.artisan.craft_type,
+            'quality_rating': p.artisan.quality_rating
+        }
+    }
+    if fields == 'detail':
+        result['description'] = p.description
+        result['image_variants'] = image_variants(p.images)
+    return result
+
+def buyer_currency():
+    """Display currency of the logged-in buyer (JWT optional), INR otherwise"""
+    from flask_jwt_extended import verify_jwt_in_request
+    from models import User
     
-    # Check for logged in user (optional)
-    target_currency = 'INR'
     try:
         verify_jwt_in_request(optional=True)
         user_id = get_jwt_identity()
         if user_id:
             user = g.db.query(User).get(int(user_id))
             if user and user.role.value == 'buyer' and user.buyer_profile:
-                target_currency = user.buyer_profile.currency or 'USD'
+                return user.buyer_profile.currency or 'USD'
     except Exception:
         pass
+    return 'INR'
+
+def catalog_artisan_option():
+    """Eager-load just the artisan columns serialize_catalog_product needs"""
+    from models import User
+    from sqlalchemy.orm import joinedload
+    
+    return joinedload(Product.artisan).load_only(
+        ArtisanProfile.id, ArtisanProfile.craft_type,
+        ArtisanProfile.quality_rating, ArtisanProfile.user_id
+    ).joinedload(ArtisanProfile.user).load_only(User.id, User.full_name)
+
+def catalog_query(session, filters, columns, min_price=None, max_price=None):
+    """Available products matching the catalog filters, loading only the given columns"""
+    from sqlalchemy.orm import load_only
+    
+    query = session.query(Product).options(
+        load_only(*columns), catalog_artisan_option()
+    ).filter_by(is_available=True, **filters)
+    
+    if min_price is not None:
+        query = query.filter(Product.price >= min_price)
+    if max_price is not None:
+        query = query.filter(Product.price <= max_price)
+    return query
+
+def catalog_page(query, page_size, cursor=None):
+    """Keyset page of a catalog query, newest first, with one extra row to detect more pages"""
+    from sqlalchemy import and_, or_
+    
+    if cursor:
+        cursor_created_at, cursor_id = cursor
+        query = query.filter(or_(
+            Product.created_at < cursor_created_at,
+            and_(Product.created_at == cursor_created_at, Product.id < cursor_id)
+        ))
+    return query.order_by(Product.created_at.desc(), Product.id.desc()).limit(page_size + 1)
+
+def artisan_products_query(session, artisan_id):
+    """All products of an artisan, for the artisan's own listing"""
+    return session.query(Product).filter_by(artisan_id=artisan_id)
+
+@bp.route('/', methods=['GET'])
+@read_only
+def get_products():
+    """
+    Product catalog for buyers
+    
+    Without paging parameters the full filtered catalog is returned as a list.
+    Passing ?limit= and/or ?cursor= switches to keyset pagination ordered by
+    newest first, returning {products, next_cursor, has_more}. ?fields=list
+    skips the description column for grid views.
+    """
+    from utils.pagination import decode_cursor, encode_cursor, parse_page_size
+    
+    target_currency = buyer_currency()
+
+    paginated = 'limit' in request.args or 'cursor' in request.args
+    fields = request.args.get('fields', 'list' if paginated else 'detail')
+    if fields not in ('list', 'detail'):
+        return jsonify({'error': "fields must be 'list' or 'detail'"}), 400
 
     filters = {}
     
@@ -186,47 +263,95 @@ def get_products():
     if request.args.get('quality_grade'):
         filters['quality_grade'] = QualityGrade[request.args.get('quality_grade').upper()]
     
-    from sqlalchemy.orm import joinedload
+    columns = DETAIL_FIELDS if fields == 'detail' else LIST_FIELDS
     
-    query = g.db.query(Product).options(
-        joinedload(Product.artisan).joinedload(ArtisanProfile.user)
-    ).filter_by(is_available=True, **filters)
+    min_price = float(request.args.get('min_price')) if request.args.get('min_price') else None
+    max_price = float(request.args.get('max_price')) if request.args.get('max_price') else None
+    query = catalog_query(g.db, filters, columns, min_price, max_price)
     
-    if request.args.get('min_price'):
-        query = query.filter(Product.price >= float(request.args.get('min_price')))
-    if request.args.get('max_price'):
-        query = query.filter(Product.price <= float(request.args.get('max_price')))
-    
-    products = query.all()
-    
-    results = []
-    for p in products:
-        converted_price = convert_price(p.price, target_currency)
-        results.append({
-            'id': p.id,
-            'title': p.title,
-            'description': p.description,
-            'craft_type': p.craft_type,
-            'price': p.price, # Original INR price
-            'display_price': converted_price,
-            'currency': target_currency,
-            'original_currency': p.currency,
-            'quality_grade': p.quality_grade.value if p.quality_grade else None,
-            'ai_quality_score': p.ai_quality_score,
-            'images': json.loads(p.images) if p.images else [],
-            'stock_quantity': p.stock_quantity,
-            'production_time_days': p.production_time_days,
-            'artisan': {
-                'id': p.artisan.id,
-                'name': p.artisan.user.full_name,
-                'craft_type': p.artisan.craft_type,
-                'quality_rating': p.artisan.quality_rating
-            }
-        })
+    if not paginated:
+        products = query.all()
+        return jsonify([serialize_catalog_product(p, target_currency, fields) for p in products]), 200
+    
+    try:
+        page_size = parse_page_size(request.args.get('limit'))
+        cursor = decode_cursor(request.args.get('cursor')) if request.args.get('cursor') else None
+    except ValueError as ve:
+        return jsonify({'error': str(ve)}), 400
+    
+    # The page holds one extra row to know whether another page exists
+    products = catalog_page(query, page_size, cursor).all()
+    has_more = len(products) > page_size
+    products = products[:page_size]
     
-    return jsonify(results), 200
+    next_cursor = None
+    if has_more:
+        last = products[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    
+    return jsonify({
+        'products': [serialize_catalog_product(p, target_currency, fields) for p in products],
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+        'currency': target_currency
+    }), 200
+
+@bp.route('/search', methods=['GET'])
+@read_only
+def search_products():
+    """
+    Full-text catalog search with facets
+    
+    ?q= matches title, description, craft type and GI tag (prefix matching,
+    every word must match), in any search language or script: listings carry
+    their transliteration and translations in the index. Filters: craft_type, quality_grade, gi_tag,
+    price_bucket, min_price, max_price. Paged with ?limit= and ?offset=.
+    Returns {products, total, facets, next_offset, currency}.
+    """
+    from sqlalchemy.orm import load_only
+    from utils.pagination import parse_page_size
+    from utils.search import search_products as run_search, PRICE_BUCKETS
+    
+    target_currency = buyer_currency()
+    
+    try:
+        filters = {
+            'craft_type': request.args.get('craft_type'),
+            'gi_tag': request.args.get('gi_tag'),
+            'price_bucket': request.args.get('price_bucket'),
+            'min_price': float(request.args['min_price']) if request.args.get('min_price') else None,
+            'max_price': float(request.args['max_price']) if request.args.get('max_price') else None
+        }
+        if request.args.get('quality_grade'):
+            filters['quality_grade'] = QualityGrade[request.args.get('quality_grade').upper()]
+        if filters['price_bucket'] and filters['price_bucket'] not in [label for label, _, _ in PRICE_BUCKETS]:
+            raise ValueError('Unknown price_bucket')
+        page_size = parse_page_size(request.args.get('limit'))
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except KeyError:
+        return jsonify({'error': 'Unknown quality_grade'}), 400
+    except ValueError as ve:
+        return jsonify({'error': str(ve)}), 400
+    
+    result = run_search(
+        g.db, request.args.get('q', ''), filters,
+        limit=page_size, offset=offset,
+        options=(load_only(*LIST_FIELDS), catalog_artisan_option())
+    )
+    
+    next_offset = offset + page_size if offset + page_size < result['total'] else None
+    
+    return jsonify({
+        'query': request.args.get('q', ''),
+        'products': [serialize_catalog_product(p, target_currency, 'list') for p in result['products']],
+        'total': result['total'],
+        'facets': result['facets'],
+        'next_offset': next_offset,
+        'currency': target_currency
+    }), 200
 
 @bp.route('/<int:product_id>', methods=['GET'])
+@read_only
 def get_product(product_id):
     product = g.db.query(Product).filter_by(id=product_id).first()
     
@@ -248,7 +373,8 @@ def get_product(product_id):
         'currency': product.currency,
         'quality_grade': product.quality_grade.value if product.quality_grade else None,
         'ai_quality_score': product.ai_quality_score,
-        'images': json.loads(product.images) if product.images else [],
+        'images': image_urls(product.images),
+        'image_variants': image_variants(product.images),
         'stock_quantity': product.stock_quantity,
         'production_time_days': product.production_time_days,
         'artisan': {
@@ -316,7 +442,7 @@ def get_my_products():
     if not artisan:
         return jsonify({'error': 'Artisan profile not found'}), 404
     
-    products = g.db.query(Product).filter_by(artisan_id=artisan.id).all()
+    products = artisan_products_query(g.db, artisan.id).all()
     
     return jsonify([{
         'id': p.id,
@@ -327,7 +453,7 @@ def get_my_products():
         'ai_quality_score': p.ai_quality_score,
         'stock_quantity': p.stock_quantity,
         'is_available': p.is_available,
-        'images': json.loads(p.images) if p.images else [],
+        'images': image_urls(p.images, 'card'),
         'craft_type': p.craft_type,
         'production_time_days': p.production_time_days,
         'created_at': p.created_at.isoformat()
@@ -353,17 +479,11 @@ def delete_product(product_id):
     if product.artisan.user_id != user_id:
         return jsonify({'error': 'Unauthorized'}), 403
     
-    # Delete associated images
-    try:
-        if product.images:
-            image_paths = json.loads(product.images)
-            for path in image_paths:
-                if os.path.exists(path):
-                    os.remove(path)
-    except Exception as e:
-        print(f"Error deleting product images: {e}")
-
+    # Images no other product uses go too, but only once the delete has committed
+    orphaned = release_image_files(g.db, product)
+    g.db.query(ProductImageFeature).filter_by(product_id=product.id).delete()
     g.db.delete(product)
     g.db.commit()
+    remove_image_files(orphaned)
     
     return jsonify({'message': 'Product deleted successfully'}), 200
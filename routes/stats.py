@@ -1,43 +1,48 @@
-from flask import Blueprint, jsonify, g
+import logging
+from flask import Blueprint, request, jsonify, g
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import ArtisanProfile, Product, Order, OrderStatus
+from utils.platform_metrics import get_metrics, metrics_response
+from utils.artisan_stats import get_artisan_stats as artisan_stats
+from database import read_only
 
 bp = Blueprint('stats', __name__, url_prefix='/api/stats')
 
+logger = logging.getLogger(__name__)
+
 @bp.route('/artisan', methods=['GET'])
 @jwt_required()
 def get_artisan_stats():
-    """Get stats for the logged-in artisan"""
+    """
+    Get stats for the logged-in artisan
+    Read from the daily rollups (see utils/artisan_stats.py); ?days= sets
+    the daily series and conversion window (default 30, max 90)
+    """
     try:
-        user_id = get_jwt_identity()
-        # Mock data for demo stability
-        return jsonify({
-            'total_products': 12,
-            'pending_orders': 5,
-            'total_earnings': 45000
-        })
+        user_id = int(get_jwt_identity())
+        artisan = g.db.query(ArtisanProfile).filter_by(user_id=user_id).first()
+        if not artisan:
+            return jsonify({'error': 'Artisan profile not found'}), 404
+        
+        days = min(max(int(request.args.get('days', 30)), 1), 90)
+        return jsonify(artisan_stats(g.db, artisan.id, days=days)), 200
+    except ValueError:
+        return jsonify({'error': 'days must be a number'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/platform', methods=['GET'])
+@read_only
 def get_platform_stats():
-    """Get real-time platform statistics"""
+    """Get platform statistics (materialized totals, see utils/platform_metrics.py)"""
     try:
-        # Count total artisans
-        total_artisans = g.db.query(ArtisanProfile).count()
-        
-        # Count total products
-        total_products = g.db.query(Product).filter_by(is_available=True).count()
+        metrics = get_metrics(g.db)
+        total_artisans = int(metrics['artisans'])
+        total_products = int(metrics['products_available'])
+        total_orders = int(metrics['orders'])
+        total_revenue = metrics['revenue_completed']
         
-        # Count total orders
-        total_orders = g.db.query(Order).count()
-        
-        # Calculate total revenue (sum of all completed orders)
-        # Calculate total revenue using SQL aggregation for performance
-        from sqlalchemy import func
-        total_revenue = g.db.query(func.sum(Order.total_amount)).filter_by(status=OrderStatus.COMPLETED).scalar() or 0.0
-        
-        return jsonify({
+        return metrics_response({
             'success': True,
             'stats': {
                 'total_artisans': total_artisans,
@@ -51,8 +56,8 @@ def get_platform_stats():
                     'revenue': f"₹{total_revenue:,.2f}"
                 }
             }
-        }), 200
+        })
         
     except Exception as e:
-        print(f"Error getting platform stats: {e}")
+        logger.exception("Error getting platform stats")
         return jsonify({'error': str(e)}), 500
@@ -3,6 +3,7 @@ Translation API Routes
 Real-time translation endpoints for artisan-buyer communication
 """
 
+import logging
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from utils.translation_service import (
@@ -11,6 +12,7 @@ from utils.translation_service import (
     detect_language,
     get_negotiation_phrases,
     explain_cultural_context,
+    TRANSLATION_CACHE,
     ALL_LANGUAGES,
     ARTISAN_LANGUAGES,
     BUYER_LANGUAGES
@@ -18,6 +20,8 @@ from utils.translation_service import (
 
 bp = Blueprint('translation', __name__, url_prefix='/api/translation')
 
+logger = logging.getLogger(__name__)
+
 
 @bp.route('/translate', methods=['POST'])
 @jwt_required()
@@ -61,7 +65,7 @@ def translate():
         }), 200
         
     except Exception as e:
-        print(f"Translation error: {str(e)}")
+        logger.exception("Translation error")
         return jsonify({'error': str(e)}), 500
 
 
@@ -98,7 +102,7 @@ def translate_batch_messages():
         }), 200
         
     except Exception as e:
-        print(f"Batch translation error: {str(e)}")
+        logger.exception("Batch translation error")
         return jsonify({'error': str(e)}), 500
 
 
@@ -130,7 +134,7 @@ def detect_lang():
         }), 200
         
     except Exception as e:
-        print(f"Language detection error: {str(e)}")
+        logger.exception("Language detection error")
         return jsonify({'error': str(e)}), 500
 
 
@@ -154,7 +158,7 @@ def get_phrases(lang_code):
         }), 200
         
     except Exception as e:
-        print(f"Error getting phrases: {str(e)}")
+        logger.exception("Error getting phrases")
         return jsonify({'error': str(e)}), 500
 
 
@@ -191,7 +195,7 @@ def get_cultural_context():
         }), 200
         
     except Exception as e:
-        print(f"Cultural context error: {str(e)}")
+        logger.exception("Cultural context error")
         return jsonify({'error': str(e)}), 500
 
 
@@ -210,6 +214,20 @@ def get_supported_languages():
     }), 200
 
 
+@bp.route('/cache-stats', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    """
+    Translation cache hit/miss/eviction counters for this worker
+    
+    GET /api/translation/cache-stats
+    """
+    return jsonify({
+        'success': True,
+        'cache': TRANSLATION_CACHE.get_stats()
+    }), 200
+
+
 @bp.route('/quick-translate', methods=['POST'])
 def quick_translate():
     """
@@ -246,6 +264,6 @@ def quick_translate():
         }), 200
         
     except Exception as e:
-        print(f"Quick translate error: {str(e)}")
+        logger.exception("Quick translate error")
         return jsonify({'error': str(e)}), 500
 
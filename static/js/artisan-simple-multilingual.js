@@ -883,26 +883,53 @@
                 body: JSON.stringify({
                     message: question,
                     language: currentLanguage,
-                    context: 'general'
+                    context: 'general',
+                    stream: true
                 })
             });
+            if (!response.ok || !response.body) throw new Error(`AI request failed: ${response.status}`);
+
+            // Show the answer as it streams in (server-sent events)
+            const botMessage = document.createElement('div');
+            botMessage.className = 'ai-message bot-message';
+            const content = document.createElement('div');
+            content.className = 'ai-message-content';
+            botMessage.appendChild(content);
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let answer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const events = buffer.split('\n\n');
+                buffer = events.pop();
+                for (const raw of events) {
+                    const type = (raw.match(/^event: (.*)$/m) || [])[1];
+                    const data = JSON.parse((raw.match(/^data: (.*)$/m) || [])[1] || '{}');
+                    if (type === 'error') throw new Error(data.error);
+                    answer = type === 'done' ? data.response : answer + (data.text || '');
+                    content.textContent = answer;
+                }
 
-            const data = await response.json();
+                // Replace the loading indicator with the first chunk
+                const loadingMsg = messagesDiv.querySelector('.loading-message');
+                if (loadingMsg && answer) {
+                    loadingMsg.remove();
+                    messagesDiv.appendChild(botMessage);
+                }
+                messagesDiv.scrollTop = messagesDiv.scrollHeight;
+            }
 
-            // Remove loading message
             const loadingMsg = messagesDiv.querySelector('.loading-message');
             if (loadingMsg) loadingMsg.remove();
-
-            // Add AI response
-            messagesDiv.innerHTML += `
-                <div class="ai-message bot-message">
-                    <div class="ai-message-content">${data.response}</div>
-                    <button onclick="playVoice('ai-response', '${data.response.replace(/'/g, "\\'")}')">
-                        <i class="fas fa-volume-up"></i>
-                    </button>
-                </div>
-            `;
-            messagesDiv.scrollTop = messagesDiv.scrollHeight;
+            if (!botMessage.isConnected) messagesDiv.appendChild(botMessage);
+            const voiceButton = document.createElement('button');
+            voiceButton.innerHTML = '<i class="fas fa-volume-up"></i>';
+            voiceButton.addEventListener('click', () => playVoice('ai-response', answer, voiceButton));
+            botMessage.appendChild(voiceButton);
 
         } catch (error) {
             console.error('AI error:', error);
@@ -609,9 +609,9 @@
                 <div style="margin-bottom: 1rem; padding: 1rem; background: #DBEAFE; border-radius: 8px;">
                     <p style="margin: 0; color: #1E40AF;"><strong>📸 Image Analysis:</strong></p>
                     <p style="margin: 0.5rem 0 0 0; font-size: 0.9rem;">
-                        Type: ${data.image_analysis.product_type || 'Unknown'}<br>
-                        Style: ${data.image_analysis.style || 'N/A'}<br>
-                        Material: ${data.image_analysis.material || 'N/A'}
+                        Dominant colours:
+                        ${(data.image_analysis.dominant_colors || []).map(color => `<span title="${color}" style="display: inline-block; width: 1rem; height: 1rem; border-radius: 50%; vertical-align: middle; background: ${color};"></span>`).join(' ')}<br>
+                        Compared against ${data.image_analysis.indexed_products || 0} products
                     </p>
                 </div>
                 <h3 style="margin-bottom: 1rem;">Similar Products Found (${data.count})</h3>
@@ -43,6 +43,7 @@
 
                     const isSent = data.sender_id === userData.id;
                     const messageHTML = createMessageHTML({
+                        id: data.id,
                         message: isSent ? data.content : (data.translated_content || data.content),
                         timestamp: data.created_at,
                         ai_context: {} // New messages via socket might not have full AI context yet
@@ -55,6 +56,15 @@
                     }
                 }
             });
+
+            // Translations are batched on the server and arrive after the message
+            socket.on('message_translated', (data) => {
+                if (data.receiver_id !== userData.id) return;
+                const textEl = document.querySelector(`.message-wrapper[data-message-id="${data.id}"] .message-text`);
+                if (textEl) {
+                    textEl.textContent = data.translated_content;
+                }
+            });
         }
     }
 
@@ -176,7 +186,7 @@
         });
 
         let html = `
-            <div class="message-wrapper ${isSent ? 'sent' : 'received'}">
+            <div class="message-wrapper ${isSent ? 'sent' : 'received'}" ${message.id ? `data-message-id="${message.id}"` : ''}>
                 <div class="message-bubble ${isSent ? 'sent' : 'received'}">
                     <div class="message-text">${message.message}</div>
                     <div class="message-time">${time}</div>
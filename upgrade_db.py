@@ -2,6 +2,7 @@ import sqlite3
 import os
 
 DB_FILE = 'bharatcraft.db'
+DATABASE_URL = os.getenv('DATABASE_URL', f'sqlite:///{DB_FILE}')
 
 def upgrade_database():
     if not os.path.exists(DB_FILE):
@@ -53,5 +54,26 @@ def upgrade_database():
     conn.close()
     print("Database upgrade complete.")
 
+def create_indexes():
+    """Create the secondary indexes declared in models.py (SQLite or Postgres)"""
+    from sqlalchemy import create_engine, inspect
+    from models import Base
+
+    engine = create_engine(DATABASE_URL)
+
+    # Tables that don't exist yet get their indexes from create_all on startup
+    existing_tables = set(inspect(engine).get_table_names())
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+            print(f"Ensured index {index.name} on {table.name}")
+
+    engine.dispose()
+    print("Index upgrade complete.")
+
 if __name__ == "__main__":
     upgrade_database()
+    create_indexes()
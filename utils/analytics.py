@@ -0,0 +1,403 @@
+"""
+Sales Analytics Store
+Daily pre-aggregated buckets of order and transaction activity per
+(cluster, craft type, destination country, currency) in
+analytics_daily_facts, so admin charts over months of data read a few
+hundred bucket rows instead of scanning orders, order_items and
+transactions.
+
+A recurring ETL job keeps the buckets current. Each run finds the days
+touched since the last run (orders whose updated_at passed the watermark,
+transactions past the last id) and recomputes those days' buckets from the
+source tables, so status changes and cancellations land in the right
+bucket without per-row bookkeeping. A full rebuild runs every
+ANALYTICS_FULL_REBUILD_HOURS.
+
+query_series() answers range queries and downsamples the daily buckets to
+weeks or months.
+"""
+import os
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+
+from sqlalchemy import func, delete, insert, case
+
+from models import (
+    Order, OrderItem, OrderStatus, Product, ArtisanProfile, BuyerProfile, Transaction, Cluster,
+    AnalyticsDailyFact, AnalyticsBuild
+)
+from utils.currency import convert_to_inr
+from utils.job_queue import register_handler
+
+# Minutes between incremental ETL runs
+ANALYTICS_REFRESH_MINUTES = int(os.getenv('ANALYTICS_REFRESH_MINUTES', 10))
+
+ANALYTICS_FULL_REBUILD_HOURS = int(os.getenv('ANALYTICS_FULL_REBUILD_HOURS', 24))
+
+# Orders committed slightly out of updated_at order are picked up by re-reading
+# this much before the watermark; recomputing a day twice is harmless
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# Days per IN (...) clause when rewriting buckets
+CHUNK_SIZE = 200
+
+# Longest range served at daily granularity by granularity='auto'
+AUTO_DAILY_DAYS = 92
+AUTO_WEEKLY_DAYS = 730
+
+# Longest range accepted at each granularity, so a request can't zero-fill
+# hundreds of thousands of points per series
+MAX_SPAN_DAYS = {
+    'day': AUTO_DAILY_DAYS * 4,
+    'week': AUTO_WEEKLY_DAYS * 4,
+    'month': 366 * 50,
+}
+
+REFRESH_ANALYTICS = 'refresh_analytics'
+
+DIMENSIONS = {
+    'cluster': AnalyticsDailyFact.cluster_id,
+    'craft_type': AnalyticsDailyFact.craft_type,
+    'country': AnalyticsDailyFact.country,
+    'currency': AnalyticsDailyFact.currency,
+}
+
+# Measures that are meaningful summed across currencies
+MEASURES = (
+    'orders', 'cancelled_orders', 'items', 'units', 'revenue_inr',
+    'transactions', 'artisan_payouts_inr', 'platform_fees_inr'
+)
+
+COUNT_COLUMNS = ('orders', 'cancelled_orders', 'items', 'units', 'transactions')
+AMOUNT_COLUMNS = ('revenue', 'revenue_inr', 'artisan_payouts_inr', 'platform_fees_inr')
+
+GRANULARITIES = ('day', 'week', 'month')
+
+DOMESTIC_COUNTRIES = {'india', 'in'}
+
+
+def _bucket_key(day, cluster_id, craft_type, country, currency):
+    return (
+        day, cluster_id or 0, (craft_type or '').strip().lower(),
+        (country or '').strip(), (currency or '').strip().upper()
+    )
+
+
+def _aggregate(session, start, end):
+    """
+    Bucket counters for orders and transactions created in [start, end)
+
+    Returns:
+        {(day, cluster_id, craft_type, country, currency): {measure: value}}
+    """
+    buckets = defaultdict(lambda: defaultdict(float))
+
+    # One row per (order, bucket); the order itself is counted in the bucket
+    # of its first item so order totals across buckets stay exact
+    item_rows = session.query(
+        Order.id, Order.created_at, Order.status, Order.currency, BuyerProfile.country,
+        ArtisanProfile.cluster_id, func.coalesce(Product.craft_type, ArtisanProfile.craft_type),
+        func.min(OrderItem.id), func.count(OrderItem.id), func.sum(OrderItem.quantity), func.sum(OrderItem.total_price)
+    ).join(OrderItem, OrderItem.order_id == Order.id).join(
+        Product, Product.id == OrderItem.product_id
+    ).join(
+        ArtisanProfile, ArtisanProfile.id == Product.artisan_id
+    ).outerjoin(
+        BuyerProfile, BuyerProfile.id == Order.buyer_id
+    ).filter(
+        Order.created_at >= start, Order.created_at < end
+    ).group_by(
+        Order.id, Order.created_at, Order.status, Order.currency, BuyerProfile.country,
+        ArtisanProfile.cluster_id, func.coalesce(Product.craft_type, ArtisanProfile.craft_type)
+    ).all()
+
+    first_items = {}
+    for row in item_rows:
+        order_id, first_item_id = row[0], row[7]
+        first_items[order_id] = min(first_items.get(order_id, first_item_id), first_item_id)
+
+    for (order_id, created_at, status, currency, country, cluster_id, craft_type,
+         first_item_id, items, units, amount) in item_rows:
+        counters = buckets[_bucket_key(created_at.date(), cluster_id, craft_type, country, currency)]
+        cancelled = status == OrderStatus.CANCELLED
+        if first_items[order_id] == first_item_id:
+            counters['cancelled_orders' if cancelled else 'orders'] += 1
+        if not cancelled:
+            counters['items'] += items
+            counters['units'] += units or 0
+            counters['revenue'] += amount or 0.0
+            counters['revenue_inr'] += convert_to_inr(amount or 0.0, (currency or 'USD').upper())
+
+    transaction_rows = session.query(
+        Transaction.created_at, Transaction.buyer_currency, BuyerProfile.country,
+        ArtisanProfile.cluster_id, ArtisanProfile.craft_type,
+        Transaction.artisan_amount, Transaction.platform_fee
+    ).join(
+        ArtisanProfile, ArtisanProfile.id == Transaction.artisan_id
+    ).outerjoin(
+        BuyerProfile, BuyerProfile.id == Transaction.buyer_id
+    ).filter(
+        Transaction.created_at >= start, Transaction.created_at < end
+    ).all()
+
+    for created_at, currency, country, cluster_id, craft_type, payout, fee in transaction_rows:
+        counters = buckets[_bucket_key(created_at.date(), cluster_id, craft_type, country, currency)]
+        counters['transactions'] += 1
+        counters['artisan_payouts_inr'] += payout or 0.0
+        counters['platform_fees_inr'] += fee or 0.0
+
+    return buckets
+
+
+def _day_runs(days):
+    """Consecutive days grouped into [start, end) datetime ranges"""
+    runs = []
+    for day in sorted(days):
+        if runs and runs[-1][1] == day:
+            runs[-1][1] = day + timedelta(days=1)
+        else:
+            runs.append([day, day + timedelta(days=1)])
+    return [(datetime.combine(start, datetime.min.time()), datetime.combine(end, datetime.min.time()))
+            for start, end in runs]
+
+
+def _fact_rows(buckets):
+    rows = []
+    for (day, cluster_id, craft_type, country, currency), counters in buckets.items():
+        row = {'day': day, 'cluster_id': cluster_id, 'craft_type': craft_type,
+               'country': country, 'currency': currency}
+        for column in COUNT_COLUMNS:
+            row[column] = int(counters.get(column, 0))
+        for column in AMOUNT_COLUMNS:
+            row[column] = round(counters.get(column, 0.0), 2)
+        rows.append(row)
+    return rows
+
+
+def refresh_analytics(session, full=False):
+    """
+    Bring analytics_daily_facts up to date with orders and transactions
+
+    Returns:
+        summary dict (also recorded as an AnalyticsBuild row)
+    """
+    last = session.query(AnalyticsBuild).order_by(AnalyticsBuild.id.desc()).first()
+    if last is None or datetime.utcnow() - last.created_at > timedelta(hours=ANALYTICS_FULL_REBUILD_HOURS):
+        full = True
+
+    # Watermarks are read first so rows written during the run are seen next time
+    order_watermark = session.query(func.max(Order.updated_at)).scalar()
+    last_transaction_id = session.query(func.max(Transaction.id)).scalar() or 0
+
+    table = AnalyticsDailyFact.__table__
+    if full:
+        session.execute(delete(table))
+        buckets = _aggregate(session, datetime.min, datetime.max)
+        days_updated = len({key[0] for key in buckets})
+    else:
+        if (order_watermark, last_transaction_id) == (last.order_watermark, last.last_transaction_id):
+            return {'skipped': 'no new orders or transactions'}
+
+        since = last.order_watermark - WATERMARK_OVERLAP if last.order_watermark else datetime.min
+        dirty_days = {created_at.date() for (created_at,) in session.query(Order.created_at).filter(
+            Order.updated_at >= since, Order.created_at != None
+        ).distinct()}
+        dirty_days |= {created_at.date() for (created_at,) in session.query(Transaction.created_at).filter(
+            Transaction.id > (last.last_transaction_id or 0), Transaction.created_at != None
+        ).distinct()}
+
+        dirty_list = sorted(dirty_days)
+        for start in range(0, len(dirty_list), CHUNK_SIZE):
+            session.execute(delete(table).where(table.c.day.in_(dirty_list[start:start + CHUNK_SIZE])))
+
+        buckets = {}
+        for start, end in _day_runs(dirty_days):
+            buckets.update(_aggregate(session, start, end))
+        days_updated = len(dirty_days)
+
+    rows = _fact_rows(buckets)
+    if rows:
+        session.execute(insert(table), rows)
+
+    build = AnalyticsBuild(
+        full_rebuild=full,
+        order_watermark=order_watermark,
+        last_transaction_id=last_transaction_id,
+        days_updated=days_updated
+    )
+    session.add(build)
+    session.commit()
+
+    return {'full_rebuild': full, 'days_updated': days_updated, 'buckets': len(rows)}
+
+
+def _period_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _periods(start, end, granularity):
+    period = _period_start(start, granularity)
+    while period <= end:
+        yield period
+        if granularity == 'day':
+            period += timedelta(days=1)
+        elif granularity == 'week':
+            period += timedelta(days=7)
+        else:
+            period = (period + timedelta(days=32)).replace(day=1)
+
+
+def resolve_granularity(start, end, granularity='auto'):
+    """
+    'day' / 'week' / 'month'; 'auto' picks the finest that keeps a chart readable
+
+    Raises ValueError for spans longer than MAX_SPAN_DAYS allows at that granularity.
+    """
+    span = (end - start).days + 1
+    if granularity == 'auto':
+        if span <= AUTO_DAILY_DAYS:
+            granularity = 'day'
+        else:
+            granularity = 'week' if span <= AUTO_WEEKLY_DAYS else 'month'
+    elif granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    if span > MAX_SPAN_DAYS[granularity]:
+        raise ValueError(f"Ranges longer than {MAX_SPAN_DAYS[granularity]} days can't be served by {granularity}")
+    return granularity
+
+
+def query_series(session, start, end, granularity='auto', group_by=None, filters=None):
+    """
+    Time series of the analytics measures over [start, end] (inclusive dates)
+
+    Args:
+        granularity: 'day', 'week', 'month' or 'auto'
+        group_by: None or one of DIMENSIONS; one series per dimension value
+        filters: {dimension: value} restricting the buckets
+
+    Returns:
+        {'granularity', 'start', 'end', 'measures', 'series': [{'key', 'label', 'points', 'totals'}]}
+    """
+    granularity = resolve_granularity(start, end, granularity)
+    if group_by is not None and group_by not in DIMENSIONS:
+        raise ValueError(f"Unknown dimension: {group_by}")
+
+    measures = MEASURES + (('revenue',) if group_by == 'currency' or (filters or {}).get('currency') else ())
+    fact = AnalyticsDailyFact
+    dimension = DIMENSIONS[group_by] if group_by else None
+
+    columns = [fact.day] + ([dimension] if dimension is not None else [])
+    query = session.query(*columns, *[func.sum(getattr(fact, measure)) for measure in measures]).filter(
+        fact.day >= start, fact.day <= end
+    )
+    for name, value in (filters or {}).items():
+        if name not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension: {name}")
+        if name == 'cluster':
+            value = int(value)
+        elif name == 'craft_type':
+            value = str(value).strip().lower()
+        elif name == 'currency':
+            value = str(value).strip().upper()
+        query = query.filter(DIMENSIONS[name] == value)
+    query = query.group_by(*columns)
+
+    series = defaultdict(lambda: defaultdict(lambda: dict.fromkeys(measures, 0)))
+    for row in query.all():
+        day, key = row[0], (row[1] if dimension is not None else 'all')
+        values = row[len(columns):]
+        point = series[key][_period_start(day, granularity)]
+        for measure, value in zip(measures, values):
+            point[measure] += value or 0
+
+    labels = {}
+    if group_by == 'cluster' and series:
+        labels = dict(session.query(Cluster.id, Cluster.name).filter(Cluster.id.in_(list(series))).all())
+
+    periods = list(_periods(start, end, granularity))
+    result = []
+    for key, points in series.items():
+        filled = []
+        for period in periods:
+            point = points.get(period, dict.fromkeys(measures, 0))
+            filled.append({'period': period.isoformat(), **{
+                measure: round(value, 2) if isinstance(value, float) else value for measure, value in point.items()
+            }})
+        totals = {measure: round(sum(point[measure] for point in filled), 2) for measure in measures}
+        label = labels.get(key) if group_by == 'cluster' else key
+        result.append({'key': key, 'label': label or 'Unassigned', 'points': filled, 'totals': totals})
+    result.sort(key=lambda entry: -entry['totals']['revenue_inr'])
+
+    return {
+        'granularity': granularity,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'group_by': group_by,
+        'measures': list(measures),
+        'series': result
+    }
+
+
+def cluster_analytics(session, recent_days=30):
+    """Per-cluster catalog facts plus sales totals from the analytics buckets"""
+    fact = AnalyticsDailyFact
+    is_export = func.lower(fact.country).notin_(DOMESTIC_COUNTRIES)
+    since = date.today() - timedelta(days=recent_days - 1)
+
+    sales = {row[0]: row for row in session.query(
+        fact.cluster_id,
+        func.sum(fact.orders),
+        func.sum(fact.revenue_inr),
+        func.sum(case((is_export, fact.revenue_inr), else_=0.0)),
+        func.sum(case((fact.day >= since, fact.revenue_inr), else_=0.0))
+    ).group_by(fact.cluster_id).all()}
+
+    artisan_counts = dict(session.query(ArtisanProfile.cluster_id, func.count(ArtisanProfile.id)).filter(
+        ArtisanProfile.cluster_id != None
+    ).group_by(ArtisanProfile.cluster_id).all())
+
+    crafts, gi_tags = defaultdict(set), defaultdict(set)
+    for cluster_id, craft_type in session.query(ArtisanProfile.cluster_id, ArtisanProfile.craft_type).filter(
+        ArtisanProfile.cluster_id != None
+    ).distinct():
+        if craft_type:
+            crafts[cluster_id].add(craft_type)
+    quality = {}
+    for cluster_id, average in session.query(ArtisanProfile.cluster_id, func.avg(Product.ai_quality_score)).join(
+        Product, Product.artisan_id == ArtisanProfile.id
+    ).filter(ArtisanProfile.cluster_id != None).group_by(ArtisanProfile.cluster_id):
+        quality[cluster_id] = average
+    for cluster_id, gi_tag in session.query(ArtisanProfile.cluster_id, Product.gi_tag).join(
+        Product, Product.artisan_id == ArtisanProfile.id
+    ).filter(ArtisanProfile.cluster_id != None, Product.gi_tag != None, Product.gi_tag != '').distinct():
+        gi_tags[cluster_id].add(gi_tag)
+
+    clusters = []
+    for cluster in session.query(Cluster).order_by(Cluster.name).all():
+        row = sales.get(cluster.id)
+        specialties = sorted(crafts[cluster.id] | ({cluster.specialty} if cluster.specialty else set()))
+        clusters.append({
+            'id': cluster.id,
+            'name': cluster.name,
+            'location': cluster.region,
+            'latitude': cluster.latitude,
+            'longitude': cluster.longitude,
+            'artisan_count': artisan_counts.get(cluster.id, 0),
+            'specialties': specialties,
+            'total_orders': int(row[1] or 0) if row else 0,
+            'total_revenue_inr': round(row[2] or 0.0, 2) if row else 0.0,
+            'total_exports': round(row[3] or 0.0, 2) if row else 0.0,
+            f'revenue_last_{recent_days}_days_inr': round(row[4] or 0.0, 2) if row else 0.0,
+            'avg_quality_score': round(quality[cluster.id], 2) if quality.get(cluster.id) is not None else None,
+            'gi_tags': sorted(gi_tags[cluster.id]),
+        })
+    return clusters
+
+
+@register_handler(REFRESH_ANALYTICS, every=ANALYTICS_REFRESH_MINUTES * 60)
+def run_refresh_analytics(session, job, payload):
+    return refresh_analytics(session, full=payload.get('full', False))
@@ -0,0 +1,287 @@
+"""
+Per-Artisan Statistics
+Daily rollups in artisan_daily_stats, so the artisan dashboard reads a
+few dozen pre-aggregated rows instead of scanning orders and order items.
+
+The rows are updated from a session after_flush hook as events happen:
+- an artisan's first item in an order: orders_placed (+ an open order)
+- order status transitions: fulfilled / cancelled counts, earnings when
+  the order reaches delivered/completed, and the open-order balance
+- a buyer's first message to an artisan: inquiries (for conversion)
+
+rebuild_artisan_rollups() reconstructs the table from history (dating
+status changes by Order.updated_at); it runs once when the table is empty.
+"""
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime, date, timedelta
+
+from sqlalchemy import event, select, func, and_, or_, delete, insert, inspect
+from sqlalchemy.orm import Session
+
+from models import Order, OrderItem, OrderStatus, Product, Message, ArtisanProfile, ArtisanDailyStat
+from utils.job_queue import register_handler, enqueue
+from utils.rollups import increment
+
+logger = logging.getLogger(__name__)
+
+FULFILLED_STATUSES = {OrderStatus.DELIVERED, OrderStatus.COMPLETED}
+CLOSED_STATUSES = FULFILLED_STATUSES | {OrderStatus.CANCELLED}
+
+COUNTERS = ('orders_placed', 'orders_fulfilled', 'orders_cancelled', 'open_orders_delta', 'earnings', 'inquiries')
+
+REBUILD_ARTISAN_ROLLUPS = 'rebuild_artisan_rollups'
+
+
+def _status(value):
+    """OrderStatus from an enum member or a raw value ('shipped'), None if unknown"""
+    if isinstance(value, OrderStatus) or value is None:
+        return value
+    try:
+        return OrderStatus(value)
+    except ValueError:
+        return None
+
+
+def transition_counters(old, new, amount):
+    """Counter changes for an artisan's share (amount) of an order moving from old to new status"""
+    counters = Counter()
+    counters['orders_fulfilled'] = (new in FULFILLED_STATUSES) - (old in FULFILLED_STATUSES)
+    counters['earnings'] = counters['orders_fulfilled'] * amount
+    counters['orders_cancelled'] = (new == OrderStatus.CANCELLED) - (old == OrderStatus.CANCELLED)
+    counters['open_orders_delta'] = (new not in CLOSED_STATUSES) - (old not in CLOSED_STATUSES)
+    return counters
+
+
+def _placements(conn, items):
+    """Counters for newly inserted order items: one placement per (order, artisan)"""
+    events = defaultdict(Counter)
+    artisan_of = dict(conn.execute(
+        select(Product.id, Product.artisan_id).where(Product.id.in_({item.product_id for item in items}))
+    ).all())
+    new_ids = [item.id for item in items]
+
+    pairs = {(item.order_id, artisan_of[item.product_id]) for item in items if item.product_id in artisan_of}
+    for order_id, artisan_id in pairs:
+        earlier = conn.execute(
+            select(OrderItem.id).join(Product, Product.id == OrderItem.product_id).where(
+                OrderItem.order_id == order_id,
+                Product.artisan_id == artisan_id,
+                OrderItem.id.not_in(new_ids)
+            ).limit(1)
+        ).first()
+        if earlier:
+            continue
+        status = _status(conn.execute(select(Order.status).where(Order.id == order_id)).scalar())
+        events[artisan_id]['orders_placed'] += 1
+        events[artisan_id]['open_orders_delta'] += status not in CLOSED_STATUSES
+    return events
+
+
+def _transitions(conn, orders):
+    """Counters for orders whose status changed in this flush"""
+    events = defaultdict(Counter)
+    for order, old, new in orders:
+        shares = conn.execute(
+            select(Product.artisan_id, func.sum(OrderItem.total_price))
+            .join(Product, Product.id == OrderItem.product_id)
+            .where(OrderItem.order_id == order.id)
+            .group_by(Product.artisan_id)
+        ).all()
+        for artisan_id, amount in shares:
+            events[artisan_id].update(transition_counters(old, new, amount or 0.0))
+    return events
+
+
+def _inquiries(conn, messages):
+    """Counters for messages that open a conversation with an artisan"""
+    events = defaultdict(Counter)
+    new_ids = [message.id for message in messages]
+    seen = set()
+    for message in messages:
+        pair = frozenset((message.sender_id, message.receiver_id))
+        if pair in seen:
+            continue
+        seen.add(pair)
+
+        artisan_id = conn.execute(
+            select(ArtisanProfile.id).where(ArtisanProfile.user_id == message.receiver_id)
+        ).scalar()
+        if not artisan_id:
+            continue
+        earlier = conn.execute(
+            select(Message.id).where(
+                or_(
+                    and_(Message.sender_id == message.sender_id, Message.receiver_id == message.receiver_id),
+                    and_(Message.sender_id == message.receiver_id, Message.receiver_id == message.sender_id)
+                ),
+                Message.id.not_in(new_ids)
+            ).limit(1)
+        ).first()
+        if not earlier:
+            events[artisan_id]['inquiries'] += 1
+    return events
+
+
+@event.listens_for(Order.status, 'set', active_history=True)
+def _load_previous_status(order, value, oldvalue, initiator):
+    # active_history makes a status set on an expired order load the old
+    # value first, so the flush below can still see the transition
+    return value
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_artisan_events(session, flush_context):
+    items = [obj for obj in session.new if isinstance(obj, OrderItem)]
+    messages = [obj for obj in session.new if isinstance(obj, Message)]
+
+    changed_orders = []
+    for obj in session.dirty:
+        if isinstance(obj, Order):
+            history = inspect(obj).attrs.status.history
+            if history.deleted:
+                old, new = _status(history.deleted[0]), _status(obj.status)
+                if old != new:
+                    changed_orders.append((obj, old, new))
+
+    if not items and not messages and not changed_orders:
+        return
+
+    conn = session.connection()
+    events = defaultdict(Counter)
+    for partial in (
+        _placements(conn, items) if items else {},
+        _transitions(conn, changed_orders),
+        _inquiries(conn, messages) if messages else {}
+    ):
+        for artisan_id, counters in partial.items():
+            events[artisan_id].update(counters)
+
+    today = datetime.utcnow().date()
+    for artisan_id, counters in events.items():
+        increment(conn, ArtisanDailyStat.__table__, {'artisan_id': artisan_id, 'day': today}, dict(counters))
+
+
+def rebuild_artisan_rollups(session):
+    """Recompute artisan_daily_stats from orders and messages"""
+    buckets = defaultdict(Counter)  # (artisan_id, day) -> counters
+
+    shares = session.query(
+        Product.artisan_id, Order.status, Order.created_at, Order.updated_at,
+        func.sum(OrderItem.total_price)
+    ).join(OrderItem, OrderItem.order_id == Order.id).join(
+        Product, Product.id == OrderItem.product_id
+    ).group_by(Product.artisan_id, Order.id, Order.status, Order.created_at, Order.updated_at).all()
+
+    for artisan_id, status, created_at, updated_at, amount in shares:
+        placed_day = (created_at or datetime.utcnow()).date()
+        buckets[(artisan_id, placed_day)].update({'orders_placed': 1, 'open_orders_delta': 1})
+        changed_day = (updated_at or created_at or datetime.utcnow()).date()
+        buckets[(artisan_id, changed_day)].update(transition_counters(OrderStatus.PENDING, _status(status), amount or 0.0))
+
+    # A conversation's first message, when it was sent to an artisan
+    artisan_users = dict(session.query(ArtisanProfile.user_id, ArtisanProfile.id).all())
+    first_messages = {}
+    for sender_id, receiver_id, first_at in session.query(
+        Message.sender_id, Message.receiver_id, func.min(Message.created_at)
+    ).group_by(Message.sender_id, Message.receiver_id).all():
+        pair = frozenset((sender_id, receiver_id))
+        if pair not in first_messages or first_at < first_messages[pair][1]:
+            first_messages[pair] = (receiver_id, first_at)
+    for receiver_id, first_at in first_messages.values():
+        if receiver_id in artisan_users and first_at:
+            buckets[(artisan_users[receiver_id], first_at.date())]['inquiries'] += 1
+
+    session.execute(delete(ArtisanDailyStat.__table__))
+    rows = [
+        {'artisan_id': artisan_id, 'day': day, **{column: counters.get(column, 0) for column in COUNTERS}}
+        for (artisan_id, day), counters in buckets.items()
+    ]
+    if rows:
+        session.execute(insert(ArtisanDailyStat.__table__), rows)
+    session.commit()
+    return {'rows': len(rows)}
+
+
+def ensure_artisan_rollups(session_factory):
+    """Queue a rebuild when the rollup table is empty but there is history to roll up"""
+    session = session_factory()
+    try:
+        if session.query(ArtisanDailyStat.id).first():
+            return
+        if session.query(Order.id).first() or session.query(Message.id).first():
+            enqueue(session, REBUILD_ARTISAN_ROLLUPS)
+            session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.warning("Could not check artisan rollups: %s", e)
+    finally:
+        session.close()
+
+
+def get_artisan_stats(session, artisan_id, days=30, months=12):
+    """Dashboard statistics for one artisan from the rollup table"""
+    table = ArtisanDailyStat
+    totals = session.query(*[func.coalesce(func.sum(getattr(table, column)), 0) for column in COUNTERS]).filter(
+        table.artisan_id == artisan_id
+    ).one()
+    totals = dict(zip(COUNTERS, totals))
+
+    today = datetime.utcnow().date()
+    first_month = date(today.year, today.month, 1)
+    for _ in range(months - 1):
+        first_month = (first_month - timedelta(days=1)).replace(day=1)
+    since = min(first_month, today - timedelta(days=days - 1))
+
+    rows = {row.day: row for row in session.query(table).filter(
+        table.artisan_id == artisan_id, table.day >= since
+    ).all()}
+
+    by_day = []
+    for offset in range(days - 1, -1, -1):
+        day = today - timedelta(days=offset)
+        row = rows.get(day)
+        by_day.append({
+            'date': day.isoformat(),
+            'earnings': round(row.earnings, 2) if row else 0.0,
+            'orders': row.orders_placed if row else 0
+        })
+
+    by_month = defaultdict(lambda: {'earnings': 0.0, 'orders': 0})
+    for day, row in rows.items():
+        if day >= first_month:
+            bucket = by_month[day.strftime('%Y-%m')]
+            bucket['earnings'] += row.earnings
+            bucket['orders'] += row.orders_placed
+    month, month_list = first_month, []
+    while month <= today:
+        key = month.strftime('%Y-%m')
+        month_list.append({'month': key, 'earnings': round(by_month[key]['earnings'], 2), 'orders': by_month[key]['orders']})
+        month = (month + timedelta(days=32)).replace(day=1)
+
+    recent = [row for day, row in rows.items() if day > today - timedelta(days=days)]
+    recent_inquiries = sum(row.inquiries for row in recent)
+    recent_orders = sum(row.orders_placed for row in recent)
+
+    return {
+        'total_products': session.query(func.count(Product.id)).filter(Product.artisan_id == artisan_id).scalar(),
+        'pending_orders': int(totals['open_orders_delta']),
+        'total_earnings': round(float(totals['earnings']), 2),
+        'orders_placed': int(totals['orders_placed']),
+        'orders_fulfilled': int(totals['orders_fulfilled']),
+        'orders_cancelled': int(totals['orders_cancelled']),
+        'earnings_by_day': by_day,
+        'earnings_by_month': month_list,
+        'conversion': {
+            'period_days': days,
+            'inquiries': recent_inquiries,
+            'orders': recent_orders,
+            'rate': round(recent_orders / recent_inquiries, 3) if recent_inquiries else None,
+            'all_time_rate': round(totals['orders_placed'] / totals['inquiries'], 3) if totals['inquiries'] else None
+        }
+    }
+
+
+@register_handler(REBUILD_ARTISAN_ROLLUPS)
+def run_rebuild_artisan_rollups(session, job, payload):
+    return rebuild_artisan_rollups(session)
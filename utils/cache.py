@@ -0,0 +1,193 @@
+"""
+Tiered Cache for AI Results
+An in-process LRU (bounded by entry count and TTL) in front of an optional
+SQLite file that is shared by every gunicorn worker on the same machine
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Shared on-disk tier for all caches; set AI_CACHE_DB= (empty) to disable
+AI_CACHE_DB = os.getenv('AI_CACHE_DB', 'ai_cache.db')
+
+logger = logging.getLogger(__name__)
+
+# Expired rows are pruned from the disk tier every this many writes
+PRUNE_EVERY = 500
+
+# Disk-tier errors of the same kind are logged at most once per this many seconds
+ERROR_LOG_INTERVAL = 60
+
+
+class TieredCache:
+    """
+    LRU + TTL cache with an optional SQLite tier
+
+    Values must be JSON-serializable. Every cache instance uses its own
+    namespace in the shared SQLite file, so several caches can share one db.
+    """
+
+    def __init__(self, namespace, max_entries=2048, ttl_seconds=7 * 24 * 3600, db_path=AI_CACHE_DB):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path or None
+
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self._error_logged_at = {}  # operation -> time of the last logged disk error
+        self.stats = {
+            'hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'writes': 0,
+            'disk_errors': 0
+        }
+
+        if self.db_path:
+            try:
+                conn = self._connection()
+                conn.execute("""CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )""")
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("Cache %s: disk tier disabled: %s", namespace, e)
+                self.db_path = None
+
+    @staticmethod
+    def make_key(*parts):
+        """Build a fixed-size key from arbitrary (JSON-serializable) parts"""
+        raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _disk_error(self, operation, error):
+        """Count a disk-tier error; log it unless the same kind was logged recently"""
+        now = time.monotonic()
+        with self._lock:
+            self.stats['disk_errors'] += 1
+            last = self._error_logged_at.get(operation)
+            if last is not None and now - last < ERROR_LOG_INTERVAL:
+                return
+            self._error_logged_at[operation] = now
+            errors = self.stats['disk_errors']
+        logger.warning("Cache %s: disk %s error: %s", self.namespace, operation, error,
+                       extra={'disk_errors': errors})
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, default=None):
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return value
+                del self._entries[key]
+                self.stats['expirations'] += 1
+
+        if self.db_path:
+            try:
+                row = self._connection().execute(
+                    "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)
+                ).fetchone()
+            except sqlite3.Error as e:
+                self._disk_error('read', e)
+                row = None
+
+            if row and row[1] > now:
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                with self._lock:
+                    self.stats['disk_hits'] += 1
+                return value
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return default
+
+    def set(self, key, value, ttl_seconds=None):
+        expires_at = time.time() + (ttl_seconds or self.ttl_seconds)
+        self._remember(key, value, expires_at)
+
+        with self._lock:
+            self.stats['writes'] += 1
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY == 0
+
+        if self.db_path:
+            try:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (self.namespace, key, json.dumps(value, ensure_ascii=False), expires_at)
+                )
+                if prune:
+                    conn.execute(
+                        "DELETE FROM cache_entries WHERE namespace = ? AND expires_at < ?",
+                        (self.namespace, time.time())
+                    )
+                conn.commit()
+            except sqlite3.Error as e:
+                self._disk_error('write', e)
+
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.db_path:
+            try:
+                conn = self._connection()
+                conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+                conn.commit()
+            except sqlite3.Error as e:
+                self._disk_error('clear', e)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._entries)
+
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['namespace'] = self.namespace
+        stats['max_entries'] = self.max_entries
+        stats['ttl_seconds'] = self.ttl_seconds
+        stats['persistent'] = bool(self.db_path)
+        stats['hit_rate'] = round((stats['hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        return stats
@@ -1,3 +1,6 @@
+import os
+from functools import lru_cache
+
 
 # Simple mapping of countries to currencies
 COUNTRY_CURRENCY_MAP = {
@@ -108,6 +111,22 @@ def convert_to_inr(price_foreign, source_currency):
     rate = get_inverse_rate(source_currency)
     return round(price_foreign * rate, 2)
 
+# Precomputed display prices, keyed on the INR price (the rate table is fixed
+# for the life of the process); bounded LRU shared by all products
+PRICE_SNAPSHOT_SIZE = int(os.getenv('PRICE_SNAPSHOT_SIZE', 4096))
+
+@lru_cache(maxsize=PRICE_SNAPSHOT_SIZE)
+def get_display_prices(price_inr):
+    """Get display prices for an INR price in every supported currency (do not mutate the result)"""
+    return {currency: convert_price(price_inr, currency) for currency in EXCHANGE_RATES}
+
+def get_display_price(price_inr, target_currency):
+    """Snapshot-backed equivalent of convert_price for catalog listings"""
+    prices = get_display_prices(price_inr)
+    if target_currency in prices:
+        return prices[target_currency]
+    return convert_price(price_inr, target_currency)
+
 def format_price(price, currency):
     """Format price with currency symbol"""
     symbols = {
@@ -0,0 +1,81 @@
+"""
+Perceptual Image Hashing
+Difference hashes (dHash) let us recognise re-uploads of the same product
+photo, even after re-compression or resizing, and reuse the stored image
+and its AI quality score instead of paying for another vision API call
+"""
+import os
+
+from PIL import Image
+from sqlalchemy import or_
+
+from models import ImageFingerprint
+
+# Maximum Hamming distance (out of 64 bits) for two images to count as the same.
+# Must stay below the number of bands for the banded lookup to be exact.
+DEDUP_MAX_DISTANCE = min(int(os.getenv('IMAGE_DEDUP_MAX_DISTANCE', 3)), 3)
+
+BAND_BITS = 16
+BAND_COUNT = 4
+
+
+def dhash(img, hash_size=8):
+    """64-bit difference hash: compares neighbouring pixels of a 9x8 grayscale thumbnail"""
+    small = img.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def hash_bands(value):
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (BAND_BITS * i)) & mask for i in range(BAND_COUNT)]
+
+
+def find_duplicate(session, value, max_distance=DEDUP_MAX_DISTANCE):
+    """
+    Find the closest stored fingerprint within max_distance of value
+
+    Returns the ImageFingerprint or None. Fingerprints whose file has been
+    removed from disk are ignored.
+    """
+    bands = hash_bands(value)
+    candidates = session.query(ImageFingerprint).filter(or_(
+        ImageFingerprint.band0 == bands[0],
+        ImageFingerprint.band1 == bands[1],
+        ImageFingerprint.band2 == bands[2],
+        ImageFingerprint.band3 == bands[3]
+    )).limit(50).all()
+    
+    best, best_distance = None, max_distance + 1
+    for candidate in candidates:
+        distance = hamming_distance(value, int(candidate.dhash, 16))
+        if distance < best_distance and os.path.exists(candidate.file_path):
+            best, best_distance = candidate, distance
+    return best
+
+
+def record_fingerprint(session, value, file_path, ai_quality_score=None):
+    """Store the fingerprint of a newly saved image"""
+    bands = hash_bands(value)
+    fingerprint = ImageFingerprint(
+        dhash=f"{value:016x}",
+        band0=bands[0],
+        band1=bands[1],
+        band2=bands[2],
+        band3=bands[3],
+        file_path=file_path,
+        ai_quality_score=ai_quality_score
+    )
+    session.add(fingerprint)
+    return fingerprint
@@ -0,0 +1,305 @@
+"""
+Product Image Pipeline
+Uploads are stored untouched under a content-addressed name and the
+responsive derivatives (thumb / card / full, WebP + JPEG) are generated
+later by a background job in a process pool, so the upload request does
+no Pillow work beyond hashing.
+
+Product.images holds a JSON list of manifest entries:
+    {
+        "hash": "<sha256 of the original>",
+        "original": "static/uploads/originals/<hash>.jpg",
+        "variants": {"thumb": {"webp": "...", "jpeg": "..."}, "card": {...}, "full": {...}}
+    }
+Older products store plain path strings; the helpers below accept both.
+
+Identical uploads share one stored original, so product_image_files records
+which products use each file; a product's files are deleted from disk only
+once no other product references them, and only after the delete commits.
+"""
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+from models import Product, ProductImageFile, ImageFingerprint
+from utils.job_queue import register_handler, enqueue
+from utils.visual_index import NUMPY_AVAILABLE, save_features
+
+logger = logging.getLogger(__name__)
+
+ORIGINALS_DIR = 'static/uploads/originals'
+DERIVED_DIR = 'static/uploads/derived'
+
+# Longest edge in pixels for each derivative
+DERIVATIVE_SIZES = {
+    'thumb': 320,
+    'card': 640,
+    'full': 1200
+}
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+# Worker processes for Pillow work (0 runs it in the job worker thread)
+IMAGE_PROCESS_WORKERS = int(os.getenv('IMAGE_PROCESS_WORKERS', 2))
+
+# Seconds to wait for one image's derivatives before the job is retried
+IMAGE_PROCESS_TIMEOUT = int(os.getenv('IMAGE_PROCESS_TIMEOUT', 120))
+
+IMAGE_DERIVATIVES = 'image_derivatives'
+
+_executor = None
+
+
+def store_original(file_storage):
+    """
+    Save an uploaded file under the sha256 of its content
+
+    Returns:
+        (content_hash, path). Uploading the same bytes twice writes the file once.
+    """
+    data = file_storage.read()
+    content_hash = hashlib.sha256(data).hexdigest()
+
+    ext = 'jpg'
+    if file_storage.filename and '.' in file_storage.filename:
+        ext = file_storage.filename.rsplit('.', 1)[1].lower()
+
+    os.makedirs(ORIGINALS_DIR, exist_ok=True)
+    path = os.path.join(ORIGINALS_DIR, f"{content_hash}.{ext}")
+    if not os.path.exists(path):
+        with open(path, 'wb') as f:
+            f.write(data)
+    return content_hash, path
+
+
+def derivative_path(content_hash, size_name, fmt):
+    ext = 'jpg' if fmt == 'jpeg' else fmt
+    return os.path.join(DERIVED_DIR, f"{content_hash}_{size_name}.{ext}")
+
+
+def existing_variants(content_hash):
+    """Variants of an original that are already on disk"""
+    variants = {}
+    for size_name in DERIVATIVE_SIZES:
+        formats = {}
+        for fmt in ('webp', 'jpeg'):
+            path = derivative_path(content_hash, size_name, fmt)
+            if os.path.exists(path):
+                formats[fmt] = path
+        if len(formats) == 2:
+            variants[size_name] = formats
+    return variants
+
+
+def manifest_entry(original_path):
+    """Manifest entry for a stored original, including derivatives already generated"""
+    content_hash = os.path.splitext(os.path.basename(original_path))[0]
+    return {
+        'hash': content_hash,
+        'original': original_path,
+        'variants': existing_variants(content_hash)
+    }
+
+
+def generate_derivatives(original_path, content_hash):
+    """
+    Generate every missing derivative of an original (runs in a worker process)
+
+    Returns:
+        variants dict for the manifest
+    """
+    os.makedirs(DERIVED_DIR, exist_ok=True)
+
+    img = Image.open(original_path)
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+
+    variants = {}
+    for size_name, edge in DERIVATIVE_SIZES.items():
+        resized = img.copy()
+        resized.thumbnail((edge, edge))
+
+        webp_path = derivative_path(content_hash, size_name, 'webp')
+        jpeg_path = derivative_path(content_hash, size_name, 'jpeg')
+
+        # Write under a temp name so readers never see half-written files
+        if not os.path.exists(webp_path):
+            resized.save(webp_path + '.tmp', 'WEBP', quality=WEBP_QUALITY, method=4)
+            os.replace(webp_path + '.tmp', webp_path)
+        if not os.path.exists(jpeg_path):
+            resized.save(jpeg_path + '.tmp', 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+            os.replace(jpeg_path + '.tmp', jpeg_path)
+
+        variants[size_name] = {'webp': webp_path, 'jpeg': jpeg_path}
+
+    return variants
+
+
+def _run_in_pool(fn, *args):
+    global _executor
+
+    if IMAGE_PROCESS_WORKERS <= 0:
+        return fn(*args)
+
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_PROCESS_WORKERS)
+    return _executor.submit(fn, *args).result(timeout=IMAGE_PROCESS_TIMEOUT)
+
+
+def load_manifest(images_json):
+    """Parse Product.images into a list of manifest entries or legacy path strings"""
+    if not images_json:
+        return []
+    try:
+        images = json.loads(images_json)
+    except (TypeError, ValueError):
+        return [images_json]
+    if isinstance(images, str):
+        return [images]
+    if not isinstance(images, list):
+        return [str(images)]
+    return images
+
+
+def image_urls(images_json, variant='full'):
+    """
+    Image paths for clients, preferring the JPEG of the requested variant
+    and falling back to the original while derivatives are being generated
+    """
+    urls = []
+    for entry in load_manifest(images_json):
+        if isinstance(entry, dict):
+            formats = entry.get('variants', {}).get(variant)
+            urls.append(formats['jpeg'] if formats else entry['original'])
+        else:
+            urls.append(entry)
+    return urls
+
+
+def image_variants(images_json):
+    """Manifest entries for clients that pick sizes/formats themselves (e.g. <picture>)"""
+    return [entry for entry in load_manifest(images_json) if isinstance(entry, dict)]
+
+
+def original_path(entry):
+    """Stored original of a manifest entry (or a legacy path)"""
+    return entry['original'] if isinstance(entry, dict) else entry
+
+
+def record_image_files(session, product_id, entries):
+    """Record the stored originals a product uses"""
+    for path in dict.fromkeys(original_path(entry) for entry in entries):
+        session.add(ProductImageFile(product_id=product_id, file_path=path))
+
+
+def release_image_files(session, product):
+    """
+    Drop a product's file references (call before deleting it, in the same transaction)
+
+    Returns:
+        manifest entries whose files no other product uses; remove them with
+        remove_image_files() once the transaction has committed
+    """
+    session.query(ProductImageFile).filter_by(product_id=product.id).delete(synchronize_session=False)
+    orphaned = []
+    for entry in load_manifest(product.images):
+        path = original_path(entry)
+        if session.query(ProductImageFile.id).filter_by(file_path=path).first():
+            continue
+        session.query(ImageFingerprint).filter_by(file_path=path).delete(synchronize_session=False)
+        orphaned.append(entry)
+    return orphaned
+
+
+def remove_image_files(entries):
+    for entry in entries:
+        for path in image_files(entry):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("Could not remove image %s: %s", path, e)
+
+
+def ensure_image_files(session_factory):
+    """Backfill file references for products created before product_image_files existed"""
+    session = session_factory()
+    try:
+        products = session.query(Product.id, Product.images).outerjoin(
+            ProductImageFile, ProductImageFile.product_id == Product.id
+        ).filter(ProductImageFile.id == None, Product.images != None).all()
+        for product_id, images in products:
+            record_image_files(session, product_id, load_manifest(images))
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.warning("Could not backfill product image files: %s", e)
+    finally:
+        session.close()
+
+
+def image_files(entry):
+    """All files on disk belonging to a manifest entry (or a legacy path)"""
+    if not isinstance(entry, dict):
+        return [entry]
+    files = [entry['original']]
+    for formats in entry.get('variants', {}).values():
+        files.extend(formats.values())
+    return files
+
+
+def enqueue_derivatives(session, product_id, quality_fingerprint_id=None, assess_quality=False):
+    """Queue derivative generation for a product (and its AI quality check afterwards)"""
+    return enqueue(session, IMAGE_DERIVATIVES, {
+        'assess_quality': assess_quality,
+        'quality_fingerprint_id': quality_fingerprint_id
+    }, product_id=product_id)
+
+
+@register_handler(IMAGE_DERIVATIVES)
+def run_image_derivatives(session, job, payload):
+    from utils.quality_assessment import enqueue_quality_assessment
+
+    product = session.query(Product).filter_by(id=job.product_id).first()
+    if not product:
+        return {'skipped': 'product not found'}
+
+    manifest = load_manifest(product.images)
+    generated = 0
+    for entry in manifest:
+        if not isinstance(entry, dict) or len(entry.get('variants', {})) == len(DERIVATIVE_SIZES):
+            continue
+        entry['variants'] = _run_in_pool(generate_derivatives, entry['original'], entry['hash'])
+        generated += 1
+
+    product.images = json.dumps(manifest)
+
+    # Index the main image for visual search (legacy entries are plain paths)
+    indexed = False
+    if manifest and NUMPY_AVAILABLE:
+        main = manifest[0]
+        if isinstance(main, dict):
+            main = main['variants'].get('card', {}).get('jpeg', main['original'])
+        if os.path.exists(main):
+            save_features(session, product.id, main)
+            indexed = True
+
+    # Assess the card-sized JPEG: small enough for the vision API, no temp copy needed
+    quality_job_id = None
+    if payload.get('assess_quality') and manifest and isinstance(manifest[0], dict):
+        card = manifest[0]['variants'].get('card', {}).get('jpeg', manifest[0]['original'])
+        quality_job = enqueue_quality_assessment(
+            session, product.id, card,
+            cleanup=False, fingerprint_id=payload.get('quality_fingerprint_id')
+        )
+        session.flush()
+        quality_job_id = quality_job.id
+
+    return {'generated': generated, 'indexed': indexed, 'quality_job_id': quality_job_id}
@@ -0,0 +1,270 @@
+"""
+Persistent Background Job Queue
+Jobs are rows in the background_jobs table, processed by a fixed-size pool
+of worker threads with retries and exponential backoff. Used for slow work
+such as AI quality assessment so uploads never spawn unbounded threads.
+"""
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from models import BackgroundJob, RecurringJob
+
+logger = logging.getLogger(__name__)
+
+# Number of worker threads per process (0 disables the workers)
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+
+# Seconds between polls when the queue is empty
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 2))
+
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 4))
+
+# Retry delay is JOB_RETRY_BASE * 2^(attempt - 1) seconds, capped at JOB_RETRY_MAX
+JOB_RETRY_BASE = float(os.getenv('JOB_RETRY_BASE', 10))
+JOB_RETRY_MAX = float(os.getenv('JOB_RETRY_MAX', 600))
+
+# Running jobs not updated for this long are assumed lost (crashed worker)
+JOB_STALE_AFTER = timedelta(minutes=int(os.getenv('JOB_STALE_MINUTES', 15)))
+
+# job_type -> handler(session, job, payload) returning a JSON-serializable result
+HANDLERS = {}
+
+# job_type -> seconds between runs, for jobs that reschedule themselves
+RECURRING = {}
+
+_wakeup = threading.Event()
+_workers = []
+
+
+def register_handler(job_type, every=None):
+    """
+    Decorator registering the handler for a job type
+
+    With every=<seconds> the job is recurring: start_workers() makes sure one
+    instance is queued, and each run queues the next one when it finishes.
+    The recurring_jobs row of the type points at its current instance, so
+    only one chain exists however many processes start.
+    """
+    def decorator(fn):
+        HANDLERS[job_type] = fn
+        if every:
+            RECURRING[job_type] = every
+        return fn
+    return decorator
+
+
+def enqueue(session, job_type, payload=None, product_id=None, max_attempts=None, delay_seconds=0):
+    """
+    Add a job to the queue
+
+    The job is added to the given session; it becomes visible to workers
+    when the caller commits. Call notify_workers() after committing to
+    skip the poll delay.
+    """
+    if job_type not in HANDLERS:
+        raise ValueError(f"No handler registered for job type '{job_type}'")
+
+    job = BackgroundJob(
+        job_type=job_type,
+        product_id=product_id,
+        payload=json.dumps(payload or {}),
+        status='queued',
+        attempts=0,
+        max_attempts=max_attempts or JOB_MAX_ATTEMPTS,
+        run_after=datetime.utcnow() + timedelta(seconds=delay_seconds)
+    )
+    session.add(job)
+    return job
+
+
+def notify_workers():
+    """Wake idle workers in this process"""
+    _wakeup.set()
+
+
+def retry_delay(attempts):
+    return min(JOB_RETRY_BASE * (2 ** max(attempts - 1, 0)), JOB_RETRY_MAX)
+
+
+def job_to_dict(job):
+    return {
+        'id': job.id,
+        'job_type': job.job_type,
+        'product_id': job.product_id,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'last_error': job.last_error,
+        'result': json.loads(job.result) if job.result else None,
+        'run_after': job.run_after.isoformat() if job.run_after else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'created_at': job.created_at.isoformat() if job.created_at else None
+    }
+
+
+def claim_next_job(session):
+    """
+    Atomically move the oldest due job from queued to running
+
+    The conditional UPDATE makes claiming safe across threads and processes.
+    """
+    now = datetime.utcnow()
+    candidates = session.query(BackgroundJob.id).filter(
+        BackgroundJob.status == 'queued',
+        BackgroundJob.run_after <= now
+    ).order_by(BackgroundJob.run_after, BackgroundJob.id).limit(5).all()
+
+    for (job_id,) in candidates:
+        claimed = session.execute(
+            update(BackgroundJob)
+            .where(BackgroundJob.id == job_id, BackgroundJob.status == 'queued')
+            .values(
+                status='running',
+                attempts=BackgroundJob.attempts + 1,
+                started_at=now,
+                updated_at=now
+            )
+        ).rowcount
+        session.commit()
+        if claimed:
+            return session.query(BackgroundJob).filter_by(id=job_id).first()
+
+    return None
+
+
+def run_job(session, job):
+    """Run a claimed job and record its outcome"""
+    handler = HANDLERS.get(job.job_type)
+
+    try:
+        if handler is None:
+            raise ValueError(f"No handler registered for job type '{job.job_type}'")
+
+        result = handler(session, job, json.loads(job.payload or '{}'))
+
+        job.status = 'completed'
+        job.result = json.dumps(result) if result is not None else None
+        job.last_error = None
+        job.finished_at = datetime.utcnow()
+        session.commit()
+
+    except Exception as e:
+        session.rollback()
+        logger.exception("Background job %s (%s) attempt %s failed", job.id, job.job_type, job.attempts)
+
+        job.last_error = f"{type(e).__name__}: {e}"
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+        else:
+            job.status = 'queued'
+            job.run_after = datetime.utcnow() + timedelta(seconds=retry_delay(job.attempts))
+        session.commit()
+
+    if job.job_type in RECURRING and job.status in ('completed', 'failed'):
+        schedule_next(session, job.job_type, job.id, RECURRING[job.job_type])
+
+
+def requeue_stale_jobs(session):
+    """Put jobs left running by a crashed worker back in the queue"""
+    cutoff = datetime.utcnow() - JOB_STALE_AFTER
+    count = session.execute(
+        update(BackgroundJob)
+        .where(BackgroundJob.status == 'running', BackgroundJob.updated_at < cutoff)
+        .values(status='queued', run_after=datetime.utcnow())
+    ).rowcount
+    session.commit()
+    if count:
+        logger.warning("Requeued %s stale background jobs", count)
+
+
+def schedule_next(session, job_type, current_job_id, delay_seconds=0):
+    """
+    Queue the next instance of a recurring job if current_job_id is still
+    the scheduled one; the compare-and-set on recurring_jobs makes a second
+    process (or a leftover duplicate instance) back off. Returns the job or None.
+    """
+    job = enqueue(session, job_type, delay_seconds=delay_seconds)
+    session.flush()
+    current = RecurringJob.job_id.is_(None) if current_job_id is None else RecurringJob.job_id == current_job_id
+    claimed = session.execute(
+        update(RecurringJob)
+        .where(RecurringJob.job_type == job_type, current)
+        .values(job_id=job.id, updated_at=datetime.utcnow())
+    ).rowcount
+    if not claimed:
+        session.rollback()
+        return None
+    session.commit()
+    return job
+
+
+def schedule_recurring_jobs(session):
+    """Queue recurring job types that have no pending instance (e.g. first start)"""
+    for job_type in RECURRING:
+        schedule = session.get(RecurringJob, job_type)
+        if schedule is None:
+            try:
+                session.add(RecurringJob(job_type=job_type))
+                session.commit()
+            except IntegrityError:
+                session.rollback()  # created by another process
+            schedule = session.get(RecurringJob, job_type)
+
+        if schedule.job_id is not None:
+            pending = session.query(BackgroundJob.id).filter(
+                BackgroundJob.id == schedule.job_id,
+                BackgroundJob.status.in_(('queued', 'running'))
+            ).first()
+            if pending:
+                continue
+        schedule_next(session, job_type, schedule.job_id)
+
+
+def _worker_loop(session_factory):
+    while True:
+        session = session_factory()
+        try:
+            job = claim_next_job(session)
+            if job:
+                run_job(session, job)
+                continue
+        except Exception as e:
+            session.rollback()
+            logger.exception("Background worker error")
+        finally:
+            session.close()
+
+        _wakeup.wait(JOB_POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def start_workers(session_factory, concurrency=JOB_WORKERS):
+    """Start the worker pool for this process (idempotent)"""
+    if _workers or concurrency <= 0:
+        return
+
+    session = session_factory()
+    try:
+        requeue_stale_jobs(session)
+        schedule_recurring_jobs(session)
+    except Exception as e:
+        session.rollback()
+        logger.warning("Could not prepare the job queue: %s", e)
+    finally:
+        session.close()
+
+    for i in range(concurrency):
+        worker = threading.Thread(target=_worker_loop, args=(session_factory,), name=f'job-worker-{i}')
+        worker.daemon = True
+        worker.start()
+        _workers.append(worker)
+
+    logger.info("Started %s background job workers", concurrency)
@@ -0,0 +1,514 @@
+"""
+LLM Gateway
+Single entry point for Gemini and OpenAI calls. Model clients are created
+once and reused; every call runs under a deadline, a per-provider
+concurrency limit, retries with exponential backoff and a circuit breaker,
+so a slow or failing upstream cannot tie up the web workers.
+
+Providers are tried in order (AI_PROVIDER first). A provider whose breaker
+is open, whose slots stay busy until the deadline, or whose retries are
+exhausted is skipped; when none succeeds LLMUnavailable is raised and the
+caller serves its offline fallback.
+
+- LLM_DEADLINE_SECONDS: total time budget per call, across retries and providers (30)
+- LLM_ATTEMPT_TIMEOUT: upper bound for a single API request (20)
+- LLM_MAX_RETRIES: retries per provider for timeouts, rate limits and 5xx (2)
+- LLM_CONCURRENCY, LLM_CONCURRENCY_GEMINI, LLM_CONCURRENCY_OPENAI: in-flight calls per provider (8)
+- LLM_BREAKER_THRESHOLD: consecutive provider-side failures (not 4xx client errors) that open a provider's breaker (5)
+- LLM_BREAKER_COOLDOWN: seconds before an open breaker lets a trial call through (30)
+
+Text-only calls made with cache=True are answered from LLM_CACHE, a
+TieredCache keyed on (provider, model, normalized prompt, system
+instruction, generation config), before any provider is contacted:
+
+- LLM_CACHE_SIZE: in-process entries (2048); the SQLite tier is shared by workers
+- LLM_CACHE_TTL: seconds a response is reused (7 days)
+- LLM_CACHE_MAX_CHARS: longer responses are not cached (20000)
+
+stream() is the incremental variant of generate(): it yields text chunks
+as the provider produces them. Failover and retries only happen before the
+first chunk; an error after that ends the stream with LLMUnavailable.
+"""
+import base64
+import logging
+import os
+import random
+import re
+import threading
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+from utils.cache import TieredCache
+from utils.metrics import track_llm_call, LLM_GATEWAY_EVENTS, LLM_FIRST_TOKEN_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Conditional imports
+try:
+    import google.generativeai as genai
+    GEMINI_AVAILABLE = True
+except ImportError:
+    GEMINI_AVAILABLE = False
+    genai = None
+
+try:
+    from openai import OpenAI
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+    OpenAI = None
+
+AI_PROVIDER = os.getenv('AI_PROVIDER', 'gemini').lower()
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
+
+LLM_DEADLINE_SECONDS = float(os.getenv('LLM_DEADLINE_SECONDS', 30))
+LLM_ATTEMPT_TIMEOUT = float(os.getenv('LLM_ATTEMPT_TIMEOUT', 20))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', 0.5))
+LLM_CONCURRENCY = int(os.getenv('LLM_CONCURRENCY', 8))
+LLM_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', 5))
+LLM_BREAKER_COOLDOWN = float(os.getenv('LLM_BREAKER_COOLDOWN', 30))
+LLM_CACHE_MAX_CHARS = int(os.getenv('LLM_CACHE_MAX_CHARS', 20000))
+
+LLM_CACHE = TieredCache(
+    'llm',
+    max_entries=int(os.getenv('LLM_CACHE_SIZE', 2048)),
+    ttl_seconds=int(os.getenv('LLM_CACHE_TTL', 7 * 24 * 3600))
+)
+
+if GEMINI_AVAILABLE and GEMINI_API_KEY:
+    genai.configure(api_key=GEMINI_API_KEY)
+elif not GEMINI_AVAILABLE:
+    logger.warning("google-generativeai not installed. Install with: pip install google-generativeai")
+
+# Safety filters would otherwise block ordinary marketplace text (prices, haggling)
+GEMINI_SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+]
+
+# Error types worth retrying, by class name (google.api_core and openai exceptions)
+RETRYABLE_ERRORS = {
+    'APITimeoutError', 'APIConnectionError', 'RateLimitError', 'InternalServerError',
+    'DeadlineExceeded', 'ServiceUnavailable', 'ResourceExhausted', 'TooManyRequests', 'GatewayTimeout'
+}
+
+LLMResult = namedtuple('LLMResult', ('text', 'provider', 'model'))
+
+
+class LLMUnavailable(Exception):
+    """No provider produced a response within the deadline"""
+
+
+class _Busy(Exception):
+    """No concurrency slot freed up before the deadline"""
+
+
+def normalize_prompt(text):
+    """Prompt text with Unicode normalized and whitespace runs collapsed, for cache keys"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text or '')).strip()
+
+
+def _retryable(exc):
+    if isinstance(exc, (TimeoutError, ConnectionError)) or type(exc).__name__ in RETRYABLE_ERRORS:
+        return True
+    status = getattr(exc, 'status_code', None) or getattr(exc, 'code', None)
+    return isinstance(status, int) and (status in (408, 429) or status >= 500)
+
+
+def _record_failure(breaker, exc):
+    """Count provider-side errors (5xx, timeouts, connection, rate limits) toward the breaker"""
+    if _retryable(exc):
+        breaker.failure()
+    else:
+        # Client errors (bad request, auth, blocked content) say nothing about the provider's health
+        breaker.release_trial()
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker: open after `threshold` failures, let one
+    trial call through after `cooldown` seconds (half-open), close on success
+    """
+
+    def __init__(self, threshold=LLM_BREAKER_THRESHOLD, cooldown=LLM_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.cooldown else 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                if self.opened_at is None or self._trial:
+                    logger.warning("LLM circuit opened", extra={'failures': self.failures})
+                self.opened_at = time.monotonic()
+                self._trial = False
+
+    def release_trial(self):
+        """A trial call that ended without reaching the provider (e.g. no slot)"""
+        with self._lock:
+            self._trial = False
+
+
+class Provider(ABC):
+    """One upstream API: its client, concurrency slots and breaker"""
+
+    def __init__(self, name, model):
+        self.name = name
+        self.model = model
+        limit = int(os.getenv(f'LLM_CONCURRENCY_{name.upper()}', LLM_CONCURRENCY))
+        self.slots = threading.BoundedSemaphore(limit)
+        self.limit = limit
+        self.in_flight = 0
+        self.breaker = CircuitBreaker()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout):
+        if not self.slots.acquire(timeout=max(timeout, 0)):
+            raise _Busy(self.name)
+        with self._lock:
+            self.in_flight += 1
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self.slots.release()
+
+    @abstractmethod
+    def call(self, prompt, system, image_path, config, timeout):
+        """(raw response, text) for one request"""
+
+    @abstractmethod
+    def stream(self, prompt, system, config, timeout):
+        """Iterator of (raw chunk, text) for one streamed request"""
+
+
+class GeminiProvider(Provider):
+    def __init__(self, model=GEMINI_MODEL):
+        super().__init__('gemini', model)
+        self._models = {}
+
+    def client(self, system):
+        # GenerativeModel is cheap to keep and carries the system instruction
+        key = system or ''
+        model = self._models.get(key)
+        if model is None:
+            model = self._models[key] = genai.GenerativeModel(self.model, system_instruction=system or None)
+        return model
+
+    def call(self, prompt, system, image_path, config, timeout):
+        contents = prompt
+        if image_path:
+            from PIL import Image
+            contents = [prompt, Image.open(image_path)]
+        response = self.client(system).generate_content(
+            contents,
+            safety_settings=GEMINI_SAFETY_SETTINGS,
+            generation_config=config or None,
+            request_options={'timeout': timeout}
+        )
+        try:
+            text = response.text
+        except ValueError:
+            # Blocked or empty candidates; not a provider failure
+            logger.warning("Gemini returned an empty or blocked response", extra={
+                'prompt_chars': len(prompt), 'prompt_feedback': str(getattr(response, 'prompt_feedback', 'N/A'))
+            })
+            text = ''
+        return response, text or ''
+
+    def stream(self, prompt, system, config, timeout):
+        response = self.client(system).generate_content(
+            prompt,
+            safety_settings=GEMINI_SAFETY_SETTINGS,
+            generation_config=config or None,
+            request_options={'timeout': timeout},
+            stream=True
+        )
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                text = ''
+            yield chunk, text or ''
+
+
+class OpenAIProvider(Provider):
+    def __init__(self, model=OPENAI_MODEL):
+        super().__init__('openai', model)
+        # Retries and timeouts are handled by the gateway
+        self.client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+
+    @staticmethod
+    def _request(prompt, system, image_path, config):
+        """Chat messages and sampling options equivalent to a Gemini request"""
+        content = prompt
+        if image_path:
+            with open(image_path, 'rb') as image_file:
+                encoded = base64.b64encode(image_file.read()).decode('utf-8')
+            content = [
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{encoded}"}}
+            ]
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": content})
+
+        options = {'max_tokens': (config or {}).get('max_output_tokens', 1024)}
+        for key in ('temperature', 'top_p'):
+            if key in (config or {}):
+                options[key] = config[key]
+        return messages, options
+
+    def call(self, prompt, system, image_path, config, timeout):
+        messages, options = self._request(prompt, system, image_path, config)
+        response = self.client.chat.completions.create(
+            model=self.model, messages=messages, timeout=timeout, **options
+        )
+        return response, (response.choices[0].message.content or '')
+
+    def stream(self, prompt, system, config, timeout):
+        messages, options = self._request(prompt, system, None, config)
+        response = self.client.chat.completions.create(
+            model=self.model, messages=messages, timeout=timeout,
+            stream=True, stream_options={'include_usage': True}, **options
+        )
+        for chunk in response:
+            yield chunk, (chunk.choices[0].delta.content or '') if chunk.choices else ''
+
+
+class LLMGateway:
+    def __init__(self):
+        self.providers = {}
+        if GEMINI_AVAILABLE and GEMINI_API_KEY:
+            self.providers['gemini'] = GeminiProvider()
+        if OPENAI_AVAILABLE and OPENAI_API_KEY:
+            self.providers['openai'] = OpenAIProvider()
+
+    def order(self, only=None):
+        """Configured provider names, preferred provider first"""
+        names = sorted(self.providers, key=lambda name: name != AI_PROVIDER)
+        return [name for name in names if only is None or name in only]
+
+    @property
+    def available(self):
+        return bool(self.providers)
+
+    def generate(self, prompt, operation='generate', system=None, image_path=None,
+                 generation_config=None, providers=None, deadline=LLM_DEADLINE_SECONDS, cache=False):
+        """
+        Run one prompt, failing over between providers
+
+        generation_config uses Gemini's keys (temperature, top_p, top_k,
+        max_output_tokens); OpenAI gets the equivalents it supports.
+        With cache=True a stored response from any eligible provider is
+        returned as is, and a new non-empty response is stored.
+        Returns an LLMResult, raises LLMUnavailable.
+        """
+        names = self.order(providers)
+        cache = cache and not image_path
+        if cache:
+            keys = {name: self._cache_key(name, prompt, system, generation_config) for name in names}
+            for name in names:
+                text = LLM_CACHE.get(keys[name])
+                if text is not None:
+                    LLM_GATEWAY_EVENTS.inc(name, 'cache_hit')
+                    return LLMResult(text, name, self.providers[name].model)
+
+        expires = time.monotonic() + deadline
+        errors = []
+        for index, name in enumerate(names):
+            provider = self.providers[name]
+            if index:
+                LLM_GATEWAY_EVENTS.inc(name, 'failover')
+            if not provider.breaker.allow():
+                LLM_GATEWAY_EVENTS.inc(name, 'circuit_open')
+                errors.append(f'{name}: circuit open')
+                continue
+            try:
+                result = self._call(provider, prompt, operation, system, image_path, generation_config, expires)
+            except _Busy:
+                provider.breaker.release_trial()
+                LLM_GATEWAY_EVENTS.inc(name, 'busy')
+                errors.append(f'{name}: no free slot')
+            except Exception as e:
+                errors.append(f'{name}: {type(e).__name__}: {e}')
+            else:
+                if cache and result.text and len(result.text) <= LLM_CACHE_MAX_CHARS:
+                    LLM_CACHE.set(keys[name], result.text)
+                return result
+        raise LLMUnavailable('; '.join(errors) or 'no LLM provider configured')
+
+    def stream(self, prompt, operation='generate', system=None, generation_config=None,
+               providers=None, deadline=LLM_DEADLINE_SECONDS, cache=False):
+        """
+        Like generate(), but yields the response text in chunks as it arrives
+
+        A cached response is yielded as a single chunk. Raises LLMUnavailable
+        when no provider starts a stream, or when one fails part-way.
+        """
+        names = self.order(providers)
+        if cache:
+            keys = {name: self._cache_key(name, prompt, system, generation_config) for name in names}
+            for name in names:
+                text = LLM_CACHE.get(keys[name])
+                if text is not None:
+                    LLM_GATEWAY_EVENTS.inc(name, 'cache_hit')
+                    yield text
+                    return
+
+        expires = time.monotonic() + deadline
+        errors = []
+        for index, name in enumerate(names):
+            provider = self.providers[name]
+            if index:
+                LLM_GATEWAY_EVENTS.inc(name, 'failover')
+            if not provider.breaker.allow():
+                LLM_GATEWAY_EVENTS.inc(name, 'circuit_open')
+                errors.append(f'{name}: circuit open')
+                continue
+            try:
+                provider.acquire(expires - time.monotonic())
+            except _Busy:
+                provider.breaker.release_trial()
+                LLM_GATEWAY_EVENTS.inc(name, 'busy')
+                errors.append(f'{name}: no free slot')
+                continue
+
+            parts = []
+            try:
+                for text in self._stream(provider, prompt, operation, system, generation_config, expires):
+                    parts.append(text)
+                    yield text
+            except Exception as e:
+                _record_failure(provider.breaker, e)
+                logger.warning("%s %s stream failed: %s: %s", name, operation, type(e).__name__, e)
+                if parts:
+                    raise LLMUnavailable(f'{name} stream interrupted: {type(e).__name__}') from e
+                errors.append(f'{name}: {type(e).__name__}: {e}')
+                continue
+            finally:
+                provider.release()
+                # A consumer that stops reading leaves a half-open trial unresolved
+                provider.breaker.release_trial()
+
+            provider.breaker.success()
+            text = ''.join(parts).strip()
+            if cache and text and len(text) <= LLM_CACHE_MAX_CHARS:
+                LLM_CACHE.set(keys[name], text)
+            return
+        raise LLMUnavailable('; '.join(errors) or 'no LLM provider configured')
+
+    def _stream(self, provider, prompt, operation, system, config, expires):
+        """One provider's chunks; retried like _call() until the first chunk arrives"""
+        attempt = 0
+        while True:
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f'{provider.name} deadline exceeded')
+            started = time.perf_counter()
+            emitted = False
+            try:
+                with track_llm_call(provider.name, provider.model, operation) as call:
+                    for chunk, text in provider.stream(prompt, system, config, min(remaining, LLM_ATTEMPT_TIMEOUT)):
+                        if getattr(chunk, 'usage', None) or getattr(chunk, 'usage_metadata', None):
+                            call.record(chunk)
+                        if not text:
+                            continue
+                        if not emitted:
+                            emitted = True
+                            LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started, provider.name, operation)
+                        yield text
+                return
+            except Exception as e:
+                delay = LLM_BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random() / 2)
+                if (not emitted and attempt < LLM_MAX_RETRIES and _retryable(e)
+                        and expires - time.monotonic() > delay):
+                    attempt += 1
+                    LLM_GATEWAY_EVENTS.inc(provider.name, 'retry')
+                    time.sleep(delay)
+                    continue
+                raise
+
+    def _cache_key(self, name, prompt, system, config):
+        return LLM_CACHE.make_key(
+            name, self.providers[name].model, normalize_prompt(prompt), normalize_prompt(system), config or {}
+        )
+
+    def _call(self, provider, prompt, operation, system, image_path, config, expires):
+        provider.acquire(expires - time.monotonic())
+        try:
+            attempt = 0
+            while True:
+                remaining = expires - time.monotonic()
+                if remaining <= 0:
+                    provider.breaker.release_trial()
+                    raise TimeoutError(f'{provider.name} deadline exceeded')
+                try:
+                    with track_llm_call(provider.name, provider.model, operation) as call:
+                        response, text = provider.call(
+                            prompt, system, image_path, config, min(remaining, LLM_ATTEMPT_TIMEOUT)
+                        )
+                        call.record(response)
+                except Exception as e:
+                    delay = LLM_BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random() / 2)
+                    if attempt < LLM_MAX_RETRIES and _retryable(e) and expires - time.monotonic() > delay:
+                        attempt += 1
+                        LLM_GATEWAY_EVENTS.inc(provider.name, 'retry')
+                        logger.info("Retrying %s after %s", provider.name, type(e).__name__,
+                                    extra={'attempt': attempt, 'delay': round(delay, 2)})
+                        time.sleep(delay)
+                        continue
+                    _record_failure(provider.breaker, e)
+                    logger.warning("%s %s call failed: %s: %s", provider.name, operation, type(e).__name__, e)
+                    raise
+                provider.breaker.success()
+                return LLMResult(text.strip(), provider.name, provider.model)
+        finally:
+            provider.release()
+
+    def stats(self):
+        return {
+            name: {
+                'model': provider.model,
+                'circuit': provider.breaker.state,
+                'consecutive_failures': provider.breaker.failures,
+                'in_flight': provider.in_flight,
+                'concurrency_limit': provider.limit
+            }
+            for name, provider in self.providers.items()
+        }
+
+
+GATEWAY = LLMGateway()
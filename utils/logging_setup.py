@@ -0,0 +1,159 @@
+"""
+Structured Logging
+Application modules log through logging.getLogger(__name__). Records pass
+through a bounded in-memory queue and a single background listener writes
+them to stdout, so request threads and the eventlet loop never wait on the
+stream. When the queue is full, records are dropped and counted.
+
+- LOG_FORMAT: json (default) or text
+- LOG_LEVEL: root level (INFO)
+- LOG_LEVELS: per-module levels, e.g. "utils.ai_service_gemini=DEBUG,utils.job_queue=WARNING"
+- LOG_QUEUE_SIZE: records buffered before dropping (10000)
+
+Every record carries the current request id (from X-Request-ID or
+generated per request). High-frequency events pass extra={'sample_rate': r}
+and only a fraction r of them are emitted.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').strip().lower()
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').strip().upper()
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+
+# Request id of the request (or socket event) being handled
+request_id_var = contextvars.ContextVar('request_id', default='-')
+
+# LogRecord attributes that are not user-supplied extra fields
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {
+    'message', 'asctime', 'request_id', 'sample_rate'
+}
+
+_listener = None
+_dropped = {'count': 0}
+_dropped_lock = threading.Lock()
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a record with probability record.sample_rate (always for warnings and above)"""
+
+    def filter(self, record):
+        rate = getattr(record, 'sample_rate', None)
+        if rate is None or rate >= 1 or record.levelno >= logging.WARNING:
+            return True
+        return random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        if record.exc_text and record.exc_text not in line:
+            line = f"{line}\n{record.exc_text}"
+        return line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: records are dropped (and counted) when the queue is full"""
+
+    def prepare(self, record):
+        # Resolve everything that can't cross threads; formatting happens in the listener
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with _dropped_lock:
+                _dropped['count'] += 1
+
+
+def dropped_records():
+    with _dropped_lock:
+        return _dropped['count']
+
+
+def _module_levels(spec):
+    levels = {}
+    for item in spec.split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging():
+    """Install the queue handler on the root logger and start the listener (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter())
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+    for name, level in _module_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    # Werkzeug logs every request line at INFO; the metrics cover that
+    logging.getLogger('werkzeug').setLevel(os.getenv('WERKZEUG_LOG_LEVEL', 'WARNING'))
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=False)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records (e.g. at exit)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,287 @@
+"""
+Instrumentation
+In-process counters and histograms exposed in the Prometheus text format
+at /metrics (only when METRICS_TOKEN is set; scrapers send it as a Bearer
+token):
+
+- HTTP request latency per blueprint / endpoint / method / status
+- SQL statements: latency histogram from the engine hooks in database.py,
+  plus per-route query counts and pool occupancy read at scrape time
+- LLM calls per provider / model / operation: count, latency, tokens,
+  time to first token for streamed calls,
+  plus gateway retries / failovers and circuit breaker state
+- Socket.IO events received and emitted, with handler latency
+- Log records dropped by the queued log handler
+
+Metrics live in process memory (one gunicorn worker per deployment), so a
+restart resets the counters, which Prometheus' rate() handles.
+"""
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+
+from utils.logging_setup import request_id_var, dropped_records
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *label_values, amount=1):
+        key = tuple(str(value) for value in label_values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=HTTP_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, *label_values):
+        key = tuple(str(label) for label in label_values)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._values.items())
+        for key, series in items:
+            for bound, count in zip(self.buckets + (float('inf'),), series[:len(self.buckets)] + [series[-2]]):
+                labels = _format_labels(self.labels, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {count}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {series[-2]}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {_format_value(series[-1])}')
+        return lines
+
+
+class Collector:
+    """Metric family computed at scrape time: fn() returns [(label values, value)]"""
+
+    def __init__(self, name, documentation, metric_type, labels, fn):
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self.labels = tuple(labels)
+        self.fn = fn
+        REGISTRY.append(self)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+        try:
+            samples = self.fn()
+        except Exception as e:
+            return lines + [f'# {self.name} unavailable: {_escape(e)}']
+        for label_values, value in samples:
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}')
+        return lines
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# HTTP
+HTTP_REQUEST_SECONDS = Histogram(
+    'bharatcraft_http_request_duration_seconds', 'HTTP request latency',
+    ('blueprint', 'endpoint', 'method', 'status')
+)
+
+# SQL
+SQL_QUERY_SECONDS = Histogram(
+    'bharatcraft_sql_query_duration_seconds', 'SQL statement latency', ('database',), SQL_BUCKETS
+)
+
+# LLM
+LLM_CALLS = Counter('bharatcraft_llm_calls_total', 'LLM API calls', ('provider', 'model', 'operation', 'outcome'))
+LLM_CALL_SECONDS = Histogram(
+    'bharatcraft_llm_call_duration_seconds', 'LLM API call latency', ('provider', 'model', 'operation'), LLM_BUCKETS
+)
+LLM_FIRST_TOKEN_SECONDS = Histogram(
+    'bharatcraft_llm_first_token_seconds', 'Time to the first streamed LLM token', ('provider', 'operation'), LLM_BUCKETS
+)
+LLM_TOKENS = Counter('bharatcraft_llm_tokens_total', 'LLM tokens consumed', ('provider', 'model', 'kind'))
+LLM_GATEWAY_EVENTS = Counter(
+    'bharatcraft_llm_gateway_events_total', 'LLM gateway retries, failovers, busy and open-circuit skips',
+    ('provider', 'event')
+)
+
+# Socket.IO
+SOCKETIO_EVENTS = Counter('bharatcraft_socketio_events_total', 'Socket.IO events', ('event', 'direction'))
+SOCKETIO_HANDLER_SECONDS = Histogram(
+    'bharatcraft_socketio_handler_duration_seconds', 'Socket.IO event handler latency', ('event',)
+)
+
+
+def observe_request(blueprint, endpoint, method, status, seconds):
+    HTTP_REQUEST_SECONDS.observe(seconds, blueprint or '', endpoint or '<unmatched>', method, status)
+
+
+class LLMCall:
+    """Handle yielded by track_llm_call; record() the provider response to count its tokens"""
+    __slots__ = ('response',)
+
+    def __init__(self):
+        self.response = None
+
+    def record(self, response):
+        self.response = response
+        return response
+
+
+def _token_usage(response):
+    """(prompt tokens, completion tokens) from a Gemini or OpenAI response, None if absent"""
+    usage = getattr(response, 'usage', None)  # OpenAI
+    if usage is not None:
+        return getattr(usage, 'prompt_tokens', 0) or 0, getattr(usage, 'completion_tokens', 0) or 0
+    usage = getattr(response, 'usage_metadata', None)  # Gemini
+    if usage is not None:
+        return getattr(usage, 'prompt_token_count', 0) or 0, getattr(usage, 'candidates_token_count', 0) or 0
+    return None
+
+
+@contextmanager
+def track_llm_call(provider, model, operation):
+    """Count and time one LLM API call; exceptions are counted as errors and re-raised"""
+    call = LLMCall()
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield call
+        outcome = 'ok'
+    finally:
+        LLM_CALLS.inc(provider, model, operation, outcome)
+        LLM_CALL_SECONDS.observe(time.perf_counter() - started, provider, model, operation)
+        usage = _token_usage(call.response) if call.response is not None else None
+        if usage:
+            LLM_TOKENS.inc(provider, model, 'prompt', amount=usage[0])
+            LLM_TOKENS.inc(provider, model, 'completion', amount=usage[1])
+
+
+def instrument_socketio(socketio):
+    """Count and time handlers registered through socketio.on, and count emits
+
+    Each handled event also gets its own request id for log correlation.
+    """
+    register = socketio.on
+    emit = socketio.emit
+
+    def on(event, *args, **kwargs):
+        decorator = register(event, *args, **kwargs)
+
+        def instrumented(handler):
+            @wraps(handler)
+            def wrapper(*handler_args, **handler_kwargs):
+                SOCKETIO_EVENTS.inc(event, 'in')
+                token = request_id_var.set(uuid.uuid4().hex[:16])
+                started = time.perf_counter()
+                try:
+                    return handler(*handler_args, **handler_kwargs)
+                finally:
+                    SOCKETIO_HANDLER_SECONDS.observe(time.perf_counter() - started, event)
+                    request_id_var.reset(token)
+            return decorator(wrapper)
+        return instrumented
+
+    def instrumented_emit(event, *args, **kwargs):
+        SOCKETIO_EVENTS.inc(event, 'out')
+        return emit(event, *args, **kwargs)
+
+    socketio.on = on
+    socketio.emit = instrumented_emit
+    return socketio
+
+
+def _route_db_samples(field):
+    from database import request_query_stats
+    return [((route['endpoint'],), route[field]) for route in request_query_stats()['routes']]
+
+
+def _pool_samples():
+    from database import pool_stats
+    pool = pool_stats()['pool']
+    # QueuePool reports overflow as negative until the pool is full
+    return [((state,), max(pool[state], 0)) for state in ('size', 'checked_out', 'idle', 'overflow') if state in pool]
+
+
+def _pool_counter_samples(field):
+    from database import pool_stats
+    return [((), pool_stats()['stats'][field])]
+
+
+def _llm_circuit_samples():
+    from utils.llm_gateway import GATEWAY
+    return [((name,), int(state['circuit'] == 'open')) for name, state in GATEWAY.stats().items()]
+
+
+Collector('bharatcraft_route_db_queries_total', 'SQL statements issued by requests per route', 'counter',
+          ('endpoint',), lambda: _route_db_samples('queries'))
+Collector('bharatcraft_route_db_seconds_total', 'Time spent in SQL by requests per route', 'counter',
+          ('endpoint',), lambda: _route_db_samples('db_seconds'))
+Collector('bharatcraft_db_pool_connections', 'Connection pool occupancy', 'gauge',
+          ('state',), _pool_samples)
+Collector('bharatcraft_db_pool_checkouts_total', 'Connection pool checkouts', 'counter',
+          (), lambda: _pool_counter_samples('checkouts'))
+Collector('bharatcraft_db_pool_wait_seconds_total', 'Time spent waiting for a pooled connection', 'counter',
+          (), lambda: _pool_counter_samples('wait_seconds_total'))
+Collector('bharatcraft_db_pool_timeouts_total', 'Connection checkouts that timed out', 'counter',
+          (), lambda: _pool_counter_samples('timeouts'))
+Collector('bharatcraft_llm_circuit_open', 'LLM provider circuit breaker open (1) or closed (0)', 'gauge',
+          ('provider',), _llm_circuit_samples)
+Collector('bharatcraft_log_records_dropped_total', 'Log records dropped because the log queue was full', 'counter',
+          (), lambda: [((), dropped_records())])
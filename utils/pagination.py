@@ -0,0 +1,42 @@
+"""
+Keyset (cursor) pagination helpers
+Cursors encode the (created_at, id) of the last row on a page so the next
+page can be fetched with an indexed range scan instead of OFFSET
+"""
+import base64
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(created_at, row_id):
+    """Encode the sort key of the last row on a page into an opaque cursor"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor
+
+    Returns:
+        (created_at, id) tuple
+
+    Raises:
+        ValueError if the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        created_at, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def parse_page_size(value):
+    """Clamp a requested page size to [1, MAX_PAGE_SIZE]"""
+    if not value:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(value), MAX_PAGE_SIZE))
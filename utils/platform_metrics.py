@@ -0,0 +1,281 @@
+"""
+Materialized Platform Metrics
+The platform totals shown on the homepage and dashboards are rows of the
+platform_metrics table instead of count()/sum() queries per page view.
+
+Every flush that adds, removes or changes an artisan, buyer, product or
+order applies the difference to the affected rows in the same transaction
+(UPDATE ... SET value = value + delta, so concurrent writers don't lose
+updates). The table is seeded at startup, and a recurring job recomputes
+everything from the source tables to correct drift from writes that bypass
+the ORM (bulk updates, manual SQL).
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from flask import jsonify, request
+from sqlalchemy import event, func, update, insert, inspect
+from sqlalchemy.orm import Session
+
+from models import ArtisanProfile, BuyerProfile, Product, Order, OrderStatus, PlatformMetric
+from utils.job_queue import register_handler
+
+logger = logging.getLogger(__name__)
+
+# Minutes between full recomputations of the metrics
+PLATFORM_METRICS_RECONCILE_MINUTES = int(os.getenv('PLATFORM_METRICS_RECONCILE_MINUTES', 60))
+
+# Seconds a process serves its in-memory snapshot before re-reading the table
+PLATFORM_METRICS_CACHE_SECONDS = float(os.getenv('PLATFORM_METRICS_CACHE_SECONDS', 10))
+
+# Cache-Control max-age for the public metric endpoints
+PLATFORM_METRICS_MAX_AGE = int(os.getenv('PLATFORM_METRICS_MAX_AGE', 30))
+
+HIGH_QUALITY_SCORE = 0.8
+
+FULFILLED_STATUSES = (OrderStatus.COMPLETED, OrderStatus.DELIVERED)
+
+METRICS = (
+    'artisans', 'buyers', 'products', 'products_available', 'products_high_quality',
+    'orders', 'revenue_completed', 'revenue_fulfilled', 'revenue_all', 'artisan_sales'
+)
+
+RECONCILE_PLATFORM_METRICS = 'reconcile_platform_metrics'
+
+
+def _artisan_contribution(values):
+    return {'artisans': 1, 'artisan_sales': values['total_sales'] or 0.0}
+
+
+def _buyer_contribution(values):
+    return {'buyers': 1}
+
+
+def _product_contribution(values):
+    return {
+        'products': 1,
+        'products_available': 0 if values['is_available'] is False else 1,
+        'products_high_quality': 1 if (values['ai_quality_score'] or 0) >= HIGH_QUALITY_SCORE else 0
+    }
+
+
+def _order_contribution(values):
+    amount = values['total_amount'] or 0.0
+    return {
+        'orders': 1,
+        'revenue_all': amount,
+        'revenue_completed': amount if values['status'] == OrderStatus.COMPLETED else 0.0,
+        'revenue_fulfilled': amount if values['status'] in FULFILLED_STATUSES else 0.0
+    }
+
+
+# model -> (attributes the metrics depend on, contribution of one row)
+TRACKED = {
+    ArtisanProfile: (('total_sales',), _artisan_contribution),
+    BuyerProfile: ((), _buyer_contribution),
+    Product: (('is_available', 'ai_quality_score'), _product_contribution),
+    Order: (('status', 'total_amount'), _order_contribution),
+}
+
+_snapshot = {'values': None, 'loaded_at': 0.0}
+_snapshot_lock = threading.Lock()
+
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+# Load the previous value of tracked attributes when they are set, even if it
+# was never loaded or has expired, so attribute history always holds it
+for _model, (_attributes, _) in TRACKED.items():
+    for _attribute in _attributes:
+        event.listen(getattr(_model, _attribute), 'set', _keep_old_value, active_history=True)
+
+
+def _values(obj, attributes, old=False):
+    state = inspect(obj)
+    values = {}
+    for attribute in attributes:
+        if old:
+            history = state.attrs[attribute].load_history()
+            if history.deleted:
+                values[attribute] = history.deleted[0]
+                continue
+        values[attribute] = getattr(obj, attribute)
+    return values
+
+
+def _add(deltas, contribution, sign):
+    for name, value in contribution.items():
+        deltas[name] = deltas.get(name, 0) + sign * value
+
+
+@event.listens_for(Session, 'before_flush')
+def _load_deleted_values(session, flush_context, instances):
+    # Rows being deleted can't be loaded once the flush has removed them
+    for obj in session.deleted:
+        if type(obj) in TRACKED:
+            for attribute in TRACKED[type(obj)][0]:
+                getattr(obj, attribute)
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_metric_deltas(session, flush_context):
+    deltas = {}
+    for obj in session.new:
+        if type(obj) in TRACKED:
+            attributes, contribution = TRACKED[type(obj)]
+            _add(deltas, contribution(_values(obj, attributes)), 1)
+    for obj in session.deleted:
+        if type(obj) in TRACKED:
+            attributes, contribution = TRACKED[type(obj)]
+            _add(deltas, contribution(_values(obj, attributes, old=True)), -1)
+    for obj in session.dirty:
+        if type(obj) in TRACKED and obj not in session.deleted:
+            attributes, contribution = TRACKED[type(obj)]
+            state = inspect(obj)
+            if any(state.attrs[attribute].history.has_changes() for attribute in attributes):
+                _add(deltas, contribution(_values(obj, attributes, old=True)), -1)
+                _add(deltas, contribution(_values(obj, attributes)), 1)
+
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    conn = session.connection()
+    now = datetime.utcnow()
+    for name, delta in deltas.items():
+        conn.execute(
+            update(PlatformMetric.__table__)
+            .where(PlatformMetric.__table__.c.name == name)
+            .values(value=PlatformMetric.__table__.c.value + delta, updated_at=now)
+        )
+    session.info['platform_metrics_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _expire_snapshot(session):
+    if session.info.pop('platform_metrics_changed', False):
+        _snapshot['loaded_at'] = 0.0
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_flag(session):
+    session.info.pop('platform_metrics_changed', None)
+
+
+def compute_metrics(session):
+    """All metrics from the source tables (the expensive path the table replaces)"""
+    revenue = lambda *conditions: session.query(func.coalesce(func.sum(Order.total_amount), 0.0)).filter(
+        *conditions
+    ).scalar()
+
+    return {
+        'artisans': session.query(func.count(ArtisanProfile.id)).scalar(),
+        'buyers': session.query(func.count(BuyerProfile.id)).scalar(),
+        'products': session.query(func.count(Product.id)).scalar(),
+        'products_available': session.query(func.count(Product.id)).filter(Product.is_available != False).scalar(),
+        'products_high_quality': session.query(func.count(Product.id)).filter(
+            Product.ai_quality_score >= HIGH_QUALITY_SCORE
+        ).scalar(),
+        'orders': session.query(func.count(Order.id)).scalar(),
+        'revenue_completed': revenue(Order.status == OrderStatus.COMPLETED),
+        'revenue_fulfilled': revenue(Order.status.in_(FULFILLED_STATUSES)),
+        'revenue_all': revenue(),
+        'artisan_sales': session.query(func.coalesce(func.sum(ArtisanProfile.total_sales), 0.0)).scalar()
+    }
+
+
+def reconcile_metrics(session):
+    """
+    Set every metric to its value freshly computed from the source tables
+
+    The metric rows are locked (touched by an UPDATE) before the source
+    tables are read, so a writer's delta either commits before the
+    recomputation sees its rows or waits and applies on top of the result.
+
+    Returns:
+        {metric: drift} for metrics whose stored value was off
+    """
+    table = PlatformMetric.__table__
+    now = datetime.utcnow()
+    session.execute(update(table).values(updated_at=now))
+    stored = dict(session.query(PlatformMetric.name, PlatformMetric.value).all())
+    computed = compute_metrics(session)
+
+    for name in METRICS:
+        if name in stored:
+            session.execute(
+                update(table).where(table.c.name == name).values(value=float(computed[name]), updated_at=now)
+            )
+    missing = [name for name in METRICS if name not in stored]
+    if missing:
+        session.execute(insert(table), [
+            {'name': name, 'value': float(computed[name]), 'updated_at': now} for name in missing
+        ])
+    session.commit()
+    _snapshot['loaded_at'] = 0.0
+
+    return {
+        name: round(computed[name] - stored[name], 2)
+        for name in METRICS
+        if name in stored and abs(computed[name] - stored[name]) > 1e-6
+    }
+
+
+def ensure_platform_metrics(session_factory):
+    """Seed the metrics table at startup when it is missing any metric"""
+    session = session_factory()
+    try:
+        stored = {name for (name,) in session.query(PlatformMetric.name)}
+        if any(name not in stored for name in METRICS):
+            reconcile_metrics(session)
+    except Exception as e:
+        session.rollback()
+        logger.warning("Could not seed platform metrics: %s", e)
+    finally:
+        session.close()
+
+
+def get_metrics(session):
+    """Current metrics from the in-process snapshot, refreshed from the table when stale"""
+    now = time.monotonic()
+    with _snapshot_lock:
+        if _snapshot['values'] is not None and now - _snapshot['loaded_at'] < PLATFORM_METRICS_CACHE_SECONDS:
+            return _snapshot['values']
+
+    values = dict(session.query(PlatformMetric.name, PlatformMetric.value).all())
+    if any(name not in values for name in METRICS):
+        # Not seeded yet (or a lagging replica): compute directly, never write here
+        values = {name: float(value) for name, value in compute_metrics(session).items()}
+
+    with _snapshot_lock:
+        _snapshot['values'] = values
+        _snapshot['loaded_at'] = now
+    return values
+
+
+def metrics_response(payload, public=True, max_age=PLATFORM_METRICS_MAX_AGE):
+    """JSON response with an ETag; answers 304 when the client already has this payload"""
+    body = json.dumps(payload, sort_keys=True, default=str)
+    response = jsonify(payload)
+    response.set_etag(hashlib.sha256(body.encode()).hexdigest()[:32])
+    if public:
+        response.cache_control.public = True
+    else:
+        response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
+
+
+@register_handler(RECONCILE_PLATFORM_METRICS, every=PLATFORM_METRICS_RECONCILE_MINUTES * 60)
+def run_reconcile_platform_metrics(session, job, payload):
+    drift = reconcile_metrics(session)
+    if drift:
+        logger.warning("Platform metrics drift corrected: %s", drift)
+    return {'drift': drift}
@@ -0,0 +1,72 @@
+"""
+AI Quality Assessment Jobs
+Runs assess_quality for uploaded product images through the background
+job queue and stores the score and grade on the product
+"""
+import logging
+import os
+
+from models import Product, QualityGrade, ImageFingerprint
+from utils.ai_service import assess_quality
+from utils.job_queue import register_handler, enqueue
+
+logger = logging.getLogger(__name__)
+
+QUALITY_ASSESSMENT = 'quality_assessment'
+
+
+def grade_for_score(score):
+    """Map an AI quality score (0.0 - 1.0) to a quality grade"""
+    if score >= 0.8:
+        return QualityGrade.PREMIUM
+    elif score < 0.5:
+        return QualityGrade.BASIC
+    return QualityGrade.STANDARD
+
+
+def enqueue_quality_assessment(session, product_id, image_path, cleanup=True, fingerprint_id=None):
+    """
+    Queue an assessment of image_path for a product
+
+    If cleanup is set the image is deleted once the job has finished,
+    for temporary downscaled copies made just for the AI check. The score
+    is also cached on the image fingerprint so re-uploads can reuse it.
+    """
+    return enqueue(session, QUALITY_ASSESSMENT, {
+        'image_path': image_path,
+        'cleanup': cleanup,
+        'fingerprint_id': fingerprint_id
+    }, product_id=product_id)
+
+
+@register_handler(QUALITY_ASSESSMENT)
+def run_quality_assessment(session, job, payload):
+    image_path = payload['image_path']
+    
+    if not os.path.exists(image_path):
+        # Nothing to retry - the upload is gone
+        return {'skipped': 'image not found'}
+    
+    ai_score = assess_quality(image_path)
+    quality_grade = grade_for_score(ai_score)
+    
+    product = session.query(Product).filter_by(id=job.product_id).first()
+    if product:
+        product.ai_quality_score = ai_score
+        product.quality_grade = quality_grade
+    
+    if payload.get('fingerprint_id'):
+        fingerprint = session.query(ImageFingerprint).filter_by(id=payload['fingerprint_id']).first()
+        if fingerprint:
+            fingerprint.ai_quality_score = ai_score
+    
+    # Commit before deleting the image, so a failed commit can still be retried
+    session.commit()
+    if payload.get('cleanup'):
+        try:
+            os.remove(image_path)
+        except OSError:
+            pass
+    
+    logger.info("Background AI update for product %s: score %s", job.product_id, ai_score)
+    return {'ai_quality_score': ai_score, 'quality_grade': quality_grade.value}
@@ -0,0 +1,399 @@
+"""
+Recommendation Engine
+Item-item collaborative filtering computed offline by a recurring
+background job:
+
+- co-purchase similarity: cosine over the sparse buyer x product purchase
+  matrix, i.e. buyers(p & q) / sqrt(buyers(p) * buyers(q))
+- craft similarity: products of the same craft type closest in price
+
+The top neighbours of every product go to product_neighbors and each
+buyer's top-N to buyer_recommendations, so serving a buyer is one query.
+Refreshes are incremental: the purchase graph stays in memory and only
+takes in the order items/products added and orders cancelled since the
+previous refresh, and only the products and buyers they touch are
+recomputed. A full rebuild every RECOMMENDATION_FULL_REBUILD_HOURS reloads
+the graph, which also picks up price/availability edits and orders that
+were un-cancelled.
+Only the most recent RECOMMENDATION_BUILDS_KEPT build rows are kept.
+"""
+import math
+import os
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import joinedload
+
+from models import (
+    Product, ArtisanProfile, Order, OrderItem, OrderStatus, QualityGrade,
+    ProductNeighbor, BuyerRecommendation, RecommendationBuild
+)
+from utils.job_queue import register_handler
+
+# Minutes between refreshes of the neighbour/recommendation tables
+RECOMMENDATION_REFRESH_MINUTES = int(os.getenv('RECOMMENDATION_REFRESH_MINUTES', 15))
+
+RECOMMENDATION_FULL_REBUILD_HOURS = int(os.getenv('RECOMMENDATION_FULL_REBUILD_HOURS', 24))
+
+RECOMMENDATION_BUILDS_KEPT = int(os.getenv('RECOMMENDATION_BUILDS_KEPT', 100))
+
+# Orders updated this long before the previous build are re-checked for cancellation
+STATUS_OVERLAP = timedelta(minutes=5)
+
+NEIGHBORS_PER_PRODUCT = 20
+CRAFT_NEIGHBORS = 10
+RECOMMENDATIONS_PER_BUYER = 24
+
+# Relative weight of craft-type similarity vs co-purchase similarity
+CRAFT_WEIGHT = 0.3
+
+# Ids per IN (...) clause when rewriting table slices
+CHUNK_SIZE = 500
+
+REFRESH_RECOMMENDATIONS = 'refresh_recommendations'
+
+QUALITY_ORDER = {QualityGrade.PREMIUM: 2, QualityGrade.STANDARD: 1, QualityGrade.BASIC: 0}
+
+
+class PurchaseGraph:
+    """
+    Sparse buyer <-> product purchase sets plus the catalog facts similarity needs
+
+    Kept in memory by the refreshing process and brought up to date with
+    sync(), which applies only the order items and products added, and the
+    orders cancelled, since the previous sync.
+    """
+
+    def __init__(self, session):
+        self.pair_counts = Counter()  # (buyer_id, product_id) -> order items in live orders
+        self.buyer_items = defaultdict(set)
+        self.item_buyers = defaultdict(set)
+        self.products = {}
+        self.craft_groups = {}
+        self.craft_position = {}
+        self.last_order_item_id = 0
+        self.last_product_id = 0
+        self.synced_at = None
+        self.cancelled_seen = {}  # order id -> when its items were left out or removed
+        self.sync(session)
+
+    def _add_purchase(self, buyer_id, product_id, delta):
+        key = (buyer_id, product_id)
+        count = self.pair_counts[key] + delta
+        if count > 0:
+            self.pair_counts[key] = count
+            self.buyer_items[buyer_id].add(product_id)
+            self.item_buyers[product_id].add(buyer_id)
+            return
+        del self.pair_counts[key]
+        self.buyer_items[buyer_id].discard(product_id)
+        self.item_buyers[product_id].discard(buyer_id)
+
+    def sync(self, session):
+        """Apply purchases, cancellations and products added since the previous sync"""
+        now = datetime.utcnow()
+
+        items = session.query(
+            OrderItem.id, OrderItem.order_id, Order.buyer_id, OrderItem.product_id, Order.status
+        ).join(Order, OrderItem.order_id == Order.id).filter(OrderItem.id > self.last_order_item_id).all()
+        for item_id, order_id, buyer_id, product_id, status in items:
+            self.last_order_item_id = max(self.last_order_item_id, item_id)
+            if status == OrderStatus.CANCELLED:
+                self.cancelled_seen[order_id] = now
+            else:
+                self._add_purchase(buyer_id, product_id, 1)
+
+        # Negative deltas: take out the items of orders cancelled since the previous sync
+        if self.synced_at is not None:
+            cancelled = [order_id for (order_id,) in session.query(Order.id).filter(
+                Order.updated_at > self.synced_at - STATUS_OVERLAP,
+                Order.status == OrderStatus.CANCELLED
+            ) if order_id not in self.cancelled_seen]
+            for chunk in _chunks(cancelled):
+                for buyer_id, product_id in session.query(Order.buyer_id, OrderItem.product_id).join(
+                    OrderItem, OrderItem.order_id == Order.id
+                ).filter(Order.id.in_(chunk), OrderItem.id <= self.last_order_item_id):
+                    self._add_purchase(buyer_id, product_id, -1)
+            for order_id in cancelled:
+                self.cancelled_seen[order_id] = now
+        self.cancelled_seen = {order_id: seen for order_id, seen in self.cancelled_seen.items()
+                               if now - seen <= 2 * STATUS_OVERLAP}
+
+        changed_crafts = set()
+        for row in session.query(
+            Product.id, Product.craft_type, Product.price, Product.is_available, Product.quality_grade
+        ).filter(Product.id > self.last_product_id).all():
+            self.products[row.id] = row
+            self.last_product_id = max(self.last_product_id, row.id)
+            if row.is_available and row.craft_type:
+                craft = row.craft_type.strip().lower()
+                self.craft_groups.setdefault(craft, []).append(row)
+                changed_crafts.add(craft)
+
+        # Each craft group sorted by price so price-nearest products are adjacent
+        for craft in changed_crafts:
+            rows = self.craft_groups[craft]
+            rows.sort(key=lambda r: (r.price or 0, r.id))
+            for position, row in enumerate(rows):
+                self.craft_position[row.id] = (craft, position)
+
+        self.synced_at = now
+
+    def craft_of(self, product_id):
+        product = self.products.get(product_id)
+        return product.craft_type.strip().lower() if product and product.craft_type else None
+
+    def neighbors(self, product_id):
+        """
+        Top neighbours of a product
+
+        Returns:
+            list of (neighbor_id, score, co_purchases), best first
+        """
+        scores = defaultdict(float)
+        co_counts = Counter()
+
+        buyers = self.item_buyers.get(product_id, ())
+        for buyer_id in buyers:
+            co_counts.update(self.buyer_items[buyer_id])
+        co_counts.pop(product_id, None)
+
+        for other_id, count in co_counts.items():
+            scores[other_id] += count / math.sqrt(len(buyers) * len(self.item_buyers[other_id]))
+
+        if product_id in self.craft_position:
+            craft, position = self.craft_position[product_id]
+            group = self.craft_groups[craft]
+            price = group[position].price or 0
+            window = group[max(position - CRAFT_NEIGHBORS, 0):position + CRAFT_NEIGHBORS + 1]
+            for other in window:
+                if other.id != product_id:
+                    scores[other.id] += CRAFT_WEIGHT * _price_closeness(price, other.price or 0)
+
+        ranked = sorted(
+            (other_id for other_id in scores
+             if other_id in self.products and self.products[other_id].is_available),
+            key=lambda other_id: (-scores[other_id], other_id)
+        )
+        return [(other_id, scores[other_id], co_counts.get(other_id, 0))
+                for other_id in ranked[:NEIGHBORS_PER_PRODUCT]]
+
+    def popular(self):
+        """Available products ranked by distinct buyers, then quality, then newest"""
+        available = [row for row in self.products.values() if row.is_available]
+        available.sort(key=lambda row: (
+            -len(self.item_buyers.get(row.id, ())),
+            -QUALITY_ORDER.get(row.quality_grade, 1),
+            -row.id
+        ))
+        return [(row.id, float(len(self.item_buyers.get(row.id, ()))))
+                for row in available[:RECOMMENDATIONS_PER_BUYER]]
+
+
+def _price_closeness(a, b):
+    if a <= 0 or b <= 0:
+        return 0.5
+    return 1.0 / (1.0 + abs(math.log(a / b)))
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def recommend_for_items(neighbor_lists, owned):
+    """Sum neighbour scores over a buyer's purchases, excluding what they already own"""
+    scores = defaultdict(float)
+    for product_id in owned:
+        for other_id, score, _ in neighbor_lists.get(product_id, ()):
+            if other_id not in owned:
+                scores[other_id] += score
+    ranked = sorted(scores, key=lambda other_id: (-scores[other_id], other_id))
+    return [(other_id, scores[other_id]) for other_id in ranked[:RECOMMENDATIONS_PER_BUYER]]
+
+
+_graph = None
+
+
+def _purchase_graph(session, full):
+    """The in-memory purchase graph: rebuilt from scratch on full refreshes, synced otherwise"""
+    global _graph
+    if full or _graph is None:
+        _graph = None
+        _graph = PurchaseGraph(session)
+        return _graph
+    try:
+        _graph.sync(session)
+    except Exception:
+        _graph = None  # possibly half-applied; reload on the next refresh
+        raise
+    return _graph
+
+
+def refresh_recommendations(session, full=False):
+    """
+    Bring product_neighbors and buyer_recommendations up to date
+
+    Returns:
+        summary dict (also recorded as a RecommendationBuild row)
+    """
+    last = session.query(RecommendationBuild).order_by(RecommendationBuild.id.desc()).first()
+    last_full = session.query(func.max(RecommendationBuild.created_at)).filter(
+        RecommendationBuild.full_rebuild == True
+    ).scalar()
+    if last is None or last_full is None or \
+            datetime.utcnow() - last_full > timedelta(hours=RECOMMENDATION_FULL_REBUILD_HOURS):
+        full = True
+
+    max_item_id = session.query(func.max(OrderItem.id)).scalar() or 0
+    max_product_id = session.query(func.max(Product.id)).scalar() or 0
+
+    # Cancellations take purchases out of the graph (negative deltas)
+    cancelled = []
+    if not full:
+        cancelled = session.query(Order.id, Order.buyer_id).filter(
+            Order.updated_at > last.created_at - STATUS_OVERLAP,
+            Order.status == OrderStatus.CANCELLED
+        ).all()
+
+    if not full and not cancelled and \
+            (max_item_id, max_product_id) == (last.last_order_item_id, last.last_product_id):
+        return {'skipped': 'no new orders or products'}
+
+    graph = _purchase_graph(session, full)
+
+    if full:
+        dirty_products = set(graph.products)
+        dirty_buyers = set(graph.buyer_items)
+    else:
+        new_buyers = {buyer_id for (buyer_id,) in session.query(Order.buyer_id).join(
+            OrderItem, OrderItem.order_id == Order.id
+        ).filter(OrderItem.id > last.last_order_item_id).distinct()}
+
+        # New purchases change the co-purchase rows of everything those buyers own;
+        # new products change the craft neighbours of their craft group
+        dirty_products = set()
+        for buyer_id in new_buyers:
+            dirty_products |= graph.buyer_items.get(buyer_id, set())
+        new_crafts = {graph.craft_of(product_id) for product_id in graph.products
+                      if product_id > last.last_product_id}
+        dirty_products |= {row.id for craft in new_crafts if craft
+                           for row in graph.craft_groups.get(craft, ())}
+
+        # A cancelled order changes the rows of its products and of everything its buyer still owns
+        if cancelled:
+            for chunk in _chunks({order_id for order_id, _ in cancelled}):
+                dirty_products |= {product_id for (product_id,) in session.query(OrderItem.product_id).filter(
+                    OrderItem.order_id.in_(chunk)
+                )}
+        cancelled_buyers = {buyer_id for _, buyer_id in cancelled}
+        for buyer_id in cancelled_buyers:
+            dirty_products |= graph.buyer_items.get(buyer_id, set())
+
+        dirty_buyers = new_buyers | cancelled_buyers
+        for product_id in dirty_products:
+            dirty_buyers |= graph.item_buyers.get(product_id, set())
+
+    # Buyers' recommendations need the neighbours of everything they own
+    for buyer_id in dirty_buyers:
+        dirty_products |= graph.buyer_items[buyer_id]
+
+    neighbor_lists = {product_id: graph.neighbors(product_id) for product_id in dirty_products}
+
+    if full:
+        session.query(ProductNeighbor).delete(synchronize_session=False)
+        session.query(BuyerRecommendation).delete(synchronize_session=False)
+    else:
+        for chunk in _chunks(dirty_products):
+            session.query(ProductNeighbor).filter(
+                ProductNeighbor.product_id.in_(chunk)
+            ).delete(synchronize_session=False)
+        for chunk in _chunks(dirty_buyers):
+            session.query(BuyerRecommendation).filter(
+                BuyerRecommendation.buyer_id.in_(chunk)
+            ).delete(synchronize_session=False)
+        session.query(BuyerRecommendation).filter(
+            BuyerRecommendation.buyer_id == None
+        ).delete(synchronize_session=False)
+
+    neighbor_rows = [
+        {'product_id': product_id, 'neighbor_id': other_id, 'score': score, 'co_purchases': co_purchases}
+        for product_id, neighbors in neighbor_lists.items()
+        for other_id, score, co_purchases in neighbors
+    ]
+    if neighbor_rows:
+        session.execute(insert(ProductNeighbor), neighbor_rows)
+
+    now = datetime.utcnow()
+    recommendation_rows = []
+    for buyer_id in dirty_buyers:
+        ranked = recommend_for_items(neighbor_lists, graph.buyer_items[buyer_id])
+        recommendation_rows.extend(
+            {'buyer_id': buyer_id, 'product_id': product_id, 'score': score, 'rank': rank, 'updated_at': now}
+            for rank, (product_id, score) in enumerate(ranked)
+        )
+    recommendation_rows.extend(
+        {'buyer_id': None, 'product_id': product_id, 'score': score, 'rank': rank, 'updated_at': now}
+        for rank, (product_id, score) in enumerate(graph.popular())
+    )
+    if recommendation_rows:
+        session.execute(insert(BuyerRecommendation), recommendation_rows)
+
+    build = RecommendationBuild(
+        full_rebuild=full,
+        last_order_item_id=max_item_id,
+        last_product_id=max_product_id,
+        products_updated=len(neighbor_lists),
+        buyers_updated=len(dirty_buyers)
+    )
+    session.add(build)
+    session.flush()
+
+    # Prune old builds, keeping the latest full one (it drives the full-rebuild clock)
+    last_full_id = session.query(func.max(RecommendationBuild.id)).filter(
+        RecommendationBuild.full_rebuild == True
+    ).scalar()
+    session.query(RecommendationBuild).filter(
+        RecommendationBuild.id <= build.id - RECOMMENDATION_BUILDS_KEPT,
+        RecommendationBuild.id != last_full_id
+    ).delete(synchronize_session=False)
+    session.commit()
+
+    return {
+        'full_rebuild': full,
+        'products_updated': build.products_updated,
+        'buyers_updated': build.buyers_updated
+    }
+
+
+def recommendations_query(session, owner_id, limit=8):
+    """Stored recommendation rows of a buyer (None: the popular list), best first"""
+    return session.query(Product, BuyerRecommendation.score).join(
+        BuyerRecommendation, BuyerRecommendation.product_id == Product.id
+    ).options(
+        joinedload(Product.artisan).joinedload(ArtisanProfile.user)
+    ).filter(
+        BuyerRecommendation.buyer_id == owner_id if owner_id is not None else BuyerRecommendation.buyer_id == None,
+        Product.is_available == True
+    ).order_by(BuyerRecommendation.rank).limit(limit)
+
+
+def get_recommendations_for_buyer(session, buyer_id, limit=8):
+    """
+    Precomputed recommendations for a buyer, falling back to the popular list
+
+    Returns:
+        (list of (Product, score), personalized)
+    """
+    if buyer_id is not None:
+        rows = recommendations_query(session, buyer_id, limit).all()
+        if rows:
+            return rows, True
+    return recommendations_query(session, None, limit).all(), False
+
+
+@register_handler(REFRESH_RECOMMENDATIONS, every=RECOMMENDATION_REFRESH_MINUTES * 60)
+def run_refresh_recommendations(session, job, payload):
+    return refresh_recommendations(session, full=payload.get('full', False))
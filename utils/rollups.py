@@ -0,0 +1,45 @@
+"""
+Rollup Table Helpers
+Counter upserts for the pre-aggregated statistics tables: one statement
+that inserts the bucket row or adds to it, using ON CONFLICT on SQLite and
+Postgres and an update-then-insert fallback elsewhere.
+"""
+from sqlalchemy import insert, update, and_
+from sqlalchemy.dialects import postgresql, sqlite
+
+UPSERT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert
+}
+
+
+def increment(conn, table, keys, increments):
+    """
+    Add increments to the row identified by keys, creating it if needed
+
+    Args:
+        conn: Connection to execute on
+        table: Table with a unique constraint over the key columns
+        keys: {key column: value} identifying the bucket
+        increments: {counter column: amount to add}
+    """
+    increments = {column: amount for column, amount in increments.items() if amount}
+    if not increments:
+        return
+
+    insert_fn = UPSERT_INSERTS.get(conn.dialect.name)
+    if insert_fn is not None:
+        statement = insert_fn(table).values(**keys, **increments)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={column: table.c[column] + statement.excluded[column] for column in increments}
+        )
+        conn.execute(statement)
+        return
+
+    match = and_(*[table.c[column] == value for column, value in keys.items()])
+    updated = conn.execute(
+        update(table).where(match).values({column: table.c[column] + amount for column, amount in increments.items()})
+    ).rowcount
+    if not updated:
+        conn.execute(insert(table).values(**keys, **increments))
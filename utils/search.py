@@ -0,0 +1,350 @@
+"""
+Product Search Index
+Full-text search over title, description, craft type and GI tag with facet
+counts, without loading the catalog into the app.
+
+Product text is mirrored into product_search_documents by a session
+after_flush hook on every product create/update/delete, together with
+multilingual terms (Latin transliteration now, translations from a
+background job - see utils/search_terms.py) so queries in any supported
+language or script match without translating the query. The index on top
+of it depends on the database:
+
+- SQLite: FTS5 external-content table kept current by triggers, ranked by bm25
+- Postgres: generated tsvector column with a GIN index, ranked by ts_rank_cd
+- anything else (or SQLite built without FTS5): LIKE matching, newest first
+"""
+import logging
+
+from sqlalchemy import (
+    event, func, case, and_, or_, select, literal, literal_column, text, delete, insert, inspect, Float, Integer
+)
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from models import Product, ProductSearchDocument, QualityGrade
+from utils.search_terms import (
+    TOKEN_PATTERN, SEARCH_TRANSLATION_LANGUAGES, transliterate, transliteration_terms, enqueue_search_translations
+)
+
+logger = logging.getLogger(__name__)
+
+# Product columns mirrored into the search document
+INDEXED_FIELDS = ('title', 'description', 'craft_type', 'gi_tag')
+
+# Multilingual columns of the search document
+TERM_FIELDS = ('transliteration', 'translations')
+
+DOCUMENT_FIELDS = INDEXED_FIELDS + TERM_FIELDS
+
+# bm25 column weights, in DOCUMENT_FIELDS order
+FTS_WEIGHTS = (10.0, 1.0, 5.0, 5.0, 4.0, 3.0)
+
+MAX_QUERY_TOKENS = 8
+
+# (label, lower bound inclusive, upper bound exclusive) in INR
+PRICE_BUCKETS = (
+    ('0-500', 0, 500),
+    ('500-1000', 500, 1000),
+    ('1000-2500', 1000, 2500),
+    ('2500-5000', 2500, 5000),
+    ('5000+', 5000, None),
+)
+
+FTS_TABLE = 'product_search_fts'
+FTS_TRIGGERS = ('product_search_ai', 'product_search_ad', 'product_search_au')
+
+_columns = ', '.join(DOCUMENT_FIELDS)
+_new_values = ', '.join(f'new.{field}' for field in DOCUMENT_FIELDS)
+_old_values = ', '.join(f'old.{field}' for field in DOCUMENT_FIELDS)
+
+SQLITE_FTS_DDL = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {_columns},
+        content='product_search_documents', content_rowid='product_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_search_ai AFTER INSERT ON product_search_documents BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.product_id, {_new_values});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_search_ad AFTER DELETE ON product_search_documents BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.product_id, {_old_values});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_search_au AFTER UPDATE ON product_search_documents BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.product_id, {_old_values});
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.product_id, {_new_values});
+    END""",
+)
+
+POSTGRES_DDL = (
+    """ALTER TABLE product_search_documents ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(craft_type, '') || ' ' || coalesce(gi_tag, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(transliteration, '') || ' ' || coalesce(translations, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(description, '')), 'C')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_product_search_vector ON product_search_documents USING GIN (search_vector)",
+)
+
+# Dialect name -> 'fts5' | 'tsvector' | 'like'; keyed by dialect rather than
+# URL so read replicas (which carry the primary's schema) use the same index
+_backends = {}
+
+
+def _migrate_documents(conn):
+    """
+    Add document columns introduced after the table was created
+
+    Returns:
+        True if columns were added, so derived index structures must be rebuilt
+    """
+    existing = {column['name'] for column in inspect(conn).get_columns('product_search_documents')}
+    missing = [field for field in TERM_FIELDS if field not in existing]
+    for field in missing:
+        conn.exec_driver_sql(f"ALTER TABLE product_search_documents ADD COLUMN {field} TEXT")
+    return bool(missing)
+
+
+def ensure_search_index(engine):
+    """Create the dialect-specific index and backfill documents for existing products"""
+    backend = 'like'
+    try:
+        with engine.begin() as conn:
+            migrated = _migrate_documents(conn)
+
+            if engine.dialect.name == 'sqlite':
+                if migrated:
+                    conn.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+                    for trigger in FTS_TRIGGERS:
+                        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+                existed = conn.exec_driver_sql(
+                    f"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '{FTS_TABLE}'"
+                ).first()
+                for statement in SQLITE_FTS_DDL:
+                    conn.exec_driver_sql(statement)
+                if not existed:
+                    # Index documents mirrored before the FTS table existed
+                    conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+                backend = 'fts5'
+
+            elif engine.dialect.name == 'postgresql':
+                if migrated:
+                    conn.exec_driver_sql("ALTER TABLE product_search_documents DROP COLUMN IF EXISTS search_vector")
+                for statement in POSTGRES_DDL:
+                    conn.exec_driver_sql(statement)
+                backend = 'tsvector'
+    except OperationalError as e:
+        logger.warning("Full-text search unavailable, falling back to LIKE matching: %s", e)
+
+    _backends[engine.dialect.name] = backend
+
+    with engine.begin() as conn:
+        added = sync_search_documents(conn)
+        if added:
+            logger.info("Search index: mirrored %s products (%s)", added, backend)
+
+    return backend
+
+
+def search_backend(session):
+    bind = session.get_bind()
+    return _backends.get(bind.dialect.name, 'like')
+
+
+def document_row(product):
+    row = {'product_id': product.id}
+    row.update({field: getattr(product, field) for field in INDEXED_FIELDS})
+    row['transliteration'] = transliteration_terms(product) or None
+    row['translations'] = None  # filled in by the search_translations job
+    return row
+
+
+def sync_search_documents(conn):
+    """
+    Mirror products that have no search document yet and drop orphaned documents
+
+    Existing documents (and their translations) are left alone.
+
+    Returns:
+        number of documents added
+    """
+    table = ProductSearchDocument.__table__
+    conn.execute(delete(table).where(table.c.product_id.not_in(select(Product.id))))
+
+    missing = conn.execute(
+        select(Product.id, *[getattr(Product, field) for field in INDEXED_FIELDS])
+        .where(Product.id.not_in(select(table.c.product_id)))
+    ).all()
+    if missing:
+        conn.execute(insert(table), [document_row(row) for row in missing])
+    return len(missing)
+
+
+def _text_changed(product):
+    state = inspect(product)
+    return any(state.attrs[field].history.has_changes() for field in INDEXED_FIELDS)
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_search_documents(session, flush_context):
+    changed = [obj for obj in session.new if isinstance(obj, Product)]
+    changed += [obj for obj in session.dirty if isinstance(obj, Product) and _text_changed(obj)]
+    removed = [obj.id for obj in session.deleted if isinstance(obj, Product)]
+    if not changed and not removed:
+        return
+
+    table = ProductSearchDocument.__table__
+    conn = session.connection()
+    conn.execute(delete(table).where(table.c.product_id.in_([p.id for p in changed] + removed)))
+    if changed:
+        conn.execute(insert(table), [document_row(p) for p in changed])
+        if SEARCH_TRANSLATION_LANGUAGES:
+            session.info.setdefault('search_translations', set()).update(p.id for p in changed)
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _queue_search_translations(session, flush_context):
+    # Jobs added here are flushed by the same commit
+    for product_id in session.info.pop('search_translations', ()):
+        enqueue_search_translations(session, product_id)
+
+
+def query_tokens(query_text):
+    """
+    Query words, each with its alternatives
+
+    Returns:
+        list of tuples; a product must match one alternative of every tuple
+        (the word itself, plus its Latin transliteration for Indic script)
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall((query_text or '').lower())[:MAX_QUERY_TOKENS]:
+        alternatives = dict.fromkeys([token, transliterate(token)])
+        tokens.append(tuple(alternative for alternative in alternatives if alternative))
+    return tokens
+
+
+def _match_subquery(session, tokens):
+    """(product_id, score) rows matching every token, higher score = better"""
+    backend = search_backend(session)
+
+    if backend == 'fts5':
+        # Quoted prefix terms: user input can't inject FTS5 operators
+        match = ' AND '.join(
+            '(' + ' OR '.join(f'"{alternative}"*' for alternative in alternatives) + ')'
+            for alternatives in tokens
+        )
+        weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+        return text(
+            f"SELECT rowid AS product_id, -bm25({FTS_TABLE}, {weights}) AS score "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+        ).bindparams(match=match).columns(product_id=Integer, score=Float).subquery('matches')
+
+    doc = ProductSearchDocument
+    if backend == 'tsvector':
+        ts_query = func.to_tsquery('simple', ' & '.join(
+            '(' + ' | '.join(f'{alternative}:*' for alternative in alternatives) + ')'
+            for alternatives in tokens
+        ))
+        vector = literal_column('product_search_documents.search_vector')
+        return select(
+            doc.product_id.label('product_id'),
+            func.ts_rank_cd(vector, ts_query).label('score')
+        ).where(vector.op('@@')(ts_query)).subquery('matches')
+
+    conditions = [
+        or_(*[getattr(doc, field).ilike(f'%{alternative}%')
+              for field in DOCUMENT_FIELDS for alternative in alternatives])
+        for alternatives in tokens
+    ]
+    return select(
+        doc.product_id.label('product_id'),
+        literal(1.0).label('score')
+    ).where(and_(*conditions)).subquery('matches')
+
+
+# Facet -> the filters it sets; a facet is counted with every filter except
+# its own (disjunctive faceting), so picking one value keeps the others visible
+FACET_FILTERS = {
+    'craft_type': ('craft_type',),
+    'quality_grade': ('quality_grade',),
+    'gi_tag': ('gi_tag',),
+    'price': ('price_bucket', 'min_price', 'max_price'),
+}
+
+
+def price_bucket_column():
+    """Price facet label of a product; buckets are ascending so the first match wins"""
+    whens = []
+    for label, lower, upper in PRICE_BUCKETS:
+        whens.append((Product.price >= lower if upper is None else Product.price < upper, label))
+    return case(*whens)
+
+
+def apply_filters(query, filters):
+    """Structured filters shared by results and facets"""
+    if filters.get('craft_type'):
+        query = query.filter(Product.craft_type == filters['craft_type'])
+    if filters.get('quality_grade'):
+        query = query.filter(Product.quality_grade == filters['quality_grade'])
+    if filters.get('gi_tag'):
+        query = query.filter(Product.gi_tag == filters['gi_tag'])
+    if filters.get('min_price') is not None:
+        query = query.filter(Product.price >= filters['min_price'])
+    if filters.get('max_price') is not None:
+        query = query.filter(Product.price <= filters['max_price'])
+    if filters.get('price_bucket'):
+        query = query.filter(price_bucket_column() == filters['price_bucket'])
+    return query
+
+
+def search_products(session, query_text, filters=None, limit=24, offset=0, options=()):
+    """
+    Ranked search with facets
+
+    Returns:
+        dict with products (list of Product), total and facets
+        ({craft_type|quality_grade|gi_tag|price: [{value, count}]});
+        each facet's counts ignore that facet's own filter
+    """
+    filters = filters or {}
+    tokens = query_tokens(query_text)
+
+    matched = session.query(Product).filter(Product.is_available == True)
+    if tokens:
+        matches = _match_subquery(session, tokens)
+        matched = matched.join(matches, matches.c.product_id == Product.id)
+        order = (matches.c.score.desc(), Product.id.desc())
+    else:
+        order = (Product.created_at.desc(), Product.id.desc())
+
+    base = apply_filters(matched, filters)
+
+    total = base.count()
+    products = base.options(*options).order_by(*order).limit(limit).offset(offset).all()
+
+    facets = {}
+    for name, column in (
+        ('craft_type', Product.craft_type),
+        ('quality_grade', Product.quality_grade),
+        ('gi_tag', Product.gi_tag),
+        ('price', price_bucket_column())
+    ):
+        facet_query = apply_filters(matched, {
+            key: value for key, value in filters.items() if key not in FACET_FILTERS[name]
+        })
+        rows = facet_query.with_entities(column.label('value'), func.count(Product.id)).group_by(column).all()
+        values = [
+            {'value': value.value if isinstance(value, QualityGrade) else value, 'count': count}
+            for value, count in rows if value is not None
+        ]
+        if name == 'price':
+            order_of = {label: i for i, (label, _, _) in enumerate(PRICE_BUCKETS)}
+            values.sort(key=lambda v: order_of[v['value']])
+        else:
+            values.sort(key=lambda v: (-v['count'], str(v['value'])))
+        facets[name] = values
+
+    return {'products': products, 'total': total, 'facets': facets}
+
@@ -0,0 +1,219 @@
+"""
+Multilingual Search Terms
+Extra index text so buyers and artisans find each other's listings
+across languages without translating queries:
+
+- transliteration: Latin rendering of Indic-script text (so "banarsi"
+  finds बनारसी), computed locally whenever product text changes
+- translations: title/craft/description translated into
+  SEARCH_TRANSLATION_LANGUAGES once at listing time by a background job
+  through translate_batch (and therefore the translation cache)
+
+Both are stored as normalized, de-duplicated tokens on the product's
+search document; see utils/search.py.
+"""
+import os
+import re
+import unicodedata
+
+from models import Product, ProductSearchDocument
+from utils.job_queue import register_handler, enqueue
+from utils.translation_service import translate_batch, ALL_LANGUAGES
+
+# Languages every listing is translated into for search
+SEARCH_TRANSLATION_LANGUAGES = [
+    code.strip() for code in os.getenv('SEARCH_TRANSLATION_LANGUAGES', 'en,hi,de,fr,es').split(',')
+    if code.strip() in ALL_LANGUAGES
+]
+
+# Only the start of long descriptions is worth translating for search
+DESCRIPTION_CHARS = 300
+
+SEARCH_TRANSLATIONS = 'search_translations'
+
+# Word characters plus the Indic range: \w alone splits words at vowel signs
+TOKEN_PATTERN = re.compile(r'[\w\u0900-\u0D7F]+')
+
+# Unicode Indic blocks share one layout (ISCII order), so a single offset
+# table covers Devanagari through Malayalam
+INDIC_FIRST, INDIC_LAST = 0x0900, 0x0D7F
+
+SCRIPT_LANGUAGES = {
+    0x0900: 'hi', 0x0980: 'bn', 0x0A00: 'pa', 0x0A80: 'gu', 0x0B00: 'od',
+    0x0B80: 'ta', 0x0C00: 'te', 0x0C80: 'kn', 0x0D00: 'ml'
+}
+
+# Indo-Aryan scripts drop the inherent vowel in speech (कलमकारी -> kalamkari)
+SCHWA_DELETING_SCRIPTS = {0x0900, 0x0980, 0x0A00, 0x0A80}
+
+# Buyers don't type diacritics, so long/short vowels collapse
+INDEPENDENT_VOWELS = {
+    0x05: 'a', 0x06: 'a', 0x07: 'i', 0x08: 'i', 0x09: 'u', 0x0A: 'u', 0x0B: 'ri', 0x0C: 'li',
+    0x0D: 'e', 0x0E: 'e', 0x0F: 'e', 0x10: 'ai', 0x11: 'o', 0x12: 'o', 0x13: 'o', 0x14: 'au',
+    0x60: 'ri', 0x61: 'li'
+}
+
+CONSONANTS = {
+    0x15: 'k', 0x16: 'kh', 0x17: 'g', 0x18: 'gh', 0x19: 'n',
+    0x1A: 'ch', 0x1B: 'chh', 0x1C: 'j', 0x1D: 'jh', 0x1E: 'n',
+    0x1F: 't', 0x20: 'th', 0x21: 'd', 0x22: 'dh', 0x23: 'n',
+    0x24: 't', 0x25: 'th', 0x26: 'd', 0x27: 'dh', 0x28: 'n', 0x29: 'n',
+    0x2A: 'p', 0x2B: 'ph', 0x2C: 'b', 0x2D: 'bh', 0x2E: 'm',
+    0x2F: 'y', 0x30: 'r', 0x31: 'r', 0x32: 'l', 0x33: 'l', 0x34: 'zh', 0x35: 'v',
+    0x36: 'sh', 0x37: 'sh', 0x38: 's', 0x39: 'h',
+    0x58: 'q', 0x59: 'kh', 0x5A: 'gh', 0x5B: 'z', 0x5C: 'r', 0x5D: 'rh', 0x5E: 'f', 0x5F: 'y'
+}
+
+VOWEL_SIGNS = {
+    0x3E: 'a', 0x3F: 'i', 0x40: 'i', 0x41: 'u', 0x42: 'u', 0x43: 'ri', 0x44: 'ri',
+    0x45: 'e', 0x46: 'e', 0x47: 'e', 0x48: 'ai', 0x49: 'o', 0x4A: 'o', 0x4B: 'o', 0x4C: 'au',
+    0x62: 'li', 0x63: 'li'
+}
+
+NASALS = {0x01: 'n', 0x02: 'n', 0x03: 'h'}  # candrabindu, anusvara, visarga
+VIRAMA = 0x4D
+NUKTA = 0x3C
+
+# Consonant + nukta renderings (ज़ -> z, फ़ -> f)
+NUKTA_FORMS = {'j': 'z', 'ph': 'f', 'k': 'q', 'd': 'r', 'dh': 'rh', 'g': 'gh'}
+
+# Script-specific letters outside the shared layout
+EXTRA_CONSONANTS = {0x09F0: 'r', 0x09F1: 'v'}  # Assamese ra / wa
+EXTRA_NASALS = {0x0A70: 'n'}  # Gurmukhi tippi
+
+
+class _Syllable:
+    __slots__ = ('consonant', 'vowel', 'inherent', 'coda')
+
+    def __init__(self, consonant='', vowel='a', inherent=True):
+        self.consonant = consonant
+        self.vowel = vowel
+        self.inherent = inherent
+        self.coda = ''
+
+    def render(self):
+        return self.consonant + self.vowel + self.coda
+
+
+def _delete_schwas(syllables):
+    """Hindi-style schwa deletion: word-final, and medial in a VC_CV context"""
+    deletable = lambda s: s.inherent and not s.coda and s.consonant
+
+    if len(syllables) > 1 and deletable(syllables[-1]):
+        syllables[-1].vowel = ''
+    for i in range(len(syllables) - 2, 0, -1):
+        current, before, after = syllables[i], syllables[i - 1], syllables[i + 1]
+        if deletable(current) and before.vowel and after.vowel and after.consonant:
+            current.vowel = ''
+
+
+def _render_word(syllables, block):
+    if block in SCHWA_DELETING_SCRIPTS:
+        _delete_schwas(syllables)
+    return ''.join(s.render() for s in syllables)
+
+
+def transliterate(text):
+    """Lowercase Latin rendering of Indic-script text; other characters pass through"""
+    out = []
+    syllables, block = [], None
+
+    def flush():
+        if syllables:
+            out.append(_render_word(syllables, block))
+            syllables.clear()
+
+    for char in text or '':
+        cp = ord(char)
+        if not INDIC_FIRST <= cp <= INDIC_LAST:
+            flush()
+            out.append(char.lower())
+            continue
+
+        block = cp & ~0x7F
+        offset = cp - block
+
+        if cp in EXTRA_CONSONANTS or offset in CONSONANTS:
+            syllables.append(_Syllable(EXTRA_CONSONANTS.get(cp) or CONSONANTS[offset]))
+        elif offset in INDEPENDENT_VOWELS:
+            syllables.append(_Syllable('', INDEPENDENT_VOWELS[offset], inherent=False))
+        elif offset in VOWEL_SIGNS and syllables:
+            syllables[-1].vowel = VOWEL_SIGNS[offset]
+            syllables[-1].inherent = False
+        elif offset == VIRAMA and syllables:
+            syllables[-1].vowel = ''
+            syllables[-1].inherent = False
+        elif offset == NUKTA and syllables:
+            syllables[-1].consonant = NUKTA_FORMS.get(syllables[-1].consonant, syllables[-1].consonant)
+        elif (cp in EXTRA_NASALS or offset in NASALS) and syllables:
+            syllables[-1].coda = EXTRA_NASALS.get(cp) or NASALS[offset]
+        elif 0x66 <= offset <= 0x6F:
+            flush()
+            out.append(str(offset - 0x66))
+        # Other marks (length marks, avagraha, ...) carry nothing searchable
+
+    flush()
+    return ''.join(out)
+
+
+def script_language(text):
+    """Language code implied by the first Indic script in the text, 'en' for Latin-only text"""
+    for char in text or '':
+        cp = ord(char)
+        if INDIC_FIRST <= cp <= INDIC_LAST:
+            return SCRIPT_LANGUAGES.get(cp & ~0x7F, 'hi')
+    return 'en'
+
+
+def normalize_tokens(*texts):
+    """Unique lowercase word tokens; accents are stripped from Latin words only"""
+    tokens = []
+    for value in texts:
+        for token in TOKEN_PATTERN.findall((value or '').lower()):
+            stripped = ''.join(c for c in unicodedata.normalize('NFKD', token) if not unicodedata.combining(c))
+            tokens.append(stripped if stripped.isascii() else token)
+    return ' '.join(dict.fromkeys(tokens))
+
+
+def transliteration_terms(product):
+    """Latin tokens for the Indic-script parts of a product's text ('' if it has none)"""
+    parts = [product.title, product.craft_type, product.gi_tag, product.description]
+    if all(script_language(part) == 'en' for part in parts):
+        return ''
+    return normalize_tokens(*[transliterate(part) for part in parts if script_language(part) != 'en'])
+
+
+def translate_product_terms(product, source_lang):
+    """Translate a product's text into every search language; {lang: tokens}"""
+    texts = [product.title or '', product.craft_type or '', (product.description or '')[:DESCRIPTION_CHARS]]
+    texts = [text for text in texts if text.strip()]
+
+    terms = {}
+    for target_lang in SEARCH_TRANSLATION_LANGUAGES:
+        if target_lang == source_lang:
+            continue
+        results = translate_batch(texts, source_lang, target_lang)
+        failed = [result for result in results if not isinstance(result, dict) or result.get('error')]
+        if failed:
+            error = failed[0].get('error') if isinstance(failed[0], dict) else 'invalid translation'
+            raise RuntimeError(f"Translation to {target_lang} failed: {error}")
+        terms[target_lang] = normalize_tokens(*[result.get('translated_text') for result in results])
+    return terms
+
+
+def enqueue_search_translations(session, product_id):
+    return enqueue(session, SEARCH_TRANSLATIONS, product_id=product_id)
+
+
+@register_handler(SEARCH_TRANSLATIONS)
+def run_search_translations(session, job, payload):
+    product = session.query(Product).filter_by(id=job.product_id).first()
+    document = session.query(ProductSearchDocument).filter_by(product_id=job.product_id).first()
+    if not product or not document:
+        return {'skipped': 'product not found'}
+
+    source_lang = script_language(' '.join(filter(None, [product.title, product.description])))
+    terms = translate_product_terms(product, source_lang)
+
+    document.translations = ' '.join(dict.fromkeys(' '.join(terms.values()).split()))
+    return {'source_lang': source_lang, 'languages': sorted(terms)}
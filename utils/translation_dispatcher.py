@@ -0,0 +1,97 @@
+"""
+Micro-batching Translation Dispatcher
+Collects chat messages that need translation for a short window and sends
+each language pair through translate_batch in a single model call, so the
+Socket.IO send path never waits on the LLM
+"""
+import logging
+import os
+import threading
+
+from utils.translation_service import translate_batch
+
+logger = logging.getLogger(__name__)
+
+# How long to wait for more messages before flushing a batch (seconds)
+BATCH_WINDOW = float(os.getenv('TRANSLATION_BATCH_WINDOW', 0.25))
+
+# Upper bound on messages per model call
+MAX_BATCH_SIZE = int(os.getenv('TRANSLATION_MAX_BATCH', 20))
+
+
+class TranslationDispatcher:
+    """
+    Coalesces pending translations per (source_lang, target_lang)
+
+    on_translated(payload, translated_text) is called from the background
+    task for every submitted message once its batch has been translated.
+    """
+
+    def __init__(self, socketio, on_translated, window=BATCH_WINDOW, max_batch=MAX_BATCH_SIZE):
+        self.socketio = socketio
+        self.on_translated = on_translated
+        self.window = window
+        self.max_batch = max_batch
+
+        self._pending = {}  # (source_lang, target_lang) -> [(text, payload)]
+        self._lock = threading.Lock()
+        self._running = False
+        self.stats = {'submitted': 0, 'batches': 0, 'failures': 0}
+
+    def submit(self, text, source_lang, target_lang, payload):
+        """Queue a message for translation; returns immediately"""
+        with self._lock:
+            self._pending.setdefault((source_lang, target_lang), []).append((text, payload))
+            self.stats['submitted'] += 1
+            if self._running:
+                return
+            self._running = True
+
+        self.socketio.start_background_task(self._run)
+
+    def _run(self):
+        stopped = False
+        try:
+            while True:
+                # Let the window fill up before taking the pending work
+                self.socketio.sleep(self.window)
+
+                with self._lock:
+                    pending, self._pending = self._pending, {}
+                    if not pending:
+                        self._running = False
+                        stopped = True
+                        return
+
+                for (source_lang, target_lang), items in pending.items():
+                    for start in range(0, len(items), self.max_batch):
+                        self._flush(source_lang, target_lang, items[start:start + self.max_batch])
+        finally:
+            # An unexpected error must not leave submit() believing a task is running
+            if not stopped:
+                logger.error("Translation dispatcher task stopped unexpectedly")
+                with self._lock:
+                    self._running = False
+
+    def _flush(self, source_lang, target_lang, items):
+        # Identical phrases in the same window are translated once
+        texts = list(dict.fromkeys(text for text, _ in items))
+        try:
+            results = dict(zip(texts, translate_batch(texts, source_lang, target_lang)))
+            self.stats['batches'] += 1
+        except Exception as e:
+            logger.warning("Translation batch %s->%s failed: %s", source_lang, target_lang, e)
+            self.stats['failures'] += 1
+            return
+
+        for text, payload in items:
+            result = results.get(text)
+            if not isinstance(result, dict) or result.get('error'):
+                continue
+            translated_text = result.get('translated_text')
+            if not translated_text or translated_text == text:
+                continue
+            try:
+                self.on_translated(payload, translated_text)
+            except Exception:
+                logger.exception("Translation dispatcher callback failed")
@@ -5,7 +5,12 @@ and buyer languages (English, German, French, etc.)
 """
 
 from utils.ai_service_gemini import get_gemini_response
+from utils.cache import TieredCache
 import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
 
 
 # Supported languages
@@ -36,8 +41,12 @@ BUYER_LANGUAGES = {
 
 ALL_LANGUAGES = {**ARTISAN_LANGUAGES, **BUYER_LANGUAGES}
 
-# Simple in-memory cache for translations
-TRANSLATION_CACHE = {}
+# Bounded translation cache, shared across workers through the SQLite tier
+TRANSLATION_CACHE = TieredCache(
+    'translation',
+    max_entries=int(os.getenv('TRANSLATION_CACHE_SIZE', 4096)),
+    ttl_seconds=int(os.getenv('TRANSLATION_CACHE_TTL', 30 * 24 * 3600))
+)
 
 
 def translate_message(text, source_lang, target_lang, context="general"):
@@ -62,10 +71,13 @@ def translate_message(text, source_lang, target_lang, context="general"):
         }
     
     # Check cache
-    cache_key = f"{text}:{source_lang}:{target_lang}:{context}"
-    if cache_key in TRANSLATION_CACHE:
-        print(f"Cache hit for translation: {text[:20]}...")
-        return TRANSLATION_CACHE[cache_key]
+    cache_key = TRANSLATION_CACHE.make_key('message', text, source_lang, target_lang, context)
+    cached = TRANSLATION_CACHE.get(cache_key)
+    if cached is not None:
+        logger.debug("Translation cache hit", extra={
+            'source_lang': source_lang, 'target_lang': target_lang, 'sample_rate': 0.01
+        })
+        return cached
 
     source_lang_name = ALL_LANGUAGES.get(source_lang, 'Unknown')
     target_lang_name = ALL_LANGUAGES.get(target_lang, 'Unknown')
@@ -129,12 +141,12 @@ Example output:
         result['target_lang'] = target_lang
         
         # Store in cache
-        TRANSLATION_CACHE[cache_key] = result
+        TRANSLATION_CACHE.set(cache_key, result)
         
         return result
         
     except Exception as e:
-        print(f"Translation error: {str(e)}")
+        logger.warning("Translation failed: %s", e)
         # Fallback: return original text
         return {
             'translated_text': text,
@@ -148,6 +160,12 @@ Example output:
         }
 
 
+def _valid_translation(result):
+    """A translate_batch item worth caching: a dict with a non-empty translated_text"""
+    return (isinstance(result, dict) and isinstance(result.get('translated_text'), str)
+            and bool(result['translated_text'].strip()))
+
+
 def translate_batch(messages, source_lang, target_lang):
     """
     Translate multiple messages at once (more efficient)
@@ -164,11 +182,19 @@ def translate_batch(messages, source_lang, target_lang):
     if source_lang == target_lang:
         return [{'translated_text': msg, 'original_text': msg} for msg in messages]
     
+    # Serve what we can from cache and only send the misses to the model
+    keys = [TRANSLATION_CACHE.make_key('batch', msg, source_lang, target_lang) for msg in messages]
+    results = [TRANSLATION_CACHE.get(key) for key in keys]
+    missing = [i for i, result in enumerate(results) if not _valid_translation(result)]
+    
+    if not missing:
+        return results
+    
     source_lang_name = ALL_LANGUAGES.get(source_lang, 'Unknown')
     target_lang_name = ALL_LANGUAGES.get(target_lang, 'Unknown')
     
     # Create numbered list of messages
-    messages_list = "\n".join([f"{i+1}. {msg}" for i, msg in enumerate(messages)])
+    messages_list = "\n".join([f"{n+1}. {messages[i]}" for n, i in enumerate(missing)])
     
     prompt = f"""Translate these messages from {source_lang_name} to {target_lang_name}.
 
@@ -203,13 +229,26 @@ Example:
             json_end = response_text.find('```', json_start)
             response_text = response_text[json_start:json_end].strip()
         
-        results = json.loads(response_text)
+        translated = json.loads(response_text)
+        if not isinstance(translated, list) or len(translated) != len(missing):
+            raise ValueError(f"Expected {len(missing)} translations, got {len(translated) if isinstance(translated, list) else 'non-list'}")
+        
+        for i, result in zip(missing, translated):
+            if _valid_translation(result):
+                TRANSLATION_CACHE.set(keys[i], result)
+                results[i] = result
+            else:
+                # Malformed item: not cached, so the next request asks again
+                results[i] = {'translated_text': messages[i], 'original_text': messages[i],
+                              'error': 'invalid translation in model response'}
         return results
         
     except Exception as e:
-        print(f"Batch translation error: {str(e)}")
-        # Fallback: return original texts
-        return [{'translated_text': msg, 'original_text': msg, 'error': str(e)} for msg in messages]
+        logger.warning("Batch translation failed: %s", e)
+        # Fallback: return original texts for the messages we could not translate
+        for i in missing:
+            results[i] = {'translated_text': messages[i], 'original_text': messages[i], 'error': str(e)}
+        return results
 
 
 def detect_language(text):
@@ -242,22 +281,36 @@ Return ONLY the language code from this list:
 Return ONLY the 2-letter code, nothing else.
 """
     
+    cache_key = TRANSLATION_CACHE.make_key('detect', text)
+    cached = TRANSLATION_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+    
     try:
         response = get_gemini_response(prompt).strip().lower()
         
         # Extract just the code if there's extra text
         for code in ALL_LANGUAGES.keys():
             if code in response:
+                TRANSLATION_CACHE.set(cache_key, code)
                 return code
         
         # Default to English if can't detect
         return 'en'
         
     except Exception as e:
-        print(f"Language detection error: {str(e)}")
+        logger.warning("Language detection failed: %s", e)
         return 'en'  # Default to English
 
 
+def get_cached_translation(text, source_lang, target_lang):
+    """Return a cached translate_batch result for a single message, or None"""
+    if source_lang == target_lang:
+        return {'translated_text': text, 'original_text': text}
+    cached = TRANSLATION_CACHE.get(TRANSLATION_CACHE.make_key('batch', text, source_lang, target_lang))
+    return cached if _valid_translation(cached) else None
+
+
 def get_negotiation_phrases(language_code):
     """
     Get common negotiation phrases in a specific language
@@ -339,7 +392,7 @@ Return ONLY valid JSON.
 """
     
     try:
-        response_text = get_gemini_response(prompt)
+        response_text = get_gemini_response(prompt, cache=True)
         
         # Clean JSON
         if '```json' in response_text:
@@ -354,7 +407,7 @@ Return ONLY valid JSON.
         return json.loads(response_text)
         
     except Exception as e:
-        print(f"Cultural context error: {str(e)}")
+        logger.warning("Cultural context explanation failed: %s", e)
         return {
             'cultural_insight': 'Cultural context analysis temporarily unavailable.',
             'what_they_really_mean': 'Please interpret the message in context.',
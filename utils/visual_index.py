@@ -0,0 +1,241 @@
+"""
+Visual Search Index
+Each product's main image is reduced to a small feature vector when its
+derivatives are generated (HSV colour histogram + coarse brightness layout).
+Searches embed the uploaded photo the same way and rank the whole catalog
+by cosine similarity in memory - no external API involved.
+
+Small catalogs are searched exactly; above VISUAL_IVF_THRESHOLD vectors the
+index is partitioned with k-means (IVF) and only the closest partitions are
+scanned, which keeps queries in the millisecond range as the catalog grows.
+Each process rebuilds its index on a background thread and swaps it in;
+searches only ever read the index that is already built.
+"""
+import logging
+import os
+import threading
+import time
+
+from PIL import Image, ImageOps
+from sqlalchemy import func
+
+from models import ProductImageFeature
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    logger.warning("numpy not installed. Visual search disabled. Install with: pip install numpy")
+
+# Images are downscaled to this edge before feature extraction
+FEATURE_EDGE = 64
+
+# HSV histogram bins (hue x saturation x value) and brightness layout grid
+HUE_BINS = 12
+SAT_BINS = 3
+VAL_BINS = 3
+LAYOUT_GRID = 4
+
+# Share of the similarity carried by the colour histogram vs the layout
+HISTOGRAM_WEIGHT = 0.8
+
+FEATURE_DIMS = HUE_BINS * SAT_BINS * VAL_BINS + LAYOUT_GRID * LAYOUT_GRID
+
+# Switch from exact search to the IVF partitioned index at this many vectors
+VISUAL_IVF_THRESHOLD = int(os.getenv('VISUAL_IVF_THRESHOLD', 5000))
+
+# Partitions scanned per query when the IVF index is active
+VISUAL_IVF_PROBES = int(os.getenv('VISUAL_IVF_PROBES', 8))
+
+# Seconds between the refresher thread's checks of the features table
+VISUAL_INDEX_REFRESH = float(os.getenv('VISUAL_INDEX_REFRESH', 10))
+
+
+def extract_features(img):
+    """
+    Feature vector for a PIL image (L2-normalized float32)
+
+    The histogram is square-rooted (Hellinger) so a few dominant colours
+    don't drown out the rest; the layout grid is mean-centred so overall
+    exposure doesn't matter.
+    """
+    img = ImageOps.exif_transpose(img).convert('RGB').resize((FEATURE_EDGE, FEATURE_EDGE))
+
+    hsv = np.asarray(img.convert('HSV'), dtype=np.uint16).reshape(-1, 3)
+    h = hsv[:, 0] * HUE_BINS // 256
+    s = hsv[:, 1] * SAT_BINS // 256
+    v = hsv[:, 2] * VAL_BINS // 256
+    bins = (h * SAT_BINS + s) * VAL_BINS + v
+    histogram = np.bincount(bins, minlength=HUE_BINS * SAT_BINS * VAL_BINS).astype(np.float32)
+    histogram = np.sqrt(histogram / histogram.sum())
+
+    gray = np.asarray(img.convert('L').resize((LAYOUT_GRID, LAYOUT_GRID), Image.BILINEAR), dtype=np.float32)
+    layout = gray.reshape(-1) - gray.mean()
+
+    vector = np.concatenate([
+        _normalize(histogram) * np.sqrt(HISTOGRAM_WEIGHT),
+        _normalize(layout) * np.sqrt(1 - HISTOGRAM_WEIGHT)
+    ])
+    return _normalize(vector).astype(np.float32)
+
+
+def dominant_colors(vector, count=3):
+    """Hex colours of the strongest histogram bins of a feature vector"""
+    histogram = vector[:HUE_BINS * SAT_BINS * VAL_BINS]
+    colors = []
+    for index in np.argsort(histogram)[::-1][:count]:
+        if histogram[index] <= 0:
+            break
+        h, rest = divmod(int(index), SAT_BINS * VAL_BINS)
+        s, v = divmod(rest, VAL_BINS)
+        centre = Image.new('HSV', (1, 1), (
+            int((h + 0.5) * 256 / HUE_BINS),
+            int((s + 0.5) * 256 / SAT_BINS),
+            int((v + 0.5) * 256 / VAL_BINS)
+        )).convert('RGB').getpixel((0, 0))
+        colors.append('#%02x%02x%02x' % centre)
+    return colors
+
+
+def _normalize(vector):
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def save_features(session, product_id, image_path):
+    """Compute and store the feature vector of a product's main image"""
+    with Image.open(image_path) as img:
+        vector = extract_features(img)
+
+    feature = session.query(ProductImageFeature).filter_by(product_id=product_id).first()
+    if feature is None:
+        feature = ProductImageFeature(product_id=product_id)
+        session.add(feature)
+    feature.vector = vector.tobytes()
+    feature.dims = FEATURE_DIMS
+    return feature
+
+
+class VisualIndex:
+    """
+    In-memory matrix of product feature vectors
+
+    Rebuilt from product_image_features by a background thread (start())
+    whenever the row count or latest update changes, so every process picks
+    up new uploads on its own without a search request paying for it.
+    """
+
+    def __init__(self, ivf_threshold=VISUAL_IVF_THRESHOLD, probes=VISUAL_IVF_PROBES):
+        self.ivf_threshold = ivf_threshold
+        self.probes = probes
+
+        self._lock = threading.Lock()
+        self._signature = None
+        self._thread = None
+        self.product_ids = None
+        self.matrix = None
+        self.centroids = None
+        self.partitions = None
+
+    def __len__(self):
+        return 0 if self.product_ids is None else len(self.product_ids)
+
+    def start(self, session_factory, interval=VISUAL_INDEX_REFRESH):
+        """Start this process's refresher thread (idempotent)"""
+        if not NUMPY_AVAILABLE or self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._refresh_loop, args=(session_factory, interval), name='visual-index', daemon=True
+        )
+        self._thread.start()
+
+    def _refresh_loop(self, session_factory, interval):
+        while True:
+            session = session_factory()
+            try:
+                self.refresh(session)
+            except Exception:
+                session.rollback()
+                logger.exception("Visual index refresh failed")
+            finally:
+                session.close()
+            time.sleep(interval)
+
+    def refresh(self, session):
+        """Rebuild the index if the features table changed since the last build, then swap it in"""
+        signature = tuple(session.query(
+            func.count(ProductImageFeature.id),
+            func.max(ProductImageFeature.updated_at)
+        ).filter(ProductImageFeature.dims == FEATURE_DIMS).one())
+        if signature == self._signature:
+            return
+
+        rows = session.query(ProductImageFeature.product_id, ProductImageFeature.vector).filter(
+            ProductImageFeature.dims == FEATURE_DIMS
+        ).all()
+
+        product_ids = np.array([row.product_id for row in rows], dtype=np.int64)
+        matrix = np.frombuffer(b''.join(row.vector for row in rows), dtype=np.float32)
+        matrix = matrix.reshape(len(rows), FEATURE_DIMS)
+
+        centroids, partitions = None, None
+        if len(rows) >= self.ivf_threshold:
+            centroids, partitions = _build_partitions(matrix)
+
+        with self._lock:
+            self.product_ids, self.matrix = product_ids, matrix
+            self.centroids, self.partitions = centroids, partitions
+            self._signature = signature
+
+    def search(self, vector, k=12):
+        """
+        Nearest products to a feature vector
+
+        Returns:
+            list of (product_id, similarity) sorted by similarity, best first
+        """
+        with self._lock:
+            product_ids, matrix = self.product_ids, self.matrix
+            centroids, partitions = self.centroids, self.partitions
+
+        if product_ids is None or not len(product_ids):
+            return []
+
+        if centroids is not None:
+            nearest = np.argsort(centroids @ vector)[::-1][:self.probes]
+            candidates = np.concatenate([partitions[i] for i in nearest])
+        else:
+            candidates = np.arange(len(product_ids))
+        if not len(candidates):
+            return []
+
+        scores = matrix[candidates] @ vector
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [(int(product_ids[candidates[i]]), float(scores[i])) for i in top]
+
+
+def _build_partitions(matrix, iterations=10, seed=0):
+    """Spherical k-means over the vectors; returns (centroids, member indices per centroid)"""
+    rng = np.random.default_rng(seed)
+    count = max(int(np.sqrt(len(matrix))), 1)
+    centroids = matrix[rng.choice(len(matrix), count, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignment = np.argmax(matrix @ centroids.T, axis=1)
+        for i in range(count):
+            members = matrix[assignment == i]
+            if len(members):
+                centroids[i] = _normalize(members.sum(axis=0))
+
+    assignment = np.argmax(matrix @ centroids.T, axis=1)
+    partitions = [np.flatnonzero(assignment == i) for i in range(count)]
+    return centroids, partitions
+
+
+VISUAL_INDEX = VisualIndex()